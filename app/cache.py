@@ -0,0 +1,146 @@
+"""Caches invalidated when the database file is replaced.
+
+The database is read-only for the web app and only changes when a new
+database.db is shipped, so anything derived from it can be cached until
+the file identity (modification time and size) changes.
+"""
+
+import functools
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from pathlib import Path
+from typing import Any
+
+from .database import DATABASE_PATH, get_file_version
+
+# All caches, so that they can be dropped at once (e.g. by benchmarks).
+_caches: "weakref.WeakSet[DatabaseVersionCache]" = weakref.WeakSet()
+
+
+def get_database_path() -> Path:
+    """
+    Returns the path of the SQLite database file used by the shared engine.
+    """
+    return DATABASE_PATH
+
+
+def get_database_version() -> str:
+    """
+    Returns a string identifying the current database file.
+
+    The version changes whenever the file is replaced or modified.
+    """
+    return get_file_version(get_database_path())
+
+
+class DatabaseVersionCache:
+    """
+    Key-value cache whose entries are dropped when the database version changes.
+
+    With maxsize, the least recently used entries are evicted first.
+    """
+
+    def __init__(self, maxsize: int | None = None) -> None:
+        self._version: str | None = None
+        self._values: OrderedDict[Hashable, Any] = OrderedDict()
+        self._maxsize = maxsize
+        self._lock = threading.RLock()
+        # Locks of the keys being computed.
+        self._key_locks: dict[Hashable, threading.Lock] = {}
+        _caches.add(self)
+
+    def _check_version(self) -> None:
+        version = get_database_version()
+        if version != self._version:
+            self._values.clear()
+            self._version = version
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the cached value for key, or default.
+        """
+        with self._lock:
+            self._check_version()
+            if key not in self._values:
+                return default
+            self._values.move_to_end(key)
+            return self._values[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Caches a value for key.
+        """
+        with self._lock:
+            self._check_version()
+            self._values[key] = value
+            self._values.move_to_end(key)
+            if self._maxsize is not None and len(self._values) > self._maxsize:
+                self._values.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value for key, computing it if needed.
+
+        The value is computed outside of the cache lock, so that a slow
+        computation does not block reads of other keys. Concurrent calls
+        for the same key wait for a single computation.
+        """
+        with self._lock:
+            self._check_version()
+            if key in self._values:
+                self._values.move_to_end(key)
+                return self._values[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                with self._lock:
+                    self._check_version()
+                    version = self._version
+                    if key in self._values:
+                        self._values.move_to_end(key)
+                        return self._values[key]
+                value = compute()
+                with self._lock:
+                    # Not cached if the database changed while computing it.
+                    if version == get_database_version() == self._version:
+                        self.set(key, value)
+                return value
+        finally:
+            with self._lock:
+                if self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+
+    def clear(self) -> None:
+        """
+        Drops all cached values.
+        """
+        with self._lock:
+            self._values.clear()
+            self._version = None
+
+
+def cached_by_database_version(func: Callable) -> Callable:
+    """
+    Decorator caching the results of a function until the database changes.
+
+    Arguments of the decorated function must be hashable.
+    """
+    cache = DatabaseVersionCache()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        return cache.get_or_compute(key, lambda: func(*args, **kwargs))
+
+    wrapper.cache = cache
+    return wrapper
+
+
+def clear_caches() -> None:
+    """
+    Drops the values of all caches.
+    """
+    for cache in list(_caches):
+        cache.clear()
@@ -0,0 +1,63 @@
+"""Command line tools preparing the database for the web app.
+
+Usage, from the root of the repository:
+
+    uv run python -m app.cli search-index
+    uv run python -m app.cli materialize
+    uv run python -m app.cli indexes
+    uv run python -m app.cli exports
+    uv run python -m app.cli prepare
+"""
+
+import argparse
+
+from .database import get_write_engine
+from .frontend.file_types.artifacts import build_export_artifacts
+from .indexes import build_indexes
+from .search_index import build_search_index
+from .summary_tables import build_summary_tables
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="app.cli", description=__doc__.splitlines()[0]
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser(
+        "search-index",
+        help="(re)build the full-text search index of datasets and files",
+    )
+    subparsers.add_parser(
+        "materialize",
+        help="(re)build the summary tables of the home, datasets and file types pages",
+    )
+    subparsers.add_parser(
+        "indexes",
+        help="create the indexes of the sortable and filterable columns",
+    )
+    subparsers.add_parser(
+        "exports",
+        help="(re)build the compressed TSV exports of each file type",
+    )
+    subparsers.add_parser(
+        "prepare",
+        help="run every step above, e.g. after shipping a new database",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command in ("search-index", "prepare"):
+        with get_write_engine().begin() as connection:
+            build_search_index(connection)
+    if args.command in ("materialize", "prepare"):
+        with get_write_engine().begin() as connection:
+            build_summary_tables(connection)
+    if args.command in ("indexes", "prepare"):
+        with get_write_engine().begin() as connection:
+            build_indexes(connection)
+    # Last, as exports are stored per version of the database file.
+    if args.command in ("exports", "prepare"):
+        build_export_artifacts()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Run blocking service-layer calls outside of the asyncio event loop.
+
+Service functions use synchronous SQLModel sessions and CPU-bound
+libraries (pandas, Bokeh). Calling them directly from an async endpoint
+stalls every other request on the worker, so endpoints await them
+through a bounded thread pool instead.
+"""
+
+import functools
+from collections.abc import AsyncIterator, Callable, Iterator
+from typing import Any
+
+from anyio import CapacityLimiter, to_thread
+
+from . import config
+
+_limiter: CapacityLimiter | None = None
+
+
+def get_limiter() -> CapacityLimiter:
+    """
+    Returns the limiter bounding concurrent service-layer calls.
+    """
+    global _limiter
+    if _limiter is None:
+        _limiter = CapacityLimiter(config.SERVICE_THREADS)
+    return _limiter
+
+
+async def run_in_threadpool(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Runs a blocking function in a worker thread and awaits its result.
+    """
+    return await to_thread.run_sync(
+        functools.partial(func, *args, **kwargs),
+        limiter=get_limiter(),
+    )
+
+
+async def iterate_in_threadpool(iterator: Iterator) -> AsyncIterator:
+    """
+    Iterates over a blocking iterator, pulling each item in a worker thread.
+    """
+    sentinel = object()
+    try:
+        while True:
+            item = await run_in_threadpool(next, iterator, sentinel)
+            if item is sentinel:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
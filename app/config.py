@@ -0,0 +1,79 @@
+"""Runtime configuration of the web app, read from environment variables."""
+
+import os
+
+# Path of the SQLite database.
+DATABASE = os.environ.get("MDDE_DATABASE", "database.db")
+
+# Open the database read-only and immutable in the web app. Set to 0 if the
+# database file may be modified in place while the app is running.
+DATABASE_READ_ONLY = os.environ.get("MDDE_DATABASE_READ_ONLY", "1") != "0"
+
+# Maximum number of service-layer calls (SQL queries, plots, exports)
+# running concurrently in worker threads.
+SERVICE_THREADS = int(os.environ.get("MDDE_SERVICE_THREADS", "8"))
+
+# Number of database connections kept open (up to twice as many under load),
+# and seconds to wait for a free connection.
+DATABASE_POOL_SIZE = int(os.environ.get("MDDE_DATABASE_POOL_SIZE", SERVICE_THREADS))
+DATABASE_POOL_TIMEOUT = float(os.environ.get("MDDE_DATABASE_POOL_TIMEOUT", "30"))
+# Number of database connections kept open for streamed exports (up to twice
+# as many under load), apart from the other queries: exports hold their
+# connection until the client has downloaded them.
+EXPORT_POOL_SIZE = int(os.environ.get("MDDE_EXPORT_POOL_SIZE", "4"))
+
+# Bytes of the database file memory-mapped by SQLite,
+# and bytes of page cache per connection.
+SQLITE_MMAP_SIZE = int(os.environ.get("MDDE_SQLITE_MMAP_SIZE", 1024**3))
+SQLITE_CACHE_SIZE = int(os.environ.get("MDDE_SQLITE_CACHE_SIZE", 32 * 1024**2))
+
+# Use the full-text search index (when built) for DataTables searches.
+SEARCH_INDEX = os.environ.get("MDDE_SEARCH_INDEX", "1") != "0"
+
+# Use keyset (seek) pagination for DataTables pages following an already
+# served page, instead of OFFSET.
+KEYSET_PAGINATION = os.environ.get("MDDE_KEYSET_PAGINATION", "1") != "0"
+
+# Read the home page and file types aggregates from the materialized
+# summary tables (built at startup when missing), instead of aggregating
+# the File table.
+SUMMARY_TABLES = os.environ.get("MDDE_SUMMARY_TABLES", "1") != "0"
+
+# Build the indexes of the sortable and filterable DataTables columns
+# at startup when missing.
+INDEXES = os.environ.get("MDDE_INDEXES", "1") != "0"
+
+# Record request and SQL statement metrics, served on /metrics.
+METRICS = os.environ.get("MDDE_METRICS", "1") != "0"
+
+# Log SQL statements taking at least this many milliseconds (0: never).
+SLOW_QUERY_MS = float(os.environ.get("MDDE_SLOW_QUERY_MS", "0"))
+
+# Directory of the stored, compressed TSV exports of each file type, and
+# whether to serve them and store missing ones.
+EXPORT_DIRECTORY = os.environ.get("MDDE_EXPORT_DIRECTORY", "exports")
+EXPORT_ARTIFACTS = os.environ.get("MDDE_EXPORT_ARTIFACTS", "1") != "0"
+
+# Add validators (ETag, Last-Modified) and Cache-Control to GET responses,
+# and answer conditional requests with 304 Not Modified. Responses may be
+# reused by clients and proxies for HTTP_CACHE_MAX_AGE seconds.
+HTTP_CACHE = os.environ.get("MDDE_HTTP_CACHE", "1") != "0"
+HTTP_CACHE_MAX_AGE = int(os.environ.get("MDDE_HTTP_CACHE_MAX_AGE", "60"))
+
+# Number of responses, and bytes per response, kept in the in-process
+# response cache (per worker process).
+RESPONSE_CACHE_SIZE = int(os.environ.get("MDDE_RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_MAX_BODY = int(
+    os.environ.get("MDDE_RESPONSE_CACHE_MAX_BODY", 512 * 1024)
+)
+
+# Production server (python -m app.server): address, number of worker
+# processes, seconds to keep idle connections open and to wait for requests
+# to finish on shutdown, and number of requests after which a worker is
+# replaced (0: never).
+HOST = os.environ.get("MDDE_HOST", "0.0.0.0")
+PORT = int(os.environ.get("MDDE_PORT", "8000"))
+WORKERS = int(os.environ.get("MDDE_WORKERS", os.cpu_count() or 1))
+KEEP_ALIVE_TIMEOUT = int(os.environ.get("MDDE_KEEP_ALIVE_TIMEOUT", "5"))
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.environ.get("MDDE_GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+MAX_REQUESTS = int(os.environ.get("MDDE_MAX_REQUESTS", "0"))
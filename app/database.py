@@ -0,0 +1,184 @@
+"""Engines of the SQLite database.
+
+The web app only reads the database, which is replaced as a whole when
+new data is shipped. It reads it through the shared `engine`, opened
+read-only and immutable: SQLite then skips file locking and change
+detection, so concurrent readers do not contend with each other.
+Each connection also gets a large page cache and memory-mapped I/O.
+
+Command line tools preparing the database (search index, summary tables)
+write through `get_write_engine()` instead. Exports stream their rows from
+the connections of `get_export_engine()`, apart from the shared pool.
+
+See:
+- https://www.sqlite.org/uri.html#uriimmutable
+- https://www.sqlite.org/mmap.html
+"""
+
+import threading
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import URL, Engine, create_engine, event, exc
+
+from . import config, metrics
+
+DATABASE_PATH = Path(config.DATABASE).resolve()
+
+POOL_EVENTS = metrics.Counter(
+    "mdde_database_pool_events_total",
+    "Connections opened, connections invalidated and checkouts of the pools.",
+    ("event",),
+)
+POOL_CONNECTIONS = metrics.Gauge(
+    "mdde_database_pool_connections",
+    "Connections of the pool of the shared engine, per state.",
+    ("state",),
+)
+
+
+def get_file_version(path: Path = DATABASE_PATH) -> str:
+    """
+    Returns a string identifying the current database file.
+
+    The version changes whenever the file is replaced or modified.
+    """
+    stat = path.stat()
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def set_pragmas(dbapi_connection, read_only: bool) -> None:
+    """
+    Tunes a new SQLite connection.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA mmap_size = {config.SQLITE_MMAP_SIZE}")
+    # A negative cache size is a number of KiB instead of pages.
+    cursor.execute(f"PRAGMA cache_size = -{config.SQLITE_CACHE_SIZE // 1024}")
+    cursor.execute("PRAGMA temp_store = MEMORY")
+    if read_only:
+        cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+
+
+def create_database_engine(
+    path: Path = DATABASE_PATH,
+    read_only: bool = config.DATABASE_READ_ONLY,
+    pool_size: int = config.DATABASE_POOL_SIZE,
+) -> Engine:
+    """
+    Creates an engine for the SQLite database at path.
+
+    Parameters
+    ----------
+    path : Path
+        Path of the database file.
+    read_only : bool
+        Open the database read-only and immutable.
+    pool_size : int
+        Number of connections kept open, at most twice as many are opened
+        under load.
+
+    Returns
+    -------
+    Engine
+        Engine with tuned connections.
+    """
+    query = {"uri": "true"}
+    if read_only:
+        query.update({"mode": "ro", "immutable": "1"})
+    url = URL.create("sqlite", database=f"file:{path}", query=query)
+    # Connections are used from worker threads, and exports stream
+    # from a connection across several of them.
+    connect_args = {"check_same_thread": False}
+    instrumented = config.METRICS or config.SLOW_QUERY_MS
+    if instrumented:
+        connect_args["factory"] = metrics.InstrumentedConnection
+    engine = create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=pool_size,
+        max_overflow=pool_size,
+        pool_timeout=config.DATABASE_POOL_TIMEOUT,
+    )
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        set_pragmas(dbapi_connection, read_only)
+        connection_record.info["file_version"] = get_file_version(path)
+        POOL_EVENTS.inc("connections_opened")
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_EVENTS.inc("checkouts")
+        # An immutable connection never sees a replaced database file,
+        # so it is dropped and the pool opens a new one.
+        file_version = connection_record.info["file_version"]
+        if read_only and file_version != get_file_version(path):
+            POOL_EVENTS.inc("connections_invalidated")
+            raise exc.DisconnectionError("Database file changed")
+
+    if instrumented:
+        metrics.instrument_engine(engine)
+    return engine
+
+
+engine = create_database_engine()
+
+_write_engine: Engine | None = None
+_write_engine_lock = threading.Lock()
+
+
+def get_write_engine() -> Engine:
+    """
+    Returns the engine used to write derived tables into the database.
+    """
+    global _write_engine
+    with _write_engine_lock:
+        if _write_engine is None:
+            _write_engine = create_database_engine(read_only=False, pool_size=1)
+        return _write_engine
+
+
+_export_engine: Engine | None = None
+_export_engine_lock = threading.Lock()
+
+
+def get_export_engine() -> Engine:
+    """
+    Returns the engine streaming exports.
+
+    An export holds its connection while the response is sent, i.e. as
+    long as the client takes to download it. Exports get their own pool,
+    so that slow downloads cannot exhaust the connections of the shared
+    engine and stall the other requests.
+    """
+    global _export_engine
+    with _export_engine_lock:
+        if _export_engine is None:
+            _export_engine = create_database_engine(pool_size=config.EXPORT_POOL_SIZE)
+        return _export_engine
+
+
+def get_pool_metrics() -> dict[str, Any]:
+    """
+    Returns the state and counters of the connection pool of the shared engine.
+    """
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        **{
+            name: POOL_EVENTS.get(name)
+            for name in ("connections_opened", "connections_invalidated", "checkouts")
+        },
+    }
+
+
+@metrics.on_collect
+def update_pool_metrics() -> None:
+    pool_metrics = get_pool_metrics()
+    for state in ("checked_in", "checked_out"):
+        POOL_CONNECTIONS.set(pool_metrics[state], state)
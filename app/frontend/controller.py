@@ -1,9 +1,9 @@
-from bokeh.embed import components
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
+from ..concurrency import run_in_threadpool
 from . import service
 
 
@@ -19,33 +19,23 @@ templates = Jinja2Templates(directory="templates")
 
 @router.get("/", response_class=HTMLResponse)
 async def read_index(request: Request):
-    # Generate the wordcloud image.
-    service.generate_title_wordcloud()
+    # Get the summary tables and plots, cached until the database changes.
+    home_page_snapshot = await run_in_threadpool(service.get_home_page_snapshot)
 
-    # Get the data from query
-    datasets_stats_results, datasets_stats_total_count, home_page_banner_stats = service.get_dataset_origin_summary()
-
-    # Create both Bokeh plots.
-    files_plot = service.create_files_plot()
-    datasets_plot = service.create_datasets_plot()
-
-    # Get the script and div for each plot.
-    files_plot_script, files_plot_div = components(files_plot)
-    datasets_plot_script, datasets_plot_div = components(datasets_plot)
+    # The wordcloud image is generated in the background;
+    # a placeholder is displayed, and the page is not cached, until it is ready.
+    wordcloud_url = service.get_wordcloud_url()
+    headers = None if wordcloud_url else {"Cache-Control": "no-store"}
 
     # Pass it to the template
     return templates.TemplateResponse(
         "index_page.html",
         {
             "request": request,
-            "results": datasets_stats_results,
-            "total_count": datasets_stats_total_count,
-            "banner_stats": home_page_banner_stats,
-            "files_plot_script": files_plot_script,
-            "files_plot_div": files_plot_div,
-            "datasets_plot_script": datasets_plot_script,
-            "datasets_plot_div": datasets_plot_div,
-        }
+            **home_page_snapshot,
+            "wordcloud_url": wordcloud_url,
+        },
+        headers=headers,
     )
 
 
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
+from ...concurrency import run_in_threadpool
+from ..datatables import DataTablesResponse, RowFormat, respond_to_datatables
 from . import service
 
 router = APIRouter(
@@ -17,20 +21,23 @@ templates = Jinja2Templates(directory="templates")
 
 @router.get("/datasets", response_class=HTMLResponse)
 async def get_datasets(request: Request):
-    # Get the list of all datasets (with related data loaded)
-    datasets = service.get_all_datasets()
-    # Pass the list as "datasets" to the template.
+    # Rows are fetched by the table from /datasets/datatables,
+    # the page itself only needs the dataset counts per origin.
+    datasets_page_summary = await run_in_threadpool(service.get_datasets_page_summary)
     return templates.TemplateResponse(
         "datasets_page.html",
         {
             "request": request,
-            "datasets": datasets,
+            **datasets_page_summary,
         }
     )
 
 
-@router.get("/datasets/datatables", response_class=JSONResponse)
-async def get_datasets_for_datatables(request: Request):
+@router.get("/datasets/datatables", response_class=DataTablesResponse)
+async def get_datasets_for_datatables(
+    request: Request,
+    row_format: Annotated[RowFormat, Query(alias="format")] = "objects",
+):
     """
     Get all datasets for DataTables.
 
@@ -42,65 +49,82 @@ async def get_datasets_for_datatables(request: Request):
     ----------
     request : Request
         DataTables request parameters
+    row_format : RowFormat
+        Format of the rows: "objects" (default) or "arrays".
 
     Returns
     -------
-    dict
+    DataTablesResponse
         JSON dictionnary for DataTables.
     """
-    params = request.query_params.get
-    sort_column_name = "dataset_origin"
-    if params("order[0][column]"):
-        sort_column_idx = params("order[0][column]")
-        sort_column_name = params(f"columns[{sort_column_idx}][data]")
-    sort_direction = "asc"
-    if params("order[0][dir]") == "desc":
-        sort_direction = "desc"
-    number_of_datasets_total = len(service.get_all_datasets_for_datatables())
-    number_of_datasets_filtered = len(service.get_all_datasets_for_datatables(
-        search=params("search[value]"),
-    ))
-    datasets = service.get_all_datasets_for_datatables(
-        sort_column_name=sort_column_name,
-        sort_direction=sort_direction,
-        start=params("start"),
-        length=params("length"),
-        search=params("search[value]"),
+    return await respond_to_datatables(
+        request, service.get_all_datasets_for_datatables, row_format
     )
-    # Serialize SQLmodel results to JSON
-    data = [row._mapping for row in datasets]
-    return {
-        "draw": params("draw"),
-        "recordsTotal": number_of_datasets_total,
-        "recordsFiltered": number_of_datasets_filtered,
-        "data": data,
-    }
 
 @router.get("/datasets/{dataset_id}", response_class=HTMLResponse)
 async def get_dataset_info(
     request: Request,
     dataset_id: int
     ):
-    dataset, _, _ = service.get_dataset_info_by_id(dataset_id)
+    dataset_info = await run_in_threadpool(
+        service.get_dataset_info_by_id, dataset_id
+    )
+    if dataset_info is None:
+        raise HTTPException(status_code=404, detail="Dataset not found")
     return templates.TemplateResponse(
         "dataset_info.html",
-        {"request": request, "dataset": dataset}
+        {"request": request, "dataset": dataset_info.dataset}
     )
 
 @router.get("/datasets/{dataset_id}/files", response_class=HTMLResponse)
 async def get_dataset_files(request: Request, dataset_id: int):
-    dataset, total_files, analysed_files = service.get_dataset_info_by_id(dataset_id)
+    dataset_info = await run_in_threadpool(
+        service.get_dataset_info_by_id, dataset_id
+    )
+    if dataset_info is None:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    dataset, total_files, analysed_files = dataset_info
     return templates.TemplateResponse(
         "dataset_files_page.html", {"request": request, "dataset": dataset, "total_files": total_files, "analysed_files": analysed_files}
     )
 
 @router.get("/datasets/{dataset_id}/files/all", response_class=HTMLResponse)
 async def get_dataset_all_files(request: Request, dataset_id: int):
-    all_files = service.get_all_files_from_dataset(dataset_id)
+    # Rows are fetched by the table from /datasets/{dataset_id}/files/datatables.
     return templates.TemplateResponse(
-        "dataset_files_all_table.html", {"request": request, "all_files": all_files}
+        "dataset_files_all_table.html", {"request": request, "dataset_id": dataset_id}
         )
 
+@router.get("/datasets/{dataset_id}/files/datatables", response_class=DataTablesResponse)
+async def get_dataset_files_for_datatables(
+    request: Request,
+    dataset_id: int,
+    row_format: Annotated[RowFormat, Query(alias="format")] = "objects",
+):
+    """
+    Get all files of a dataset for DataTables.
+
+    Parameters
+    ----------
+    request : Request
+        DataTables request parameters
+    dataset_id : int
+        Id of the dataset.
+    row_format : RowFormat
+        Format of the rows: "objects" (default) or "arrays".
+
+    Returns
+    -------
+    DataTablesResponse
+        JSON dictionnary for DataTables.
+    """
+    return await respond_to_datatables(
+        request,
+        service.get_files_of_dataset_for_datatables,
+        row_format,
+        dataset_id=dataset_id,
+    )
+
 @router.get("/datasets/{dataset_id}/files/gro", response_class=HTMLResponse)
 async def get_dataset_gro_files(request: Request, dataset_id: int):
     return templates.TemplateResponse(
@@ -1,8 +1,15 @@
-from sqlalchemy import extract, func, case, desc
-from sqlalchemy.orm import selectinload, aliased
-from sqlmodel import Session, select, or_, col
+import json
+from typing import Any, NamedTuple
 
+from sqlalchemy import extract, func, case, join, true
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import Session, select, col
 
+
+from ... import search_index, summary_tables
+from ...cache import DatabaseVersionCache, cached_by_database_version
+from ...database import engine
 from ...db_schema import (
     DatasetAuthorLink,
     Author,
@@ -13,23 +20,136 @@ from ...db_schema import (
     ParameterFile,
     TopologyFile,
     TrajectoryFile,
-    engine,
+)
+from ..datatables import (
+    BOOLEAN,
+    ENUM,
+    NUMERIC,
+    TEXT,
+    DataTablesColumn,
+    DataTablesPage,
+    DataTablesTable,
+    query_datatables,
+)
+
+# Cached dataset details, for the most recently viewed datasets.
+DATASET_INFO_CACHE_SIZE = 1_000
+_dataset_info_cache = DatabaseVersionCache(maxsize=DATASET_INFO_CACHE_SIZE)
+DATASET_TOTAL_FILES_LABELS = [
+    "total_all_files",
+    "total_topology_files",
+    "total_parameter_files",
+    "total_trajectory_files",
+]
+DATASET_ANALYSED_FILES_LABELS = [
+    "analysed_topology_files",
+    "analysed_parameter_files",
+    "analysed_trajectory_files",
+]
+
+
+def filter_by_author(prefix: ColumnElement[str]) -> ColumnElement:
+    """
+    Returns the predicate matching the datasets with an author whose name
+    starts with prefix, looked up in the author index of the summary tables.
+    """
+    return Dataset.dataset_id.in_(summary_tables.select_datasets_of_author(prefix))
+
+
+# Datasets table. Columns with a sort key are sortable, each backed by an
+# index of app.indexes. Authors are read from a summary table, so that the
+# datasets are neither grouped nor dropped when they have no author.
+# Most recent datasets first, or most relevant ones for a search, unless the
+# client sorts them by a column.
+DATASETS_TABLE = DataTablesTable(
+    name="datasets",
+    columns=[
+        DataTablesColumn("dataset_origin", DataSource.name, filter=ENUM, search=TEXT),
+        DataTablesColumn(
+            "id_in_data_source", Dataset.id_in_data_source,
+            sort_key=Dataset.dataset_id, search=TEXT,
+        ),
+        DataTablesColumn("dataset_id", Dataset.dataset_id),
+        DataTablesColumn(
+            "title", Dataset.title, sort_key=Dataset.dataset_id, search=TEXT
+        ),
+        DataTablesColumn("description", Dataset.description, search=TEXT),
+        DataTablesColumn(
+            "date_created", Dataset.date_created, sort_key=Dataset.dataset_id
+        ),
+        DataTablesColumn(
+            "date_last_modified", Dataset.date_last_modified,
+            sort_key=Dataset.dataset_id,
+        ),
+        DataTablesColumn(
+            "file_number", Dataset.file_number,
+            filter=NUMERIC, sort_key=Dataset.dataset_id,
+        ),
+        DataTablesColumn(
+            "download_number", Dataset.download_number,
+            filter=NUMERIC, sort_key=Dataset.dataset_id,
+        ),
+        DataTablesColumn(
+            "view_number", Dataset.view_number,
+            filter=NUMERIC, sort_key=Dataset.dataset_id,
+        ),
+        DataTablesColumn("url", Dataset.url_in_data_source),
+        DataTablesColumn(
+            "author", summary_tables.select_dataset_author,
+            filter=filter_by_author, search=TEXT,
+        ),
+    ],
+    from_clause=join(Dataset, DataSource, Dataset.data_source_id == DataSource.data_source_id),
+    default_sort="date_created",
+    default_descending=True,
+    search_table=search_index.dataset_search,
+    search_key=Dataset.dataset_id,
+    rank_matches=True,
+)
+
+# Table of all files of a dataset. The files are looked up by the index on
+# their dataset, and a dataset has few enough files to sort them by any
+# column.
+DATASET_FILES_TABLE = DataTablesTable(
+    name="dataset_files",
+    columns=[
+        DataTablesColumn("file_name", File.name, sort_key=File.file_id, search=TEXT),
+        DataTablesColumn(
+            "file_type", FileType.name, filter=ENUM, sort_key=File.file_id, search=TEXT
+        ),
+        DataTablesColumn(
+            "size_in_bytes", File.size_in_bytes, filter=NUMERIC, sort_key=File.file_id
+        ),
+        DataTablesColumn("url", File.url),
+        DataTablesColumn(
+            "is_from_zip_file", File.is_from_zip_file,
+            filter=BOOLEAN, sort_key=File.file_id,
+        ),
+    ],
+    from_clause=join(File, FileType, File.file_type_id == FileType.file_type_id),
+    default_sort="file_name",
+    dataset_key=File.dataset_id,
 )
 
-def get_all_datasets() -> list[Dataset]:
+@cached_by_database_version
+def get_datasets_page_summary() -> dict[str, Any]:
     """
-    Returns a list of all dataset objects, with their related objects loaded.
+    Returns what the datasets page needs besides the table rows:
+    the total number of datasets and the dataset origins,
+    as (origin, number of datasets) pairs, largest first.
     """
     with Session(engine) as session:
-        statement = (
-            select(Dataset)
-            .options(
-                selectinload(Dataset.data_source),
-                selectinload(Dataset.author),
-            )
-        )
-        results = session.exec(statement).all()
-        return results
+        rows = session.exec(summary_tables.select_origin_summary()).all()
+    dataset_origins = sorted(
+        ((row.dataset_origin, row.number_of_datasets) for row in rows),
+        key=lambda origin: origin[1],
+        reverse=True,
+    )
+    return {
+        "number_of_datasets": sum(number for _, number in dataset_origins),
+        "dataset_origins": dataset_origins,
+    }
+
 
 def get_all_datasets_for_datatables(
         sort_column_name: str | None = None,
@@ -37,136 +157,116 @@ def get_all_datasets_for_datatables(
         start: int | None = None,
         length: int | None = None,
         search: str | None = None,
-    ) -> list[Dataset]:
+        column_searches: dict[str, str] | None = None,
+    ) -> DataTablesPage:
     """
-    Returns a list of all dataset, with their related fields.
+    Returns a page of datasets, with their related fields,
+    together with the total and filtered number of datasets.
+
+    See DATASETS_TABLE for the searched, filtered and sortable columns.
     """
-    statement = (
-        select(
-            DataSource.name.label("dataset_origin"),
-            Dataset.id_in_data_source,
-            Dataset.dataset_id,
-            Dataset.title,
-            Dataset.description,
-            Dataset.date_created,
-            Dataset.date_last_modified,
-            Dataset.file_number,
-            Dataset.download_number,
-            Dataset.view_number,
-            Dataset.url_in_data_source.label("url"),
-            func.group_concat(Author.name, '; ').label("author"),
-        )
-        .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
-        .join(DatasetAuthorLink, Dataset.dataset_id == DatasetAuthorLink.dataset_id)
-        .join(Author, DatasetAuthorLink.author_id == Author.author_id)
-        .group_by(
-            Dataset.dataset_id,
-            DataSource.name,
-            Dataset.id_in_data_source,
-            Dataset.title,
-            Dataset.description,
-            Dataset.date_created,
-            Dataset.date_last_modified,
-            Dataset.file_number,
-            Dataset.download_number,
-            Dataset.view_number,
-            Dataset.url_in_data_source
-        )
+    return query_datatables(
+        DATASETS_TABLE,
+        sort_column_name=sort_column_name,
+        sort_direction=sort_direction,
+        start=start,
+        length=length,
+        search=search,
+        column_searches=column_searches,
     )
 
-    if sort_column_name is not None:
-        if sort_direction == "asc":
-            statement = statement.order_by(sort_column_name)
-        elif sort_direction == "desc":
-            statement = statement.order_by(desc(sort_column_name))
-
-    if start is not None:
-        statement = statement.offset(start)
-
-    if length is not None:
-        statement = statement.limit(length)
-
-    if search is not None:
-        statement = statement.where(or_(
-            DataSource.name.ilike(f"%{search}%"),
-            Dataset.id_in_data_source.ilike(f"%{search}%"),
-            Dataset.title.ilike(f"%{search}%"),
-            Dataset.description.ilike(f"%{search}%"),
-            Author.name.ilike(f"%{search}%"),
-        ))
-    with Session(engine) as session:
-        results = session.exec(statement).all()
-        # df = pd.read_sql_query(statement, session.bind)
-        # print(df.columns)
-        return results
+class DatasetInfo(NamedTuple):
+    """Dataset details with the counts of its files, per file type."""
 
-def get_dataset_info_by_id(dataset_id: int):
+    dataset: dict[str, Any]
+    total_files: dict[str, int]
+    analysed_files: dict[str, int]
+
+
+def get_dataset_info_by_id(dataset_id: int) -> DatasetInfo | None:
     """
-    Returns dataset from its id.
+    Returns dataset from its id, with its authors and the number of total
+    and analysed gro, mdp and xtc files, or None if there is no such dataset.
+
+    Everything is fetched in a single query. Results are kept in an LRU
+    cache, until the database changes.
     """
-    with Session(engine) as session:
-        statement_dataset = (
-            select(Dataset)
-            .options(
-                # Load the related origin object so that dataset.origin is available.
-                selectinload(Dataset.data_source),
-                # Load the many-to-many relationship for authors
-                selectinload(Dataset.author),
-            )
-            .where(Dataset.dataset_id == dataset_id)
-        )
+    return _dataset_info_cache.get_or_compute(
+        dataset_id, lambda: _query_dataset_info(dataset_id)
+    )
 
-        # Count how many total files, topology, parameter, and
-        # trajectory files are in the dataset
-        statement_total_files = (
-            select(
+
+def _query_dataset_info(dataset_id: int) -> DatasetInfo | None:
+    authors = (
+        select(func.json_group_array(Author.name))
+        .join(DatasetAuthorLink, DatasetAuthorLink.author_id == Author.author_id)
+        .where(DatasetAuthorLink.dataset_id == dataset_id)
+        .scalar_subquery()
+    )
+    # Count how many total files, topology, parameter, and trajectory files
+    # are in the dataset, and how many of them have been analysed,
+    # a.k.a. how many are actually in the analysis tables, in one pass.
+    file_stats = (
+        select(
             func.count(File.file_id).label("total_all_files"),
             func.count(File.file_id).filter(FileType.name == "gro").label("total_topology_files"),
             func.count(File.file_id).filter(FileType.name == "mdp").label("total_parameter_files"),
             func.count(File.file_id).filter(FileType.name == "xtc").label("total_trajectory_files"),
-            )
-            .join(FileType, File.file_type_id == FileType.file_type_id)
-            .where(File.dataset_id == dataset_id)
+            func.count(TopologyFile.file_id).label("analysed_topology_files"),
+            func.count(ParameterFile.file_id).label("analysed_parameter_files"),
+            func.count(TrajectoryFile.file_id).label("analysed_trajectory_files"),
         )
-
-        # Count how many files have been analysed for this dataset,
-        # a.k.a. how many are actually in the tables
-        statement_analysed_files = select(
-            (select(func.count(TopologyFile.file_id))
-            .select_from(TopologyFile)
-            .join(File, File.file_id == TopologyFile.file_id, isouter=True)
-            .where(File.dataset_id == dataset_id)
-            ).label("analysed_topology_files"),
-            (select(func.count(ParameterFile.file_id))
-            .select_from(ParameterFile)
-            .join(File, File.file_id == ParameterFile.file_id, isouter=True)
-            .where(File.dataset_id == dataset_id)
-            ).label("analysed_parameter_files"),
-            (select(func.count(TrajectoryFile.file_id))
-            .select_from(TrajectoryFile)
-            .join(File, File.file_id == TrajectoryFile.file_id, isouter=True)
-            .where(File.dataset_id == dataset_id)
-            ).label("analysed_trajectory_files")
+        .join(FileType, File.file_type_id == FileType.file_type_id)
+        .outerjoin(TopologyFile, TopologyFile.file_id == File.file_id)
+        .outerjoin(ParameterFile, ParameterFile.file_id == File.file_id)
+        .outerjoin(TrajectoryFile, TrajectoryFile.file_id == File.file_id)
+        .where(File.dataset_id == dataset_id)
+        .subquery()
+    )
+    statement = (
+        select(
+            *Dataset.__table__.columns,
+            DataSource.name.label("dataset_origin"),
+            authors.label("authors"),
+            *file_stats.columns,
         )
+        .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
+        .join(file_stats, true())
+        .where(Dataset.dataset_id == dataset_id)
+    )
+    with Session(engine) as session:
+        row = session.exec(statement).first()
+    if row is None:
+        return None
 
-        result_dataset = session.exec(statement_dataset).first()
-        result_total_files = session.exec(statement_total_files).first()
-        result_analysed_files = session.exec(statement_analysed_files).first()
-
-        return result_dataset, result_total_files, result_analysed_files
+    dataset = dict(row._mapping)
+    dataset["authors"] = [name for name in json.loads(dataset["authors"]) if name]
+    total_files = {name: dataset.pop(name) for name in DATASET_TOTAL_FILES_LABELS}
+    analysed_files = {name: dataset.pop(name) for name in DATASET_ANALYSED_FILES_LABELS}
+    return DatasetInfo(dataset, total_files, analysed_files)
 
-def get_all_files_from_dataset(dataset_id: int) -> list[File]:
+def get_files_of_dataset_for_datatables(
+    dataset_id: int,
+    sort_column_name: str | None = None,
+    sort_direction: str | None = "asc",
+    start: int | None = None,
+    length: int | None = None,
+    search: str | None = None,
+    column_searches: dict[str, str] | None = None,
+    ) -> DataTablesPage:
     """
-    Returns a list of all files for a given dataset_id.
+    Returns a page of the files of a dataset, whatever their file type,
+    together with the total and filtered number of files of the dataset.
+
+    See DATASET_FILES_TABLE for the searched, filtered and sortable columns.
     """
-    with Session(engine) as session:
-        statement = (
-            select(File)
-            .options(
-                selectinload(File.file_type),
-                selectinload(File.dataset),
-            )
-            .where(File.dataset_id == dataset_id)
-        )
-        results = session.exec(statement).all()
-        return results
\ No newline at end of file
+    return query_datatables(
+        DATASET_FILES_TABLE,
+        dataset_id=dataset_id,
+        sort_column_name=sort_column_name,
+        sort_direction=sort_direction,
+        start=start,
+        length=length,
+        search=search,
+        column_searches=column_searches,
+    )
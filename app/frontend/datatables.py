@@ -0,0 +1,910 @@
+"""Shared query engine for DataTables server-side endpoints.
+
+Each table is declared once as a `DataTablesTable`: its columns, with how
+rows are filtered, searched and sorted by them, and the joined tables they
+are selected from. `query_datatables` runs the draws of any table.
+
+The statements of the pages and counts are built once per shape of query
+(table, filters, sort, pagination mode), with bound parameters for the
+values of the filters, the cursor and the page, and kept until the database
+changes. SQLAlchemy then reuses their cache keys and compiled SQL instead
+of building and compiling a statement for each draw.
+
+Pages are kept as the tuples fetched from the database cursor, and
+serialized by `DataTablesResponse` with orjson, either as one object per
+row (the default) or, with `format=arrays`, as one array per row with
+the column names listed once.
+
+See:
+- https://datatables.net/manual/server-side
+- https://docs.sqlalchemy.org/en/20/core/connections.html#sql-compilation-caching
+"""
+
+import operator
+import re
+from collections.abc import Callable, Hashable, Mapping, Sequence
+from typing import Any, Literal, NamedTuple
+
+import orjson
+from fastapi import HTTPException, Request
+from sqlalchemy import (
+    Integer,
+    String,
+    and_,
+    bindparam,
+    false,
+    func,
+    or_,
+    select,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import FromClause, Select, Subquery, TableClause
+from sqlalchemy.sql.elements import ColumnElement
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+
+from .. import config, search_index
+from ..cache import DatabaseVersionCache
+from ..concurrency import run_in_threadpool
+from ..database import engine
+
+# Label of the window column carrying the filtered count in the page query.
+RECORDS_FILTERED_LABEL = "records_filtered"
+
+# Label of the primary key column used as keyset pagination cursor.
+KEYSET_KEY_LABEL = "keyset_key"
+
+# Unfiltered totals only depend on the table (and optional dataset id),
+# not on the search, sort or paging parameters.
+_records_total_cache = DatabaseVersionCache()
+# Filtered counts, keyed by table and filters, reused while paging.
+_records_filtered_cache = DatabaseVersionCache(maxsize=10_000)
+# Keyset pagination cursors, keyed by table, filters, sort and position.
+_cursor_cache = DatabaseVersionCache(maxsize=10_000)
+# Statements of the pages and counts, keyed by table and shape of query.
+# Values are bound when executing them, so few shapes cover all draws.
+STATEMENT_CACHE_SIZE = 1_000
+_statement_cache = DatabaseVersionCache(maxsize=STATEMENT_CACHE_SIZE)
+
+# Kinds of typed per-column filters.
+NUMERIC = "numeric"  # "1000", ">=1000", "1000-5000", "1000..5000", "..5000"
+BOOLEAN = "boolean"  # "true", "false", "yes", "no", "1", "0"
+ENUM = "enum"  # "V-rescale", "V-rescale|Nose-Hoover"
+
+# Kinds of global search of a column.
+TEXT = "text"  # values containing the search value, ignoring case
+NUMBER = "number"  # values equal to the search value, if it is an integer
+
+_NUMBER = r"\d+(?:\.\d*)?"
+# ASCII digits only: str.isdigit() also accepts e.g. "²", which int() rejects.
+_INTEGER = re.compile(r"[0-9]+")
+_SIGNED_INTEGER = re.compile(r"-?[0-9]+")
+_NUMERIC_COMPARISON = re.compile(rf"^(<=|>=|<|>|=)?\s*({_NUMBER})$")
+_NUMERIC_RANGE = re.compile(rf"^({_NUMBER})?\s*(?:-|\.\.)\s*({_NUMBER})?$")
+_BOOLEAN_VALUES = {
+    "true": True, "yes": True, "1": True,
+    "false": False, "no": False, "0": False,
+}
+# Operators of the conditions of the per-column filters.
+_FILTER_OPERATORS = {
+    "=": operator.eq,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda column, values: column.in_(values),
+}
+# Operator of the filters given as functions of the search value.
+_FILTER_FUNCTION = "function"
+
+
+# Formats of the rows in DataTables responses: one object per row,
+# or one array per row with the column names listed once.
+RowFormat = Literal["objects", "arrays"]
+
+
+class DataTablesPage(NamedTuple):
+    """One page of results for a DataTables draw."""
+
+    records_total: int
+    records_filtered: int
+    columns: list[str]
+    rows: list[tuple[Any, ...]]
+
+
+# ============================================================================
+# Tables
+# ============================================================================
+
+
+class DataTablesColumn(NamedTuple):
+    """
+    Column of a DataTables table: how rows are filtered, searched and
+    sorted by it.
+    """
+
+    # Data name of the column in DataTables, and label of its values.
+    name: str
+    # Selected values, or a function returning them when they depend on
+    # the database (e.g. on the summary tables).
+    expression: ColumnElement | Callable[[], ColumnElement]
+    # Kind of per-column filter (NUMERIC, BOOLEAN or ENUM), or a function
+    # returning the predicate of the bound search value.
+    filter: str | Callable[[ColumnElement], ColumnElement] | None = None
+    # Unique column of the table of the column, breaking ties between equal
+    # values, for sortable columns. An index on the column (see app.indexes)
+    # then serves both the order and the keyset clause of the pages.
+    sort_key: ColumnElement | None = None
+    # Kind of global search of the column (TEXT or NUMBER).
+    search: str | None = None
+
+
+class DataTablesTable:
+    """
+    DataTables table, declared by its columns.
+
+    Parameters
+    ----------
+    name : str
+        Name of the table, in cache keys.
+    columns : Sequence[DataTablesColumn]
+        Columns, in the order of the selected values.
+    from_clause : FromClause
+        Joined tables the rows are selected from.
+    default_sort : str
+        Name of the sortable column rows are sorted by, unless asked to
+        sort them by another sortable column.
+    default_descending : bool
+        Whether rows are sorted by default_sort in descending order, when
+        the client does not choose a sort.
+    dataset_key : ColumnElement | None
+        Column restricting the rows to the ones of a dataset.
+    search_table : TableClause | None
+        Full-text search table of app.search_index, searched instead of the
+        TEXT columns when available.
+    search_key : ColumnElement | None
+        Column of the rows matching the rowid of search_table.
+    rank_matches : bool
+        If True, rows are joined with their matches of a full-text search
+        and ordered by relevance after the sort column, without keyset
+        pagination. NUMBER columns are then not searched. When the client
+        does not choose a sort, matches are ordered by relevance first.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        columns: Sequence[DataTablesColumn],
+        from_clause: FromClause,
+        default_sort: str,
+        default_descending: bool = False,
+        dataset_key: ColumnElement | None = None,
+        search_table: TableClause | None = None,
+        search_key: ColumnElement | None = None,
+        rank_matches: bool = False,
+    ):
+        self.name = name
+        self.columns = {column.name: column for column in columns}
+        self.from_clause = from_clause
+        self.dataset_key = dataset_key
+        self.search_table = search_table
+        self.search_key = search_key
+        self.rank_matches = rank_matches
+        self.sortable_columns = [
+            column.name for column in columns if column.sort_key is not None
+        ]
+        if default_sort not in self.sortable_columns:
+            raise ValueError(f"Default sort column {default_sort} is not sortable")
+        self.default_sort = default_sort
+        self.default_descending = default_descending
+
+    def get_expressions(self) -> dict[str, ColumnElement]:
+        """
+        Returns the SQL expression of each column, by column name.
+        """
+        return {
+            name: (
+                column.expression()
+                if callable(column.expression)
+                else column.expression
+            )
+            for name, column in self.columns.items()
+        }
+
+
+def select_table_rows(table: DataTablesTable, dataset_id: int | None = None) -> Select:
+    """
+    Returns the statement selecting all rows of a table, with its columns,
+    of one dataset if dataset_id is given.
+    """
+    expressions = table.get_expressions()
+    statement = select(
+        *[expression.label(name) for name, expression in expressions.items()]
+    ).select_from(table.from_clause)
+    if dataset_id is not None:
+        statement = statement.where(table.dataset_key == dataset_id)
+    return statement
+
+
+# ============================================================================
+# Filters
+# ============================================================================
+
+
+def parse_column_searches(params: Mapping[str, str]) -> dict[str, str]:
+    """
+    Returns the non-empty per-column search values of a DataTables request,
+    keyed by column data name.
+    """
+    column_searches = {}
+    index = 0
+    while f"columns[{index}][data]" in params:
+        value = params.get(f"columns[{index}][search][value]", "").strip()
+        if value:
+            column_searches[params[f"columns[{index}][data]"]] = value
+        index += 1
+    return column_searches
+
+
+def _to_number(text: str) -> int | float:
+    return float(text) if "." in text else int(text)
+
+
+def parse_column_filter(kind: str, value: str) -> tuple[tuple[str, Any], ...] | None:
+    """
+    Converts a per-column search value into (operator, operand) conditions,
+    all of which the values of the column must meet.
+
+    Returns None for values that cannot be parsed for the kind of column,
+    which match no row.
+    """
+    value = value.strip()
+    if kind == NUMERIC:
+        if match := _NUMERIC_COMPARISON.match(value):
+            return ((match.group(1) or "=", _to_number(match.group(2))),)
+        if (match := _NUMERIC_RANGE.match(value)) and any(match.groups()):
+            low, high = match.groups()
+            conditions = []
+            if low is not None:
+                conditions.append((">=", _to_number(low)))
+            if high is not None:
+                conditions.append(("<=", _to_number(high)))
+            return tuple(conditions)
+        return None
+    if kind == BOOLEAN:
+        if value.lower() in _BOOLEAN_VALUES:
+            return (("=", _BOOLEAN_VALUES[value.lower()]),)
+        return None
+    if kind == ENUM:
+        items = re.split(r"[|,]", value)
+        values = tuple(item.strip() for item in items if item.strip())
+        return (("in", values),)
+    raise ValueError(f"Unknown column filter kind: {kind}")
+
+
+def get_filters(
+    table: DataTablesTable,
+    dataset_id: int | None = None,
+    search: str | None = None,
+    column_searches: Mapping[str, str] | None = None,
+) -> tuple[tuple, dict[str, Any]]:
+    """
+    Returns the shape of the filters of a draw, and the values of their
+    bound parameters.
+
+    Parameters
+    ----------
+    table : DataTablesTable
+        Table of the draw.
+    dataset_id : int | None
+        Id of the dataset the rows belong to, if any.
+    search : str | None
+        DataTables global search value.
+    column_searches : Mapping[str, str] | None
+        Column data name -> search value, from parse_column_searches().
+        Columns without a filter are ignored.
+
+    Returns
+    -------
+    tuple[tuple, dict[str, Any]]
+        Filters, as tuples of their kind and shape, and the values of
+        their parameters, by name.
+    """
+    filters = []
+    params = {}
+    if dataset_id is not None:
+        filters.append(("dataset",))
+        params["dataset_id"] = dataset_id
+    for name, value in (column_searches or {}).items():
+        column = table.columns.get(name)
+        if column is not None and column.filter is not None:
+            _add_column_filter(column, value, filters, params)
+    if search:
+        _add_search_filters(table, search, filters, params)
+    return tuple(filters), params
+
+
+def _add_column_filter(
+    column: DataTablesColumn, value: str, filters: list, params: dict[str, Any]
+) -> None:
+    """
+    Adds the filter of a column search value to filters and params of get_filters().
+    """
+    if callable(column.filter):
+        conditions = ((_FILTER_FUNCTION, value),)
+    else:
+        conditions = parse_column_filter(column.filter, value)
+    if conditions is None:
+        filters.append(("column", column.name, None))
+        return
+    operators = tuple(comparison for comparison, _ in conditions)
+    filters.append(("column", column.name, operators))
+    for index, (_, operand) in enumerate(conditions):
+        params[f"filter_{column.name}_{index}"] = operand
+
+
+def _add_search_filters(
+    table: DataTablesTable, search: str, filters: list, params: dict[str, Any]
+) -> None:
+    """
+    Adds the filters of a global search value to filters and params of get_filters().
+    """
+    if table.search_table is not None and search_index.use_search_index():
+        query = search_index.to_fts_query(search)
+        filters.append(("match", query is not None))
+        if query is not None:
+            params["search_query"] = query
+    elif any(column.search == TEXT for column in table.columns.values()):
+        filters.append(("like",))
+        params["search_pattern"] = f"%{search}%"
+    ranked = table.rank_matches and ("match", True) in filters
+    number = search.strip()
+    if not ranked and _INTEGER.fullmatch(number) and any(
+        column.search == NUMBER for column in table.columns.values()
+    ):
+        filters.append(("number",))
+        params["search_number"] = int(number)
+
+
+def _build_filter_clauses(
+    table: DataTablesTable,
+    expressions: Mapping[str, ColumnElement],
+    filters: tuple,
+) -> tuple[list[ColumnElement], Subquery | None]:
+    """
+    Returns the clauses of filters from get_filters(), with bound
+    parameters, and the matches of a ranked search to join the rows with.
+    """
+    clauses = []
+    search_clauses = []
+    ranked_matches = None
+    for kind, *shape in filters:
+        if kind == "dataset":
+            clauses.append(table.dataset_key == bindparam("dataset_id"))
+        elif kind == "column":
+            clauses += _build_column_clauses(table, expressions, *shape)
+        elif kind == "match":
+            (has_query,) = shape
+            if not has_query:
+                search_clauses.append(false())
+                continue
+            matches = search_index.select_matches(
+                table.search_table, bindparam("search_query", type_=String)
+            )
+            if table.rank_matches:
+                ranked_matches = matches
+            else:
+                search_clauses.append(table.search_key.in_(select(matches.c.rowid)))
+        elif kind == "like":
+            pattern = bindparam("search_pattern", type_=String)
+            search_clauses += [
+                expression.ilike(pattern)
+                for expression in _get_searched_expressions(table, expressions, TEXT)
+            ]
+        elif kind == "number":
+            number = bindparam("search_number", type_=Integer)
+            search_clauses += [
+                expression == number
+                for expression in _get_searched_expressions(table, expressions, NUMBER)
+            ]
+    if search_clauses:
+        clauses.append(or_(*search_clauses))
+    return clauses, ranked_matches
+
+
+def _build_column_clauses(
+    table: DataTablesTable,
+    expressions: Mapping[str, ColumnElement],
+    name: str,
+    operators: tuple[str, ...] | None,
+) -> list[ColumnElement]:
+    """
+    Returns the clauses of the filter of a column, from its operators.
+    """
+    if operators is None:
+        return [false()]
+    clauses = []
+    for index, comparison in enumerate(operators):
+        parameter = f"filter_{name}_{index}"
+        if comparison == _FILTER_FUNCTION:
+            search_value = bindparam(parameter, type_=String)
+            clauses.append(table.columns[name].filter(search_value))
+        else:
+            clauses.append(_FILTER_OPERATORS[comparison](
+                expressions[name], bindparam(parameter, expanding=comparison == "in")
+            ))
+    return clauses
+
+
+def _get_searched_expressions(
+    table: DataTablesTable,
+    expressions: Mapping[str, ColumnElement],
+    search_kind: str,
+) -> list[ColumnElement]:
+    """
+    Returns the expressions of the columns searched as search_kind (TEXT or NUMBER).
+    """
+    return [
+        expressions[name]
+        for name, column in table.columns.items()
+        if column.search == search_kind
+    ]
+
+
+def _select_filtered_rows(
+    table: DataTablesTable,
+    expressions: Mapping[str, ColumnElement],
+    filters: tuple,
+) -> tuple[Select, ColumnElement | None]:
+    """
+    Returns the statement selecting the rows of a table matching filters
+    from get_filters(), and the relevance of the rows for a ranked search.
+    """
+    clauses, ranked_matches = _build_filter_clauses(table, expressions, filters)
+    statement = select_table_rows(table)
+    if ranked_matches is None:
+        return statement.where(*clauses), None
+    statement = statement.join(
+        ranked_matches, table.search_key == ranked_matches.c.rowid
+    )
+    return statement.where(*clauses), ranked_matches.c.rank
+
+
+# ============================================================================
+# Statements
+# ============================================================================
+
+
+def get_keyset_clause(
+    sort_column: ColumnElement,
+    descending: bool,
+    sort_key: ColumnElement,
+    null_sort_value: bool,
+) -> ColumnElement:
+    """
+    Returns the clause selecting the rows after a cursor, bound to the
+    "cursor_value" and "cursor_key" parameters.
+
+    Rows are ordered by (sort column, sort key), both ascending or
+    both descending. SQLite sorts NULL values first in ascending order
+    and last in descending order, which the clause accounts for.
+
+    Parameters
+    ----------
+    sort_column : ColumnElement
+        Column the rows are sorted by.
+    descending : bool
+        Whether rows are sorted in descending order.
+    sort_key : ColumnElement
+        Unique column breaking ties between equal sort values.
+    null_sort_value : bool
+        Whether the sort value of the cursor is NULL, in which case
+        "cursor_value" is not bound.
+
+    Returns
+    -------
+    ColumnElement
+        Clause selecting the rows after the cursor.
+    """
+    key_value = bindparam("cursor_key", type_=sort_key.type)
+    key_after = sort_key < key_value if descending else sort_key > key_value
+    if null_sort_value:
+        if descending:
+            return and_(sort_column.is_(None), key_after)
+        return or_(and_(sort_column.is_(None), key_after), sort_column.is_not(None))
+    # Typed explicitly, as booleans cannot be compared with < and >.
+    sort_value = bindparam("cursor_value", type_=sort_column.type)
+    if descending:
+        return or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, key_after),
+            sort_column.is_(None),
+        )
+    return or_(
+        sort_column > sort_value,
+        and_(sort_column == sort_value, key_after),
+    )
+
+
+def build_count_statement(table: DataTablesTable, filters: tuple) -> Select:
+    """
+    Returns the statement counting the rows of a table matching filters
+    from get_filters().
+    """
+    statement, _ = _select_filtered_rows(table, table.get_expressions(), filters)
+    return select(func.count()).select_from(statement.subquery())
+
+
+def build_page_statement(
+    table: DataTablesTable,
+    filters: tuple,
+    sort_column_name: str,
+    descending: bool,
+    keyset: bool,
+    cursor: bool | None,
+    count: bool,
+    limit: bool,
+    by_relevance: bool = False,
+) -> Select:
+    """
+    Returns the statement selecting a page of rows of a table.
+
+    Parameters
+    ----------
+    table : DataTablesTable
+        Table of the rows.
+    filters : tuple
+        Filters from get_filters().
+    sort_column_name : str
+        Name of the sortable column the rows are sorted by.
+    descending : bool
+        Whether rows are sorted in descending order.
+    keyset : bool
+        Whether the sort key of the rows is selected and breaks ties,
+        for keyset pagination.
+    cursor : bool | None
+        None to skip the rows before the page with OFFSET, bound to the
+        "offset" parameter, otherwise whether the sort value of the cursor
+        the page starts after is NULL.
+    count : bool
+        Whether the filtered count is selected, with a window function.
+    limit : bool
+        Whether the number of rows is limited, bound to the "limit"
+        parameter.
+    by_relevance : bool
+        Whether the matches of a ranked search are ordered by relevance
+        first, then by the sort column, instead of by relevance only
+        between rows with equal sort values.
+
+    Returns
+    -------
+    Select
+        Statement selecting the columns of the table, then the filtered
+        count and the sort key, if any.
+    """
+    expressions = table.get_expressions()
+    statement, search_rank = _select_filtered_rows(table, expressions, filters)
+
+    sort_column = expressions[sort_column_name]
+    sort_key = table.columns[sort_column_name].sort_key
+    if cursor is not None:
+        statement = statement.where(
+            get_keyset_clause(sort_column, descending, sort_key, null_sort_value=cursor)
+        )
+    else:
+        if count:
+            statement = statement.add_columns(
+                func.count().over().label(RECORDS_FILTERED_LABEL)
+            )
+        statement = statement.offset(bindparam("offset", type_=Integer))
+    if keyset:
+        statement = statement.add_columns(sort_key.label(KEYSET_KEY_LABEL))
+
+    sort_order = sort_column.desc() if descending else sort_column
+    key_order = sort_key.desc() if descending else sort_key
+    if by_relevance and search_rank is not None:
+        statement = statement.order_by(search_rank, sort_order, key_order)
+    else:
+        statement = statement.order_by(sort_order)
+        if search_rank is not None:
+            statement = statement.order_by(search_rank)
+        if keyset:
+            statement = statement.order_by(key_order)
+    if limit:
+        statement = statement.limit(bindparam("limit", type_=Integer))
+    return statement
+
+
+def get_sort(
+    table: DataTablesTable, sort_column_name: str | None, sort_direction: str | None
+) -> tuple[str, bool]:
+    """
+    Returns the sortable column rows are sorted by, and whether they are
+    sorted in descending order, from the sort requested by the client.
+    """
+    if sort_column_name is None:
+        return table.default_sort, table.default_descending
+    if sort_column_name not in table.sortable_columns:
+        sort_column_name = table.default_sort
+    return sort_column_name, sort_direction == "desc"
+
+
+def _get_statement(key: Hashable, build: Callable[[], Select]) -> Select:
+    return _statement_cache.get_or_compute(key, build)
+
+
+def _count(
+    connection: Connection, table: DataTablesTable, filters: tuple, params
+) -> int:
+    statement = _get_statement(
+        ("count", table.name, filters), lambda: build_count_statement(table, filters)
+    )
+    return connection.execute(statement, params).scalar_one()
+
+
+# ============================================================================
+# Draws
+# ============================================================================
+
+
+def query_datatables(
+    table: DataTablesTable,
+    dataset_id: int | None = None,
+    sort_column_name: str | None = None,
+    sort_direction: str | None = "asc",
+    start: int | None = None,
+    length: int | None = None,
+    search: str | None = None,
+    column_searches: Mapping[str, str] | None = None,
+) -> DataTablesPage:
+    """
+    Runs a DataTables draw against a table.
+
+    The filtered count is computed with a window function in the same
+    query as the requested page, so no full result set is ever loaded
+    into Python.
+
+    Rows are sorted by one of the sortable columns of the table, any other
+    sort column falling back to its default one, then by the sort key of
+    that column. Without a sort column, the matches of a ranked search
+    (see DataTablesTable) are sorted by relevance first.
+
+    Unless MDDE_KEYSET_PAGINATION is disabled, pages are fetched with
+    keyset pagination: the (sort value, sort key) of the last row of each
+    served page is kept as a cursor, and a request for the page right
+    after (or any page already reached) seeks to it instead of skipping
+    `start` rows. Pages without a known cursor, e.g. when the client jumps
+    to an arbitrary page, fall back to OFFSET.
+
+    Parameters
+    ----------
+    table : DataTablesTable
+        Table of the rows.
+    dataset_id : int | None
+        Id of the dataset the rows belong to, for tables with a dataset key.
+    sort_column_name : str | None
+        Name of the column to sort by, None if the client did not choose
+        one: rows are then sorted by the default sort of the table.
+    sort_direction : str | None
+        Either "asc" or "desc", ignored without a sort column.
+    start : int | None
+        Index of the first row of the page.
+    length : int | None
+        Number of rows in the page.
+    search : str | None
+        DataTables global search value, matched by the full-text search
+        index of the table when available, by its TEXT and NUMBER columns
+        otherwise.
+    column_searches : Mapping[str, str] | None
+        DataTables per-column search values, applied by the filters of
+        the columns.
+
+    Returns
+    -------
+    DataTablesPage
+        Total count, filtered count and rows of the page.
+    """
+    start = start if start is not None else 0
+    default_sort = sort_column_name is None
+    sort_column_name, descending = get_sort(table, sort_column_name, sort_direction)
+
+    filters, params = get_filters(table, dataset_id, search, column_searches)
+    total_filters, total_params = get_filters(table, dataset_id)
+    searched = len(filters) > len(total_filters)
+    ranked = table.rank_matches and ("match", True) in filters
+    by_relevance = ranked and default_sort
+    keyset = config.KEYSET_PAGINATION and not ranked
+
+    filter_key = (table.name, filters, tuple(params.items()))
+    cursor = None
+    records_filtered = None
+    if keyset and start > 0:
+        cursor = _cursor_cache.get((*filter_key, sort_column_name, descending, start))
+        records_filtered = _records_filtered_cache.get(filter_key)
+
+    with engine.connect() as connection:
+        records_total = _records_total_cache.get_or_compute(
+            (table.name, dataset_id),
+            lambda: _count(connection, table, total_filters, total_params),
+        )
+        if not searched:
+            records_filtered = records_total
+
+        page_params = dict(params)
+        if cursor is not None and records_filtered is not None:
+            sort_value, page_params["cursor_key"] = cursor
+            if sort_value is not None:
+                page_params["cursor_value"] = sort_value
+            cursor_shape = sort_value is None
+        else:
+            page_params["offset"] = start
+            cursor_shape = None
+        if length is not None:
+            page_params["limit"] = length
+        count = records_filtered is None
+        statement = _get_statement(
+            ("page", table.name, filters, sort_column_name, descending,
+             keyset, cursor_shape, count, length is not None, by_relevance),
+            lambda: build_page_statement(
+                table, filters, sort_column_name, descending,
+                keyset, cursor_shape, count, length is not None, by_relevance,
+            ),
+        )
+        result = connection.execute(statement, page_params)
+        labels = list(result.keys())
+        results = result.all()
+
+        if records_filtered is None:
+            if results:
+                records_filtered = results[0][labels.index(RECORDS_FILTERED_LABEL)]
+            else:
+                # Empty page (e.g. start past the end): the window column
+                # is not available, so count the filtered rows explicitly.
+                records_filtered = _count(connection, table, filters, params)
+            _records_filtered_cache.set(filter_key, records_filtered)
+
+    # The columns added for the filtered count and the keyset cursor
+    # come after the columns of the table.
+    column_number = len(table.columns)
+    columns = labels[:column_number]
+    rows = [row[:column_number] for row in results]
+
+    if keyset and rows:
+        sort_value = rows[-1][columns.index(sort_column_name)]
+        key_value = results[-1][labels.index(KEYSET_KEY_LABEL)]
+        _cursor_cache.set(
+            (*filter_key, sort_column_name, descending, start + len(rows)),
+            (sort_value, key_value),
+        )
+    return DataTablesPage(records_total, records_filtered, columns, rows)
+
+
+# ============================================================================
+# Requests and responses
+# ============================================================================
+
+
+class DataTablesRequest(NamedTuple):
+    """Parameters of a DataTables draw, as passed to the services."""
+
+    sort_column_name: str | None
+    sort_direction: str
+    start: int | None
+    length: int | None
+    search: str | None
+    column_searches: dict[str, str]
+
+
+def _parse_row_number(params: Mapping[str, str], name: str) -> int | None:
+    """
+    Returns the value of the start or length parameter of a DataTables
+    request, None if it is missing or negative (DataTables sends a length
+    of -1 for all rows).
+
+    Raises an HTTPException (400) if the value is not an integer.
+    """
+    value = params.get(name, "").strip()
+    if not value:
+        return None
+    if not _SIGNED_INTEGER.fullmatch(value):
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value!r}")
+    number = int(value)
+    return number if number >= 0 else None
+
+
+def parse_datatables_request(params: Mapping[str, str]) -> DataTablesRequest:
+    """
+    Returns the parameters of a DataTables draw from its query parameters.
+
+    Without an order, the sort column is None, i.e. the default sort
+    column of the table. Raises an HTTPException (400) if start or length
+    is not an integer.
+    """
+    sort_column_name = None
+    if sort_column_index := params.get("order[0][column]"):
+        sort_column_name = params.get(f"columns[{sort_column_index}][data]")
+    return DataTablesRequest(
+        sort_column_name=sort_column_name,
+        sort_direction="desc" if params.get("order[0][dir]") == "desc" else "asc",
+        start=_parse_row_number(params, "start"),
+        length=_parse_row_number(params, "length"),
+        search=params.get("search[value]"),
+        column_searches=parse_column_searches(params),
+    )
+
+
+async def respond_to_datatables(
+    request: Request,
+    service_function: Callable[..., DataTablesPage],
+    row_format: RowFormat = "objects",
+    **arguments,
+) -> "DataTablesResponse":
+    """
+    Runs a DataTables draw with a service function, in a worker thread.
+
+    Parameters
+    ----------
+    request : Request
+        DataTables request.
+    service_function : Callable[..., DataTablesPage]
+        Service returning a page, called with the parameters of the draw
+        (see DataTablesRequest) and the given arguments.
+    row_format : RowFormat
+        Format of the rows: "objects" or "arrays".
+    **arguments
+        Other arguments of the service, e.g. a dataset id.
+
+    Returns
+    -------
+    DataTablesResponse
+        JSON response for DataTables.
+    """
+    draw = parse_datatables_request(request.query_params)
+    page = await run_in_threadpool(service_function, **arguments, **draw._asdict())
+    return DataTablesResponse(page, request.query_params.get("draw"), row_format)
+
+
+class DataTablesResponse(Response):
+    """
+    JSON response to a DataTables draw, serialized with orjson straight
+    from the rows of a page, without going through FastAPI's encoder.
+
+    Parameters
+    ----------
+    page : DataTablesPage
+        Page of results.
+    draw : str | None
+        Draw counter sent by DataTables, returned as is.
+    row_format : RowFormat
+        Either "objects" for one object per row, keyed by column name,
+        or "arrays" for one array per row, with the column names
+        under "columns".
+    """
+
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        page: DataTablesPage,
+        draw: str | None,
+        row_format: RowFormat = "objects",
+        status_code: int = 200,
+        headers: Mapping[str, str] | None = None,
+        background: BackgroundTask | None = None,
+    ):
+        content = {
+            "draw": draw,
+            "recordsTotal": page.records_total,
+            "recordsFiltered": page.records_filtered,
+        }
+        if row_format == "arrays":
+            content["columns"] = page.columns
+            content["data"] = page.rows
+        else:
+            content["data"] = [
+                dict(zip(page.columns, row, strict=True)) for row in page.rows
+            ]
+        super().__init__(content, status_code, headers, background=background)
+
+    def render(self, content: dict[str, Any]) -> bytes:
+        return orjson.dumps(content)
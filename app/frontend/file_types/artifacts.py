@@ -0,0 +1,224 @@
+"""Pre-compressed TSV exports of the files of each file type.
+
+The exports only depend on the database, so they are stored as files,
+compressed with gzip (and zstd with Python 3.14+), under:
+
+    MDDE_EXPORT_DIRECTORY/<database version>/mdverse_<file type>.tsv.gz
+
+They are built for all file types in one pass over the File table by:
+
+    uv run python -m app.cli exports
+
+When an export is missing, it is streamed from the database, as before,
+and written to the store at the same time for later requests.
+"""
+
+import itertools
+import operator
+import os
+import shutil
+import tempfile
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+
+from loguru import logger
+from sqlmodel import Session
+
+from ... import config
+from ...cache import get_database_version
+from ...database import engine
+from . import service
+
+EXPORT_DIRECTORY = Path(config.EXPORT_DIRECTORY)
+
+# Encodings of the stored exports -> file name suffix,
+# in order of preference when serving them.
+ARTIFACT_ENCODINGS = {"gzip": ".gz"}
+if service.zstd is not None:
+    ARTIFACT_ENCODINGS = {"zstd": ".zst", **ARTIFACT_ENCODINGS}
+
+
+def get_artifact_path(file_type: str, encoding: str) -> Path:
+    """
+    Returns the path of the export of a file type for the current database.
+    """
+    return (
+        EXPORT_DIRECTORY
+        / get_database_version()
+        / f"mdverse_{file_type}.tsv{ARTIFACT_ENCODINGS[encoding]}"
+    )
+
+
+def find_artifact(file_type: str, encodings: list[str]) -> tuple[str, Path] | None:
+    """
+    Returns the first (encoding, path) of a stored export of a file type,
+    among encodings, or None.
+    """
+    if not config.EXPORT_ARTIFACTS:
+        return None
+    for encoding in encodings:
+        if encoding in ARTIFACT_ENCODINGS:
+            path = get_artifact_path(file_type, encoding)
+            if path.is_file():
+                return encoding, path
+    return None
+
+
+def remove_old_artifacts() -> None:
+    """
+    Deletes the exports of previous database versions.
+    """
+    current_version = get_database_version()
+    for directory in EXPORT_DIRECTORY.glob("*"):
+        if directory.is_dir() and directory.name != current_version:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+class ArtifactWriter:
+    """
+    Writes the export of a file type in every artifact encoding.
+
+    Files are written under temporary names, and renamed by commit() once
+    complete, so that partial exports are never served.
+    """
+
+    def __init__(self, file_type: str):
+        directory = get_artifact_path(file_type, "gzip").parent
+        directory.mkdir(parents=True, exist_ok=True)
+        self.parts = []
+        for encoding in ARTIFACT_ENCODINGS:
+            path = get_artifact_path(file_type, encoding)
+            file_descriptor, temporary_path = tempfile.mkstemp(
+                dir=directory, prefix=f".{path.name}."
+            )
+            self.parts.append((
+                encoding,
+                service.get_compressor(encoding),
+                os.fdopen(file_descriptor, "wb"),
+                Path(temporary_path),
+                path,
+            ))
+
+    def write(self, text: str) -> dict[str, bytes]:
+        """
+        Writes TSV text, and returns the bytes written per encoding.
+        """
+        data = text.encode("utf-8")
+        written = {}
+        for encoding, compressor, file, _, _ in self.parts:
+            written[encoding] = compressor.compress(data)
+            file.write(written[encoding])
+        return written
+
+    def commit(self) -> dict[str, bytes]:
+        """
+        Completes the files, and returns the last bytes written per encoding.
+        """
+        written = {}
+        for encoding, compressor, file, temporary_path, path in self.parts:
+            written[encoding] = compressor.flush()
+            file.write(written[encoding])
+            file.close()
+            # mkstemp creates files only readable by their owner.
+            os.chmod(temporary_path, 0o644)
+            os.replace(temporary_path, path)
+        return written
+
+    def discard(self) -> None:
+        for _, _, file, temporary_path, _ in self.parts:
+            file.close()
+            temporary_path.unlink(missing_ok=True)
+
+
+def build_export_artifacts(chunk_size: int = service.EXPORT_CHUNK_SIZE) -> None:
+    """
+    Writes the exports of all file types, in one pass over the File table.
+    """
+    statement = service.get_statement_for_files_of_all_file_types()
+    writers: dict[str, ArtifactWriter] = {}
+    try:
+        with Session(engine) as session:
+            results = session.exec(statement.execution_options(yield_per=chunk_size))
+            # The last column is the file type, which is not exported.
+            header = service.format_tsv([list(results.keys())[:-1]])
+            for file_type in service.get_file_type_names():
+                writers[file_type] = ArtifactWriter(file_type)
+                writers[file_type].write(header)
+            for rows in results.partitions():
+                rows = sorted(rows, key=operator.itemgetter(-1))
+                for file_type, file_type_rows in itertools.groupby(
+                    rows, key=operator.itemgetter(-1)
+                ):
+                    writers[file_type].write(
+                        service.format_tsv(row[:-1] for row in file_type_rows)
+                    )
+    except BaseException:
+        for writer in writers.values():
+            writer.discard()
+        raise
+    for file_type, writer in writers.items():
+        writer.commit()
+        logger.info(f"Built export of {file_type} files")
+    remove_old_artifacts()
+
+
+def iter_tsv_with_write_through(
+    file_type: str, compression: str | None = None
+) -> Iterator[bytes]:
+    """
+    Yields the TSV export of a file type streamed from the database,
+    and stores it for later requests once fully streamed.
+
+    The export is only stored for existing file types, and if the store
+    is writable.
+
+    Parameters
+    ----------
+    file_type : str
+        Name of the file type.
+    compression : str | None
+        Either None for plain text, or an encoding of ARTIFACT_ENCODINGS.
+
+    Yields
+    ------
+    bytes
+        Chunks of the (possibly compressed) TSV file.
+    """
+    if not config.EXPORT_ARTIFACTS or file_type not in service.get_file_type_names():
+        yield from service.iter_tsv_of_files_for_a_file_type(file_type, compression)
+        return
+    try:
+        writer = ArtifactWriter(file_type)
+    except OSError as error:
+        logger.warning(f"Could not store the export of {file_type} files: {error}")
+        yield from service.iter_tsv_of_files_for_a_file_type(file_type, compression)
+        return
+    try:
+        for text in service.iter_tsv_text_of_files_for_a_file_type(file_type):
+            written = writer.write(text)
+            data = written[compression] if compression else text.encode("utf-8")
+            if data:
+                yield data
+    except BaseException:
+        # Including the client disconnecting before the end of the export.
+        writer.discard()
+        raise
+    written = writer.commit()
+    if compression:
+        yield written[compression]
+    remove_old_artifacts()
+
+
+def iter_decompressed_artifact(
+    path: Path, chunk_size: int = 64 * 1024
+) -> Iterator[bytes]:
+    """
+    Yields the TSV text of a stored gzip export, for clients not accepting
+    compressed responses.
+    """
+    decompressor = zlib.decompressobj(wbits=31)
+    with path.open("rb") as file:
+        while chunk := file.read(chunk_size):
+            yield decompressor.decompress(chunk)
+    yield decompressor.flush()
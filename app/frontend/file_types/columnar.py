@@ -0,0 +1,147 @@
+"""Parquet and Arrow IPC exports of file listings, for analysis jobs.
+
+Unlike TSV, columnar exports keep the column types (integers, booleans,
+dates), Parquet files are compressed column by column, and Arrow IPC
+streams are read without parsing nor copying, e.g. with:
+
+    pyarrow.ipc.open_stream(...).read_all()
+    pandas.read_parquet(...)
+
+Exports are built batch by batch from the database cursor, so memory
+usage does not depend on the number of rows. pyarrow is imported on the
+first export, not when the app starts.
+
+See:
+- https://parquet.apache.org/docs/file-format/
+- https://arrow.apache.org/docs/format/Columnar.html#ipc-streaming-format
+"""
+
+from __future__ import annotations
+
+import io
+from collections.abc import Iterator
+from typing import TYPE_CHECKING
+
+from sqlalchemy import types
+from sqlalchemy.sql import Select
+from sqlmodel import Session
+
+from ...database import get_export_engine
+from .service import EXPORT_CHUNK_SIZE
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# Export formats -> (media type, file name suffix).
+COLUMNAR_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", ".arrows"),
+}
+
+# Compression of the Parquet column chunks.
+PARQUET_COMPRESSION = "zstd"
+
+
+def get_arrow_type(sql_type: types.TypeEngine) -> pa.DataType:
+    """
+    Returns the Arrow type of the values of a SQL column type.
+    """
+    import pyarrow as pa
+
+    if isinstance(sql_type, types.Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, types.Integer):
+        return pa.int64()
+    if isinstance(sql_type, types.Float | types.Numeric):
+        return pa.float64()
+    if isinstance(sql_type, types.DateTime):
+        return pa.timestamp("us")
+    if isinstance(sql_type, types.Date):
+        return pa.date32()
+    return pa.string()
+
+
+def get_arrow_schema(statement: Select) -> pa.Schema:
+    """
+    Returns the Arrow schema of the rows selected by a statement.
+    """
+    import pyarrow as pa
+
+    return pa.schema([
+        (column.name, get_arrow_type(column.type))
+        for column in statement.selected_columns
+    ])
+
+
+def iter_record_batches(
+    statement: Select,
+    schema: pa.Schema,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[pa.RecordBatch]:
+    """
+    Yields the rows selected by a statement, chunk_size rows per batch.
+    """
+    import pyarrow as pa
+
+    with Session(get_export_engine()) as session:
+        results = session.exec(statement.execution_options(yield_per=chunk_size))
+        for rows in results.partitions():
+            columns = zip(*rows, strict=True)
+            yield pa.RecordBatch.from_arrays(
+                [
+                    pa.array(values, type=field.type)
+                    for values, field in zip(columns, schema, strict=True)
+                ],
+                schema=schema,
+            )
+
+
+def iter_columnar_export(
+    statement: Select,
+    export_format: str,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Yields the rows selected by a statement as a Parquet file or an Arrow
+    IPC stream, chunk by chunk.
+
+    Parameters
+    ----------
+    statement : Select
+        Statement selecting the exported rows.
+    export_format : str
+        Either "parquet" or "arrow".
+    chunk_size : int
+        Number of rows fetched and written per batch
+        (a row group of the Parquet file).
+
+    Yields
+    ------
+    bytes
+        Chunks of the file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = get_arrow_schema(statement)
+    sink = io.BytesIO()
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression=PARQUET_COMPRESSION)
+    elif export_format == "arrow":
+        writer = pa.ipc.new_stream(sink, schema)
+    else:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    def flush() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with writer:
+        for batch in iter_record_batches(statement, schema, chunk_size):
+            writer.write_batch(batch)
+            if data := flush():
+                yield data
+    # Footer (Parquet) or end-of-stream marker (Arrow IPC).
+    yield flush()
@@ -1,10 +1,20 @@
 """Endpoints for the page: file_types"""
 
-from fastapi import APIRouter, Request, Response
-from fastapi.responses import HTMLResponse, JSONResponse
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
 
-from . import service
+from ...concurrency import iterate_in_threadpool, run_in_threadpool
+from ...http_cache import is_not_modified
+from ..datatables import DataTablesResponse, RowFormat, respond_to_datatables
+from . import artifacts, columnar, service
 
 router = APIRouter(
     prefix="",
@@ -16,7 +26,7 @@ templates = Jinja2Templates(directory="templates")
 
 @router.get("/file_types", response_class=HTMLResponse)
 async def file_types_table(request: Request):
-    file_type_stats_summary = service.get_file_types_stats()
+    file_type_stats_summary = await run_in_threadpool(service.get_file_types_stats)
     return templates.TemplateResponse(
         "file_types_page.html",
         {
@@ -38,78 +48,148 @@ async def display_button_to_download_file_list(request: Request, file_type: str)
     )
 
 # Download the list of files for a given file type.
+# The stored, compressed export is served when available (with range
+# requests support), otherwise the TSV file is streamed while rows are read
+# from the database, and stored for later requests.
+# Parquet and Arrow IPC exports are streamed batch by batch from the database.
 @router.get("/file_types/{file_type}/download_list/")
-async def download_file_list(file_type: str):
-    df = service.get_list_of_files_for_a_file_type(file_type)
-    tsv_data = df.to_csv(index=False, sep="\t")
+async def download_file_list(
+    request: Request,
+    file_type: str,
+    compression: Literal["gzip"] | None = None,
+    export_format: Annotated[
+        Literal["tsv", "parquet", "arrow"], Query(alias="format")
+    ] = "tsv",
+    ):
+    if export_format != "tsv":
+        return stream_columnar_export(
+            service.get_statement_for_files_of_a_file_type(file_type),
+            export_format,
+            f"mdverse_{file_type}",
+        )
+
+    filename = f"mdverse_{file_type}.tsv"
+    media_type = "text/tsv"
+    if compression == "gzip":
+        filename += ".gz"
+        media_type = "application/gzip"
     headers = {
-        "Content-Disposition": f"attachment; filename=mdverse_{file_type}.tsv"
+        "Content-Disposition": f"attachment; filename={filename}",
     }
-    return Response(content=tsv_data, media_type="text/tsv", headers=headers)
 
+    accepted_encodings = []
+    if compression:
+        # The compressed file itself is downloaded.
+        artifact = artifacts.find_artifact(file_type, [compression])
+    else:
+        # The TSV file is downloaded, sent compressed if the client accepts it.
+        headers["Vary"] = "Accept-Encoding"
+        accepted_encodings = parse_accept_encoding(request.headers.get("accept-encoding"))
+        artifact = artifacts.find_artifact(
+            file_type, [*accepted_encodings, "gzip"]
+        )
+
+    if artifact is None:
+        tsv_chunks = artifacts.iter_tsv_with_write_through(
+            file_type, compression=compression
+        )
+        return StreamingResponse(
+            iterate_in_threadpool(tsv_chunks), media_type=media_type, headers=headers
+        )
+
+    encoding, path = artifact
+    if not compression and encoding not in accepted_encodings:
+        tsv_chunks = artifacts.iter_decompressed_artifact(path)
+        return StreamingResponse(
+            iterate_in_threadpool(tsv_chunks), media_type=media_type, headers=headers
+        )
+    if not compression:
+        headers["Content-Encoding"] = encoding
+    stat_result = path.stat()
+    headers["ETag"] = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+    if is_not_modified(request.headers, headers["ETag"], stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        path, media_type=media_type, headers=headers, stat_result=stat_result
+    )
 
-# ============================================================================
-# GRO files
-# ============================================================================
-@router.get("/file_types/gro", response_class=HTMLResponse)
-async def display_gro_files_page(request: Request):
-    return templates.TemplateResponse(
-        "gro_files_page.html",
-        {
-            "request": request,
-        }
+
+# Download the GRO, MDP or XTC files with their analysis,
+# as a Parquet file or an Arrow IPC stream.
+@router.get("/file_types/{file_type}/download_analysis/")
+async def download_analysis(
+    file_type: str,
+    dataset_id: int | None = None,
+    export_format: Annotated[
+        Literal["parquet", "arrow"], Query(alias="format")
+    ] = "parquet",
+    ):
+    if file_type not in service.ANALYSIS_TABLES:
+        raise HTTPException(status_code=404, detail="File type not analysed")
+    filename = f"mdverse_{file_type}_analysis"
+    if dataset_id is not None:
+        filename += f"_dataset_{dataset_id}"
+    return stream_columnar_export(
+        service.get_statement_for_analysed_files(file_type, dataset_id),
+        export_format,
+        filename,
     )
 
-@router.get("/file_types/gro/datatables", response_class=JSONResponse)
-async def get_gro_files_for_datatables(request: Request, dataset_id: int | None = None):
-    """
-    Get GRO files data for DataTables.
 
-    See:
-    - https://datatables.net/manual/server-side
-    - https://blog.stackpuz.com/create-an-api-for-datatables-with-fastapi/
+def stream_columnar_export(statement, export_format: str, filename: str):
+    """
+    Returns the response streaming the rows selected by a statement,
+    as a Parquet file or an Arrow IPC stream.
 
     Parameters
     ----------
-    request : Request
-        DataTables request parameters + optional dataset id.
+    statement : Select
+        Statement selecting the exported rows.
+    export_format : str
+        Either "parquet" or "arrow".
+    filename : str
+        Name of the downloaded file, without suffix.
 
     Returns
     -------
-    dict
-        JSON dictionnary for DataTables.
+    StreamingResponse
+        Response streaming the file.
     """
-    print("Hello from /files/topologie/")
-    print("dataset_id", dataset_id)
-    params = request.query_params.get
-    sort_column_name = "dataset_origin"
-    if params("order[0][column]"):
-        sort_column_idx = params("order[0][column]")
-        sort_column_name = params(f"columns[{sort_column_idx}][data]")
-    sort_direction = "asc"
-    if params("order[0][dir]") == "desc":
-        sort_direction = "desc"
-    number_of_top_files_total = len(service.get_gro_files_for_datatables(dataset_id=dataset_id))
-    number_of_top_files_filtered = len(service.get_gro_files_for_datatables(
-        dataset_id=dataset_id,
-        search=params("search[value]"),
-    ))
-    top_files = service.get_gro_files_for_datatables(
-        dataset_id=dataset_id,
-        sort_column_name=sort_column_name,
-        sort_direction=sort_direction,
-        start=params("start"),
-        length=params("length"),
-        search=params("search[value]"),
+    media_type, suffix = columnar.COLUMNAR_FORMATS[export_format]
+    chunks = columnar.iter_columnar_export(statement, export_format)
+    return StreamingResponse(
+        iterate_in_threadpool(chunks),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}{suffix}"},
+    )
+
+
+def parse_accept_encoding(accept_encoding: str | None) -> list[str]:
+    """
+    Returns the content codings accepted by the client, from an
+    Accept-Encoding header, ignoring the ones with a zero quality.
+    """
+    encodings = []
+    for item in (accept_encoding or "").split(","):
+        encoding, _, parameters = item.partition(";")
+        if parameters.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if encoding.strip():
+            encodings.append(encoding.strip().lower())
+    return encodings
+
+
+# ============================================================================
+# GRO files
+# ============================================================================
+@router.get("/file_types/gro", response_class=HTMLResponse)
+async def display_gro_files_page(request: Request):
+    return templates.TemplateResponse(
+        "gro_files_page.html",
+        {
+            "request": request,
+        }
     )
-    # Serialize SQLmodel results to JSON
-    data = [ row._mapping for row in top_files ]
-    return {
-        "draw": params("draw"),
-        "recordsTotal": number_of_top_files_total,
-        "recordsFiltered": number_of_top_files_filtered,
-        "data": data,
-    }
 
 # ============================================================================
 # MDP files
@@ -123,63 +203,19 @@ async def display_mdp_files_page(request: Request):
         }
     )
 
-@router.get("/file_types/mdp/datatables", response_class=JSONResponse)
-async def get_mdp_files_for_datatables(request: Request, dataset_id: int | None = None):
-    """
-    Get MDP files data for DataTables.
-
-    See:
-    - https://datatables.net/manual/server-side
-    - https://blog.stackpuz.com/create-an-api-for-datatables-with-fastapi/
-
-    Parameters
-    ----------
-    request : Request
-        DataTables request parameters + optional dataset id.
-
-    Returns
-    -------
-    dict
-        JSON dictionnary for DataTables.
-    """
-    print("dataset_id", dataset_id)
-    params = request.query_params.get
-    sort_column_name = "dataset_origin"
-    if params("order[0][column]"):
-        sort_column_idx = params("order[0][column]")
-        sort_column_name = params(f"columns[{sort_column_idx}][data]")
-    sort_direction = "asc"
-    if params("order[0][dir]") == "desc":
-        sort_direction = "desc"
-    number_of_mdp_files_total = len(service.get_mdp_files_for_datatables(dataset_id=dataset_id))
-    number_of_mdp_files_filtered = len(service.get_mdp_files_for_datatables(
-        dataset_id=dataset_id,
-        search=params("search[value]"),
-    ))
-    mdp_files = service.get_mdp_files_for_datatables(
-        dataset_id=dataset_id,
-        sort_column_name=sort_column_name,
-        sort_direction=sort_direction,
-        start=params("start"),
-        length=params("length"),
-        search=params("search[value]"),
-    )
-    # Serialize SQLmodel results to JSON
-    data = [ row._mapping for row in mdp_files ]
-    return {
-        "draw": params("draw"),
-        "recordsTotal": number_of_mdp_files_total,
-        "recordsFiltered": number_of_mdp_files_filtered,
-        "data": data,
-    }
 
 # ============================================================================
-# XTC files
+# Analysed files (GRO, MDP, XTC)
 # ============================================================================
-@router.get("/file_types/xtc/datatables", response_class=JSONResponse)
-async def get_xtc_files_for_datatables(request: Request, dataset_id: int | None = None):
+@router.get("/file_types/{file_type}/datatables", response_class=DataTablesResponse)
+async def get_analysed_files_for_datatables(
+    request: Request,
+    file_type: str,
+    dataset_id: int | None = None,
+    row_format: Annotated[RowFormat, Query(alias="format")] = "objects",
+):
     """
-    Get XTC files data for DataTables.
+    Get the analysed files of a file type for DataTables.
 
     See:
     - https://datatables.net/manual/server-side
@@ -188,39 +224,25 @@ async def get_xtc_files_for_datatables(request: Request, dataset_id: int | None
     Parameters
     ----------
     request : Request
-        DataTables request parameters + optional dataset id.
+        DataTables request parameters.
+    file_type : str
+        Name of an analysed file type (see service.ANALYSIS_TABLES).
+    dataset_id : int | None
+        Id of the dataset of the files, if any.
+    row_format : RowFormat
+        Format of the rows: "objects" (default) or "arrays".
 
     Returns
     -------
-    dict
+    DataTablesResponse
         JSON dictionnary for DataTables.
     """
-    params = request.query_params.get
-    sort_column_name = "dataset_origin"
-    if params("order[0][column]"):
-        sort_column_idx = params("order[0][column]")
-        sort_column_name = params(f"columns[{sort_column_idx}][data]")
-    sort_direction = "asc"
-    if params("order[0][dir]") == "desc":
-        sort_direction = "desc"
-    number_of_mdp_files_total = len(service.get_xtc_files_for_datatables(dataset_id=dataset_id))
-    number_of_mdp_files_filtered = len(service.get_xtc_files_for_datatables(
-        dataset_id=dataset_id,
-        search=params("search[value]"),
-    ))
-    mdp_files = service.get_xtc_files_for_datatables(
+    if file_type not in service.ANALYSIS_TABLES:
+        raise HTTPException(status_code=404, detail="File type not analysed")
+    return await respond_to_datatables(
+        request,
+        service.get_analysed_files_for_datatables,
+        row_format,
+        file_type=file_type,
         dataset_id=dataset_id,
-        sort_column_name=sort_column_name,
-        sort_direction=sort_direction,
-        start=params("start"),
-        length=params("length"),
-        search=params("search[value]"),
     )
-    # Serialize SQLmodel results to JSON
-    data = [ row._mapping for row in mdp_files ]
-    return {
-        "draw": params("draw"),
-        "recordsTotal": number_of_mdp_files_total,
-        "recordsFiltered": number_of_mdp_files_filtered,
-        "data": data,
-    }
@@ -1,11 +1,24 @@
 """SQL queries for file types"""
 
-import pandas as pd
-from sqlalchemy import extract, func, case, desc
+import csv
+import io
+import zlib
+from collections.abc import Iterator
+
+from sqlalchemy import extract, case, join
 from sqlalchemy.orm import selectinload, aliased
-from sqlmodel import Session, select, or_, col
+from sqlmodel import Session, select, col
 from typing import Optional
 
+try:
+    # Standard library since Python 3.14.
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+from ... import search_index, summary_tables
+from ...cache import cached_by_database_version
+from ...database import engine, get_export_engine
 from ...db_schema import (
     Dataset,
     DataSource,
@@ -14,8 +27,112 @@ from ...db_schema import (
     ParameterFile,
     TopologyFile,
     TrajectoryFile,
-    engine,
 )
+from ..datatables import (
+    BOOLEAN,
+    ENUM,
+    NUMBER,
+    NUMERIC,
+    TEXT,
+    DataTablesColumn,
+    DataTablesPage,
+    DataTablesTable,
+    query_datatables,
+    select_table_rows,
+)
+
+# Number of rows fetched from the database per chunk of TSV export.
+EXPORT_CHUNK_SIZE = 10_000
+
+
+def get_analysis_table(
+    name: str,
+    analysis_model,
+    analysis_columns: list[DataTablesColumn],
+) -> DataTablesTable:
+    """
+    Returns the DataTables table of the analysed files of a file type,
+    with the columns of their analysis, then of their file and dataset.
+
+    Parameters
+    ----------
+    name : str
+        Name of the file type.
+    analysis_model : type
+        Model of the analysis table, keyed by file_id.
+    analysis_columns : list[DataTablesColumn]
+        Columns of the analysis. Sortable ones are broken ties by the
+        file_id of the analysis table, so that an index on the column
+        (see app.indexes) serves the order.
+
+    Returns
+    -------
+    DataTablesTable
+        Table of the analysed files, sorted by file name by default.
+    """
+    # Columns of the dataset (origin, id) are not sortable, as no index
+    # can order the files by them.
+    return DataTablesTable(
+        name=name,
+        columns=[
+            *analysis_columns,
+            DataTablesColumn("file_name", File.name, sort_key=File.file_id, search=TEXT),
+            DataTablesColumn("dataset_id_in_origin", Dataset.id_in_data_source, search=TEXT),
+            DataTablesColumn("dataset_url", Dataset.url_in_data_source),
+            DataTablesColumn("dataset_origin", DataSource.name, filter=ENUM, search=TEXT),
+        ],
+        from_clause=(
+            join(analysis_model, File, analysis_model.file_id == File.file_id)
+            .join(Dataset, File.dataset_id == Dataset.dataset_id)
+            .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
+        ),
+        default_sort="file_name",
+        dataset_key=File.dataset_id,
+        search_table=search_index.file_search,
+        search_key=File.file_id,
+    )
+
+
+# Tables of the analysed files, per file type. Thermostat, barostat and
+# integrator of MDP files are indexed by the full-text search index too.
+ANALYSIS_TABLES = {
+    "gro": get_analysis_table("gro", TopologyFile, [
+        DataTablesColumn(
+            "atom_number", TopologyFile.atom_number,
+            filter=NUMERIC, sort_key=TopologyFile.file_id, search=NUMBER,
+        ),
+        *[
+            DataTablesColumn(
+                name, getattr(TopologyFile, name),
+                filter=BOOLEAN, sort_key=TopologyFile.file_id,
+            )
+            for name in ("has_protein", "has_nucleic", "has_lipid", "has_glucid", "has_water_ion")
+        ],
+    ]),
+    "mdp": get_analysis_table("mdp", ParameterFile, [
+        *[
+            DataTablesColumn(
+                name, getattr(ParameterFile, name),
+                filter=NUMERIC, sort_key=ParameterFile.file_id,
+            )
+            for name in ("dt", "nsteps", "temperature")
+        ],
+        *[
+            DataTablesColumn(
+                name, getattr(ParameterFile, name),
+                filter=ENUM, sort_key=ParameterFile.file_id, search=TEXT,
+            )
+            for name in ("thermostat", "barostat", "integrator")
+        ],
+    ]),
+    "xtc": get_analysis_table("xtc", TrajectoryFile, [
+        DataTablesColumn(
+            name, getattr(TrajectoryFile, name),
+            filter=NUMERIC, sort_key=TrajectoryFile.file_id, search=NUMBER,
+        )
+        for name in ("atom_number", "frame_number")
+    ]),
+}
 
 
 def get_file_types_stats():
@@ -36,25 +153,15 @@ def get_file_types_stats():
                                     file type in gigabytes.
     """
     with Session(engine) as session:
-        statement = (
-            select(
-            FileType.name.label("file_type"),
-            func.count(File.file_id).label("number_of_files"),
-            func.count(func.distinct(Dataset.dataset_id)).label("number_of_datasets"),
-            (func.sum(File.size_in_bytes) / 1e9).label("total_size_in_GB"),
-            )
-            .join(File, File.file_type_id == FileType.file_type_id)
-            .outerjoin(Dataset, Dataset.dataset_id == File.dataset_id)
-            .group_by(FileType.name)
-            .order_by(func.count(func.distinct(File.file_id)).desc())
-        )
+        statement = summary_tables.select_file_type_summary()
         file_type_stats_summary = session.exec(statement).all()
         return file_type_stats_summary
 
 
-def get_list_of_files_for_a_file_type(file_type: str) -> pd.DataFrame:
+def get_statement_for_exported_files():
     """
-    Returns a DataFrame with all files of a given file type.
+    Returns the statement selecting all files,
+    with the columns of the exported TSV files.
     """
     # Create an alias for the parent file
     ParentFile = aliased(File)
@@ -65,208 +172,162 @@ def get_list_of_files_for_a_file_type(file_type: str) -> pd.DataFrame:
         else_=File.url
     ).label("file_url")
 
-    with Session(engine) as session:
-        statement = (
-            select(
-                Dataset.id_in_data_source.label("dataset_id"),
-                DataSource.name.label("dataset_origin"),
-                Dataset.date_created.label("date_created"),
-                File.name.label("file_name"),
-                File.size_in_bytes.label("file_size_in_bytes"),
-                File.is_from_zip_file.label("is_file_from_zip_file"),
-                file_url_expr,
-                Dataset.url_in_data_source.label("dataset_url"),
-            )
-            .join(FileType, File.file_type_id == FileType.file_type_id)
-            .join(Dataset, File.dataset_id == Dataset.dataset_id)
-            .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
-            # Left join the parent file so that files from a zip can retrieve the parent URL.
-            .join(ParentFile, File.parent_zip_file_id == ParentFile.file_id, isouter=True)
-            .where(FileType.name == file_type)
-        )
-        results = session.exec(statement).all()
-        # Convert results to a list of dictionaries then to a DataFrame
-        data = [dict(row._mapping) for row in results]
-        df = pd.DataFrame(data)
-        return df
-
-def get_gro_files_for_datatables(
-    dataset_id: int | None = None,
-    sort_column_name: str | None = None,
-    sort_direction: str | None = "asc",
-    start: int | None = None,
-    length: int | None = None,
-    search: str | None = None,
-    ) -> list[TopologyFile]:
-    """
-    Returns a list of GRO files with their related File, Dataset, and Dataset.origin info.
-    
-    If a dataset_id is provided, only GRO files for this dataset are returned.
-    Otherwise, all GRO files are returned.
-    """
     statement = (
         select(
-            TopologyFile.atom_number.label("atom_number"),
-            TopologyFile.has_protein.label("has_protein"),
-            TopologyFile.has_nucleic.label("has_nucleic"),
-            TopologyFile.has_lipid.label("has_lipid"),
-            TopologyFile.has_glucid.label("has_glucid"),
-            TopologyFile.has_water_ion.label("has_water_ion"),
+            Dataset.id_in_data_source.label("dataset_id"),
+            DataSource.name.label("dataset_origin"),
+            Dataset.date_created.label("date_created"),
             File.name.label("file_name"),
-            Dataset.id_in_data_source.label("dataset_id_in_origin"),
+            File.size_in_bytes.label("file_size_in_bytes"),
+            File.is_from_zip_file.label("is_file_from_zip_file"),
+            file_url_expr,
             Dataset.url_in_data_source.label("dataset_url"),
-            DataSource.name.label("dataset_origin"),
         )
-        .join(File, TopologyFile.file_id == File.file_id)
+        .join(FileType, File.file_type_id == FileType.file_type_id)
         .join(Dataset, File.dataset_id == Dataset.dataset_id)
         .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
+        # Left join the parent file so that files from a zip can retrieve the parent URL.
+        .join(ParentFile, File.parent_zip_file_id == ParentFile.file_id, isouter=True)
     )
+    return statement
 
-    if dataset_id is not None:
-        statement = statement.where(TopologyFile.file.has(File.dataset_id == dataset_id))
-
-    if sort_column_name is not None:
-        if sort_direction == "asc":
-            statement = statement.order_by(sort_column_name)
-        elif sort_direction == "desc":
-            statement = statement.order_by(desc(sort_column_name))
-
-    if start is not None:
-        statement = statement.offset(start)
-
-    if length is not None:
-        statement = statement.limit(length)
-
-    if search is not None:
-        statement = statement.where(or_(
-            DataSource.name.ilike(f"%{search}%"),
-            Dataset.id_in_data_source.ilike(f"%{search}%"),
-            File.name.ilike(f"%{search}%"),
-            TopologyFile.atom_number.ilike(f"%{search}%"),
-            TopologyFile.has_protein.ilike(f"%{search}%"),
-            TopologyFile.has_nucleic.ilike(f"%{search}%"),
-            TopologyFile.has_lipid.ilike(f"%{search}%"),
-            TopologyFile.has_glucid.ilike(f"%{search}%"),
-            TopologyFile.has_water_ion.ilike(f"%{search}%")
-        ))
-    with Session(engine) as session:
-        results = session.exec(statement).all()
-        return results
 
+def get_statement_for_files_of_a_file_type(file_type: str):
+    """
+    Returns the statement selecting all files of a given file type,
+    with the columns of the exported TSV file.
+    """
+    return get_statement_for_exported_files().where(FileType.name == file_type)
 
-def get_mdp_files_for_datatables(
-    dataset_id: int | None = None,
-    sort_column_name: str | None = None,
-    sort_direction: str | None = "asc",
-    start: int | None = None,
-    length: int | None = None,
-    search: str | None = None,
-    ) -> list[ParameterFile]:
+
+def get_statement_for_files_of_all_file_types():
     """
-    Returns a list of MDP files with their related File, Dataset, and Dataset.origin info.
-    
-    If a dataset_id is provided, only MDP files for this dataset are returned.
-    Otherwise, all MDP files are returned.
+    Returns the statement selecting the files of all file types,
+    with the columns of the exported TSV files and the name of the
+    file type as last column.
     """
-    statement = (
-        select(
-            ParameterFile.dt.label("dt"),
-            ParameterFile.nsteps.label("nsteps"),
-            ParameterFile.temperature.label("temperature"),
-            ParameterFile.thermostat,
-            ParameterFile.barostat,
-            ParameterFile.integrator,
-            File.name.label("file_name"),
-            Dataset.id_in_data_source.label("dataset_id_in_origin"),
-            Dataset.url_in_data_source.label("dataset_url"),
-            DataSource.name.label("dataset_origin"),
-        )
-        .join(File, ParameterFile.file_id == File.file_id)
-        .join(Dataset, File.dataset_id == Dataset.dataset_id)
-        .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
+    return get_statement_for_exported_files().add_columns(
+        FileType.name.label("file_type")
     )
 
-    if dataset_id is not None:
-        statement = statement.where(ParameterFile.file.has(File.dataset_id == dataset_id))
 
-    if sort_column_name is not None:
-        if sort_direction == "asc":
-            statement = statement.order_by(sort_column_name)
-        elif sort_direction == "desc":
-            statement = statement.order_by(desc(sort_column_name))
+@cached_by_database_version
+def get_file_type_names() -> list[str]:
+    """
+    Returns the names of all file types.
+    """
+    with Session(engine) as session:
+        return list(session.exec(select(FileType.name)).all())
+
+
+def get_compressor(compression: str):
+    """
+    Returns a compressor, with compress() and flush() methods,
+    for "gzip" or "zstd" (when available, Python 3.14+).
+    """
+    if compression == "gzip":
+        # wbits=31 produces a gzip container instead of a raw zlib stream.
+        return zlib.compressobj(wbits=31)
+    if compression == "zstd" and zstd is not None:
+        return zstd.ZstdCompressor()
+    raise ValueError(f"Unsupported compression: {compression}")
 
-    if start is not None:
-        statement = statement.offset(start)
 
-    if length is not None:
-        statement = statement.limit(length)
+def format_tsv(rows) -> str:
+    """
+    Returns rows formatted as TSV lines.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter="\t", lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
 
-    if search is not None:
-        statement = statement.where(or_(
-            DataSource.name.ilike(f"%{search}%"),
-            Dataset.id_in_data_source.ilike(f"%{search}%"),
-            File.name.ilike(f"%{search}%"),
-            ParameterFile.thermostat.ilike(f"%{search}%"),
-            ParameterFile.barostat.ilike(f"%{search}%"),
-            ParameterFile.integrator.ilike(f"%{search}%"),
-        ))
 
-    with Session(engine) as session:
-        results = session.exec(statement).all()
-        return results
+def iter_tsv_text_of_files_for_a_file_type(
+    file_type: str,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[str]:
+    """
+    Yields the header, then chunks of chunk_size lines, of the TSV export
+    of all files of a given file type.
+    """
+    statement = get_statement_for_files_of_a_file_type(file_type)
+    with Session(get_export_engine()) as session:
+        results = session.exec(statement.execution_options(yield_per=chunk_size))
+        yield format_tsv([results.keys()])
+        for rows in results.partitions():
+            yield format_tsv(rows)
+
+
+def iter_tsv_of_files_for_a_file_type(
+    file_type: str,
+    compression: str | None = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Yields the TSV export of all files of a given file type, chunk by chunk.
+
+    Rows are fetched from the database cursor `chunk_size` at a time,
+    so memory usage does not depend on the number of files.
+
+    Parameters
+    ----------
+    file_type : str
+        Name of the file type.
+    compression : str | None
+        Either None for plain text, "gzip" or "zstd".
+    chunk_size : int
+        Number of rows fetched and written per chunk.
 
-def get_xtc_files_for_datatables(
+    Yields
+    ------
+    bytes
+        Chunks of the (possibly compressed) TSV file.
+    """
+    compressor = get_compressor(compression) if compression else None
+    for text in iter_tsv_text_of_files_for_a_file_type(file_type, chunk_size):
+        data = text.encode("utf-8")
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def get_statement_for_analysed_files(file_type: str, dataset_id: int | None = None):
+    """
+    Returns the statement selecting the analysed files of a file type
+    (see ANALYSIS_TABLES) with their analysis and dataset info, of one
+    dataset if dataset_id is given.
+    """
+    return select_table_rows(ANALYSIS_TABLES[file_type], dataset_id)
+
+
+def get_analysed_files_for_datatables(
+    file_type: str,
     dataset_id: int | None = None,
     sort_column_name: str | None = None,
     sort_direction: str | None = "asc",
     start: int | None = None,
     length: int | None = None,
     search: str | None = None,
-    ) -> list[ParameterFile]:
+    column_searches: dict[str, str] | None = None,
+    ) -> DataTablesPage:
     """
-    Returns a list of XTC files with their related File, Dataset, and Dataset.origin info.
-    
-    If a dataset_id is provided, only XTC files for this dataset are returned.
-    Otherwise, all XTC files are returned.
+    Returns a page of the analysed files of a file type (see ANALYSIS_TABLES)
+    with their analysis and dataset info, together with the total and
+    filtered number of analysed files.
+
+    If a dataset_id is provided, only the files of this dataset are returned.
+    Otherwise, all analysed files of the file type are returned.
     """
-    statement = (
-        select(
-            TrajectoryFile.atom_number,
-            TrajectoryFile.frame_number,
-            File.name.label("file_name"),
-            Dataset.id_in_data_source.label("dataset_id_in_origin"),
-            Dataset.url_in_data_source.label("dataset_url"),
-            DataSource.name.label("dataset_origin"),
-        )
-        .join(File, TrajectoryFile.file_id == File.file_id)
-        .join(Dataset, File.dataset_id == Dataset.dataset_id)
-        .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
+    return query_datatables(
+        ANALYSIS_TABLES[file_type],
+        dataset_id=dataset_id,
+        sort_column_name=sort_column_name,
+        sort_direction=sort_direction,
+        start=start,
+        length=length,
+        search=search,
+        column_searches=column_searches,
     )
-
-    if dataset_id is not None:
-        statement = statement.where(TrajectoryFile.file.has(File.dataset_id == dataset_id))
-
-    if sort_column_name is not None:
-        if sort_direction == "asc":
-            statement = statement.order_by(sort_column_name)
-        elif sort_direction == "desc":
-            statement = statement.order_by(desc(sort_column_name))
-
-    if start is not None:
-        statement = statement.offset(start)
-
-    if length is not None:
-        statement = statement.limit(length)
-
-    if search is not None:
-        statement = statement.where(or_(
-            DataSource.name.ilike(f"%{search}%"),
-            Dataset.id_in_data_source.ilike(f"%{search}%"),
-            File.name.ilike(f"%{search}%"),
-            TrajectoryFile.atom_number.ilike(f"%{search}%"),
-            TrajectoryFile.frame_number.ilike(f"%{search}%"),
-        ))
-
-    with Session(engine) as session:
-        results = session.exec(statement).all()
-        return results
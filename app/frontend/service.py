@@ -1,29 +1,79 @@
+import functools
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from collections.abc import Iterator
 from pathlib import Path
 
 import time
 from datetime import timedelta
 
-import pandas as pd
-import matplotlib.pyplot as plt
-from bokeh.models import ColumnDataSource, NumeralTickFormatter
-from bokeh.plotting import figure
-from sqlalchemy import extract, func, case, desc
+from sqlalchemy import func, case, desc
 from sqlalchemy.orm import selectinload, aliased
+from loguru import logger
 from sqlmodel import Session, select, or_, col
-from wordcloud import STOPWORDS, WordCloud
 from typing import Optional
 
+from .. import summary_tables
+from ..cache import cached_by_database_version, get_database_version
+from ..database import engine
+# Bokeh, pandas and wordcloud (with matplotlib) take about a second to
+# import: they are imported by the functions using them, on first use,
+# instead of every time the app starts.
+
 from ..db_schema import (
     Dataset,
     DataSource,
-    File,
-    FileType,
     ParameterFile,
     TopologyFile,
     TrajectoryFile,
-    engine,
 )
 
+# Wordcloud images are generated in the static directory,
+# one per database version.
+WORDCLOUD_DIRECTORY = Path("static")
+# Same word pattern as the wordcloud package: words of 2+ characters.
+WORD_PATTERN = re.compile(r"\w[\w']+")
+# Custom stopwords to remove unwanted words (adjust as needed),
+# in addition to the stopwords of the wordcloud package.
+WORDCLOUD_CUSTOM_STOPWORDS = {
+    "none",
+    "and",
+    "of",
+    "with",
+    "which",
+    "incl",
+    "from",
+    "the",
+    "for",
+    "on",
+    "in",
+    "to",
+    "by",
+    "as",
+}
+
+_wordcloud_lock = threading.Lock()
+_wordcloud_thread_lock = threading.Lock()
+_wordcloud_thread: threading.Thread | None = None
+# Database version for which the wordcloud image could not be generated
+# (no titles, or an error): its generation is not retried.
+_wordcloud_failed_version: str | None = None
+
+# File types counted as topology and trajectory files in the home page banner.
+TOPOLOGY_FILE_TYPES = ["pdb", "crd", "gro", "coor"]
+TRAJECTORY_FILE_TYPES = ["trr", "xtc", "dcd", "inpcrd", "dtr", "mdcrd", "nc", "ncdf", "trj"]
+
+# Names of data repositories displayed in plots.
+# Other data sources are displayed capitalized.
+REPOSITORY_DISPLAY_NAMES = {
+    "zenodo": "Zenodo",
+    "osf": "OSF",
+    "figshare": "Figshare",
+}
+
 
 # ============================================================================
 # Queries for index.html
@@ -44,52 +94,13 @@ def get_dataset_origin_summary() -> tuple[list[any], dict[str, str]]:
         total_files
     """
     with Session(engine) as session:
-        statement = (
-            select(
-                # Dataset stats
-                DataSource.name.label("dataset_origin"),
-                func.count(func.distinct(Dataset.dataset_id)).label("number_of_datasets"),
-                func.min(Dataset.date_created).label("first_dataset"),
-                func.max(Dataset.date_created).label("last_dataset"),
-
-                # Count files that are not zip files, also is_from_zip_file == False
-                func.count(func.distinct(File.file_id))
-                   .filter(
-                       (File.is_from_zip_file == False),
-                       (FileType.name != "zip")
-                       )
-                   .label("non_zip_files"),
-
-                # Sum size of files that has is_from_zip_file == False
-                (func.sum(File.size_in_bytes).filter(File.is_from_zip_file == False)/ 1e9
-                ).label("total_size_in_GB_non_zip_and_zip_files"),
-
-                # Count parent zip files (FileType.name == 'zip')
-                func.count(func.distinct(File.file_id))
-                   .filter(
-                       (File.is_from_zip_file == False) &
-                       (FileType.name == "zip")
-                   )
-                   .label("zip_files"),
-
-                # Count files that are inside zip files
-                func.count(func.distinct(File.file_id))
-                   .filter(File.is_from_zip_file)
-                   .label("files_within_zip_files"),
-
-                # Total files (outside-non-zip_parent + parent zips + inside zips)
-                func.count(func.distinct(File.file_id)).label("total_files"),
-            )
-            .join(Dataset, Dataset.data_source_id == DataSource.data_source_id)
-            # We have to do an outerjoin here because
-            # there are some datasets with no files
-            # For example some osf datasets have no files
-            .outerjoin(File, File.dataset_id == Dataset.dataset_id)
-            .outerjoin(FileType, File.file_type_id == FileType.file_type_id)
-            .group_by(DataSource.name)
-        )
-
-        datasets_stats_results = session.exec(statement).all()
+        datasets_stats_results = session.exec(
+            summary_tables.select_origin_summary()
+        ).all()
+        file_type_counts = {
+            row.file_type: row.number_of_files
+            for row in session.exec(summary_tables.select_file_type_summary())
+        }
 
         datasets_stats_total_count = {
             "number_of_datasets": "{:,}".format(sum(
@@ -119,20 +130,13 @@ def get_dataset_origin_summary() -> tuple[list[any], dict[str, str]]:
         }
 
 
-        statement_topologies = (
-            select(func.count(File.file_id))
-            .join(FileType, File.file_type_id == FileType.file_type_id)
-            .where(FileType.name.in_(["pdb", "crd", "gro", "coor"]))
+        results_toplogies = sum(
+            file_type_counts.get(file_type, 0) for file_type in TOPOLOGY_FILE_TYPES
         )
-        results_toplogies = session.exec(statement_topologies).first()
-
-        statement_trajectories = (
-            select(func.count(File.file_id))
-            .join(FileType, File.file_type_id == FileType.file_type_id)
-            .where(FileType.name.in_(["trr", "xtc", "dcd", "inpcrd", "dtr", "mdcrd", "nc", "ncdf", "trj"]))
+        results_trajectories = sum(
+            file_type_counts.get(file_type, 0) for file_type in TRAJECTORY_FILE_TYPES
         )
-        results_trajectories = session.exec(statement_trajectories).first()
-        
+
         statement_sources = select(func.count()).select_from(DataSource)
         result_sources = session.exec(statement_sources).first()
 
@@ -145,103 +149,215 @@ def get_dataset_origin_summary() -> tuple[list[any], dict[str, str]]:
         return datasets_stats_results, datasets_stats_total_count, home_page_banner_stats
 
 
-def get_titles():
+@cached_by_database_version
+def get_home_page_snapshot() -> dict[str, any]:
+    """
+    Returns everything rendered on the home page:
+    summary rows, total counts, banner stats and the script/div pairs
+    of both Bokeh plots.
+
+    The snapshot is computed once per database version.
+    """
+    from bokeh.embed import components
+
+    datasets_stats_results, datasets_stats_total_count, home_page_banner_stats = get_dataset_origin_summary()
+
+    # Get the script and div for each plot.
+    files_plot_script, files_plot_div = components(create_files_plot())
+    datasets_plot_script, datasets_plot_div = components(create_datasets_plot())
+
+    return {
+        "results": datasets_stats_results,
+        "total_count": datasets_stats_total_count,
+        "banner_stats": home_page_banner_stats,
+        "files_plot_script": files_plot_script,
+        "files_plot_div": files_plot_div,
+        "datasets_plot_script": datasets_plot_script,
+        "datasets_plot_div": datasets_plot_div,
+    }
+
+
+def iter_titles(chunk_size: int = 10_000) -> Iterator[str]:
+    """
+    Yields all dataset titles, fetched from the database chunk by chunk.
+    """
     with Session(engine) as session:
-        statement = select(Dataset.title)
-        titles = session.exec(statement).all()
-    return titles
+        statement = select(Dataset.title).execution_options(yield_per=chunk_size)
+        for title in session.exec(statement):
+            if title:
+                yield title
 
 
-def generate_title_wordcloud():
-    wordcloud_path = Path("static/wordcloud.png")
+@functools.cache
+def get_wordcloud_stopwords() -> set[str]:
+    from wordcloud import STOPWORDS
+
+    return set(STOPWORDS) | WORDCLOUD_CUSTOM_STOPWORDS
+
+
+def get_title_word_frequencies() -> Counter:
+    """
+    Counts the words of all dataset titles, without stopwords.
+
+    Titles are processed one at a time, instead of being joined
+    into a single string.
+    """
+    stopwords = get_wordcloud_stopwords()
+    frequencies = Counter()
+    for title in iter_titles():
+        frequencies.update(
+            word for word in WORD_PATTERN.findall(title.lower())
+            if word not in stopwords
+        )
+    return frequencies
+
+
+def get_wordcloud_path() -> Path:
+    """
+    Returns the path of the wordcloud image for the current database.
+    """
+    return WORDCLOUD_DIRECTORY / f"wordcloud_{get_database_version()}.png"
+
+
+def generate_title_wordcloud() -> None:
+    """
+    Generates the wordcloud image of dataset titles, if it does not exist
+    for the current database yet, and removes images of previous databases.
+
+    The image is rendered with PIL (no pyplot global state)
+    and written atomically. If it cannot be generated, the failure is
+    remembered and start_wordcloud_generation() does not retry it until
+    the database changes.
+    """
+    from wordcloud import WordCloud
+
+    global _wordcloud_failed_version
+    with _wordcloud_lock:
+        version = get_database_version()
+        wordcloud_path = get_wordcloud_path()
+        if wordcloud_path.exists():
+            return
+
+        try:
+            frequencies = get_title_word_frequencies()
+            if not frequencies:
+                logger.warning("No dataset title, skipping wordcloud generation.")
+                _wordcloud_failed_version = version
+                return
+
+            # Create the WordCloud object with the desired resolution settings
+            wordcloud = WordCloud(
+                width=1600,
+                height=800,
+                background_color="white",
+            ).generate_from_frequencies(frequencies)
+
+            # Unique temporary file: the workers of app.server may generate
+            # the image at the same time.
+            file_descriptor, temporary_path = tempfile.mkstemp(
+                dir=WORDCLOUD_DIRECTORY, prefix=f".{wordcloud_path.name}.", suffix=".tmp"
+            )
+            try:
+                with os.fdopen(file_descriptor, "wb") as file:
+                    wordcloud.to_image().save(file, format="PNG", optimize=True)
+                # mkstemp creates files only readable by their owner.
+                os.chmod(temporary_path, 0o644)
+                os.replace(temporary_path, wordcloud_path)
+            except BaseException:
+                Path(temporary_path).unlink(missing_ok=True)
+                raise
+        except Exception:
+            _wordcloud_failed_version = version
+            raise
+        logger.info(f"Wordcloud saved as {wordcloud_path}")
+
+        for old_path in WORDCLOUD_DIRECTORY.glob("wordcloud_*.png"):
+            if old_path != wordcloud_path:
+                old_path.unlink(missing_ok=True)
+
+
+def get_wordcloud_url() -> str | None:
+    """
+    Returns the URL of the wordcloud image for the current database.
 
-    # Check if the file already exists
+    If the image is not available yet, starts generating it in a
+    background thread and returns None.
+    """
+    wordcloud_path = get_wordcloud_path()
     if wordcloud_path.exists():
-        print("Wordcloud already exists, skipping generation.")
-        return
-
-    # Retrieve dataset titles using the query function
-    titles = get_titles()  # e.g. ['Dataset Title 1', 'Dataset Title 2', ...]
-
-    # Join all titles into a single string (space separated)
-    text = " ".join(titles)
-
-    # Define custom stopwords to remove unwanted words (adjust as needed)
-    custom_stopwords = set(STOPWORDS)
-    custom_stopwords.update([
-        "none",
-        "and",
-        "of",
-        "with",
-        ",",
-        "which",
-        "incl",
-        "from",
-        "the",
-        "a",
-        "an",
-        "for",
-        "on",
-        "in",
-        "to",
-        "by",
-        "as",
-        ])
-
-    # Create the WordCloud object with the desired resolution settings
-    wordcloud = WordCloud(
-        width=1600,
-        height=800,
-        background_color="white",
-        stopwords=custom_stopwords
-    ).generate(text)
-
-    # Create the figure and display the wordcloud image
-    plt.figure(figsize=(10, 5))
-    plt.imshow(wordcloud, interpolation="bilinear")
-    plt.axis("off")
-
-    # Save the wordcloud image with a high DPI for better resolution
-    plt.savefig(wordcloud_path, dpi=500, bbox_inches="tight")
-    print(f"Wordcloud saved as {wordcloud_path}")
-
-
-def get_files_yearly_counts_for_origin(session: Session, origin_name: str):
+        return f"/{wordcloud_path.as_posix()}"
+    start_wordcloud_generation()
+    return None
+
+
+def start_wordcloud_generation() -> None:
+    """
+    Generates the wordcloud image in a background thread, unless a
+    generation is already running or failed for the current database.
+    """
+    global _wordcloud_thread
+    with _wordcloud_thread_lock:
+        if _wordcloud_thread is not None and _wordcloud_thread.is_alive():
+            return
+        if _wordcloud_failed_version == get_database_version():
+            return
+        _wordcloud_thread = threading.Thread(
+            target=generate_title_wordcloud, name="wordcloud", daemon=True
+        )
+        _wordcloud_thread.start()
+
+
+def get_files_yearly_counts():
+    """
+    Returns the number of files per data source and per year
+    of dataset creation, as (data_source, year, count) rows.
+    """
+    yearly_summary = summary_tables.select_yearly_summary().subquery()
     stmt = (
         select(
-            extract('year', Dataset.date_created).label('year'),
-            func.count(Dataset.dataset_id).label('count')
+            yearly_summary.c.data_source,
+            yearly_summary.c.year,
+            yearly_summary.c.number_of_files.label('count')
         )
-        .join(File, File.dataset_id == Dataset.dataset_id)
-        .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
-        .where(DataSource.name == origin_name)
-        .group_by('year')
-        .order_by('year')
+        .where(yearly_summary.c.number_of_files > 0)
     )
-    results = session.exec(stmt).all()
-    return {int(row.year): row.count for row in results if row.year is not None}
+    with Session(engine) as session:
+        return session.exec(stmt).all()
 
 
-def create_files_plot():
-    with Session(engine) as session:
-        zenodo_data = get_files_yearly_counts_for_origin(session, "zenodo")
-        osf_data = get_files_yearly_counts_for_origin(session, "osf")
-        figshare_data = get_files_yearly_counts_for_origin(session, "figshare")
+def pivot_yearly_counts(rows) -> tuple[dict[str, list], list[str], list[str]]:
+    """
+    Pivots (data_source, year, count) rows into the columns of a
+    stacked bar chart: one column per data repository, one row per year.
 
-    all_years = sorted(
-        set(zenodo_data.keys()) | set(osf_data.keys()) | set(figshare_data.keys())
+    Returns the column data, the repository names (largest first)
+    and one color per repository.
+    """
+    import pandas as pd
+    from bokeh.palettes import Set2
+
+    df = pd.DataFrame(rows, columns=["data_source", "year", "count"]).dropna(subset=["year"])
+    df["data_source"] = df["data_source"].map(
+        lambda name: REPOSITORY_DISPLAY_NAMES.get(name, name.capitalize())
     )
+    counts = df.pivot_table(
+        index="year", columns="data_source", values="count",
+        aggfunc="sum", fill_value=0,
+    ).sort_index()
+    # Stack the largest repositories at the bottom.
+    repositories = counts.sum().sort_values(ascending=False).index.tolist()
+    data = {"year": counts.index.astype(int).astype(str).tolist()}
+    data.update({name: counts[name].tolist() for name in repositories})
+    colors = [Set2[8][index % 8] for index in range(len(repositories))]
+    return data, repositories, colors
 
-    data = {
-        'year': [str(y) for y in all_years],
-        'Zenodo': [zenodo_data.get(y, 0) for y in all_years],
-        'OSF': [osf_data.get(y, 0) for y in all_years],
-        'Figshare': [figshare_data.get(y, 0) for y in all_years]
-    }
 
+def create_files_plot():
+    from bokeh.models import ColumnDataSource, NumeralTickFormatter
+    from bokeh.plotting import figure
+
+    data, repositories, colors = pivot_yearly_counts(get_files_yearly_counts())
     source = ColumnDataSource(data=data)
-    repositories = ["Zenodo", "OSF", "Figshare"]
-    colors = ['#66c2a5', '#fc8d62', '#8da0cb']
 
     p = figure(
         x_range=data['year'],
@@ -285,41 +401,27 @@ def create_files_plot():
 
 
 # Similarly, create a plot for datasets per year.
-def get_dataset_yearly_counts_for_origin(session: Session, origin_name: str):
-    stmt = (
-        select(
-            extract('year', Dataset.date_created).label('year'),
-            func.count(Dataset.dataset_id).label('count')
-        )
-        .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
-        .where(DataSource.name == origin_name)
-        .group_by('year')
-        .order_by('year')
+def get_datasets_yearly_counts():
+    """
+    Returns the number of datasets per data source and per year
+    of creation, as (data_source, year, count) rows.
+    """
+    yearly_summary = summary_tables.select_yearly_summary().subquery()
+    stmt = select(
+        yearly_summary.c.data_source,
+        yearly_summary.c.year,
+        yearly_summary.c.number_of_datasets.label('count')
     )
-    results = session.exec(stmt).all()
-    return {int(row.year): row.count for row in results if row.year is not None}
-
-
-def create_datasets_plot():
     with Session(engine) as session:
-        zenodo_data = get_dataset_yearly_counts_for_origin(session, "zenodo")
-        osf_data = get_dataset_yearly_counts_for_origin(session, "osf")
-        figshare_data = get_dataset_yearly_counts_for_origin(session, "figshare")
+        return session.exec(stmt).all()
 
-    all_years = sorted(
-        set(zenodo_data.keys()) | set(osf_data.keys()) | set(figshare_data.keys())
-    )
 
-    data = {
-        'year': [str(y) for y in all_years],
-        'Zenodo': [zenodo_data.get(y, 0) for y in all_years],
-        'OSF': [osf_data.get(y, 0) for y in all_years],
-        'Figshare': [figshare_data.get(y, 0) for y in all_years]
-    }
+def create_datasets_plot():
+    from bokeh.models import ColumnDataSource
+    from bokeh.plotting import figure
 
+    data, repositories, colors = pivot_yearly_counts(get_datasets_yearly_counts())
     source = ColumnDataSource(data=data)
-    repositories = ["Zenodo", "OSF", "Figshare"]
-    colors = ['#66c2a5', '#fc8d62', '#8da0cb']
 
     p = figure(
         x_range=data['year'],
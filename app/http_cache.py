@@ -0,0 +1,224 @@
+"""HTTP caching of GET responses, keyed on the database version.
+
+Pages, DataTables JSON and TSV downloads only depend on the database file,
+the code and templates of the app, and the request path and query string.
+`HTTPCacheMiddleware` derives a validator from them before the request is
+served:
+
+- requests whose If-None-Match (or If-Modified-Since) matches are answered
+  with 304 Not Modified, without running the endpoint;
+- successful responses get ETag, Last-Modified and Cache-Control headers,
+  so that browsers and reverse proxies can reuse them;
+- small successful responses are kept in a bounded in-process cache and
+  replayed to other clients until the database changes.
+
+Endpoints opt out by setting their own Cache-Control header (e.g.
+"no-store" for content that is not ready yet), or their own ETag.
+
+See:
+- https://www.rfc-editor.org/rfc/rfc9110#name-conditional-requests
+- https://www.rfc-editor.org/rfc/rfc9111#name-cache-control
+"""
+
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.datastructures import Headers
+from starlette.routing import Match
+
+from . import config
+from .cache import DatabaseVersionCache, get_database_path, get_database_version
+
+# Requests under these paths are passed through: static files have their
+# own validators, and metrics change on every request.
+UNCACHED_PATH_PREFIXES = ("/static", "/metrics")
+
+# Query parameters not affecting the response: jQuery adds "_" with
+# a timestamp to defeat caches.
+IGNORED_QUERY_PARAMETERS = {"_"}
+
+# Responses with one of these headers are passed through: the endpoint
+# handles caching, or the response depends on request headers.
+ENDPOINT_CACHE_HEADERS = {b"cache-control", b"etag", b"vary"}
+
+# Files whose modification invalidates the cached responses.
+CODE_DIRECTORIES = (Path(__file__).parent, Path("templates"))
+CODE_PATTERNS = ("*.py", "*.html")
+
+
+def get_code_version() -> tuple[str, float]:
+    """
+    Returns a string identifying the code and templates of the app,
+    and their last modification time.
+
+    The same files give the same version in every worker process.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    last_modified = 0.0
+    for directory in CODE_DIRECTORIES:
+        for pattern in CODE_PATTERNS:
+            for path in sorted(directory.rglob(pattern)):
+                stat = path.stat()
+                digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+                last_modified = max(last_modified, stat.st_mtime)
+    return digest.hexdigest(), last_modified
+
+
+CODE_VERSION, CODE_LAST_MODIFIED = get_code_version()
+
+_responses = DatabaseVersionCache(maxsize=config.RESPONSE_CACHE_SIZE)
+
+
+def normalize_query_string(query_string: bytes) -> str:
+    """
+    Returns the query string with sorted parameters, without ignored ones.
+    """
+    parameters = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+    return urlencode(sorted(
+        (name, value) for name, value in parameters
+        if name not in IGNORED_QUERY_PARAMETERS
+    ))
+
+
+def get_etag(path: str, query_string: bytes) -> str:
+    """
+    Returns the weak ETag of the response to a GET request.
+
+    The ETag is weak because pages embedding Bokeh plots are equivalent,
+    but not byte-identical, across worker processes.
+    """
+    key = (
+        f"{get_database_version()}:{CODE_VERSION}:"
+        f"{path}?{normalize_query_string(query_string)}"
+    )
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"'
+
+
+def get_last_modified() -> float:
+    """
+    Returns the last modification time of the database, code or templates.
+    """
+    return max(get_database_path().stat().st_mtime, CODE_LAST_MODIFIED)
+
+
+def is_not_modified(request_headers: Headers, etag: str, last_modified: float) -> bool:
+    """
+    Returns True if the validators of the request match the response.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # ETags are compared weakly, ignoring the W/ prefix. "*" is not
+        # answered here: it only matches if the resource exists, which is
+        # not known before the endpoint runs (e.g. /datasets/{unknown id}).
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in tags
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def get_validator_headers(etag: str, last_modified: float) -> list[tuple[bytes, bytes]]:
+    return [
+        (b"etag", etag.encode()),
+        (b"last-modified", formatdate(last_modified, usegmt=True).encode()),
+        (b"cache-control", f"public, max-age={config.HTTP_CACHE_MAX_AGE}".encode()),
+    ]
+
+
+class HTTPCacheMiddleware:
+    """
+    ASGI middleware adding validators to GET responses, answering
+    conditional requests and replaying cached responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or scope["path"].startswith(UNCACHED_PATH_PREFIXES)
+            or not self.match_route(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        etag = get_etag(scope["path"], scope["query_string"])
+        last_modified = get_last_modified()
+        validator_headers = get_validator_headers(etag, last_modified)
+
+        if is_not_modified(Headers(scope=scope), etag, last_modified):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": validator_headers,
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        cached_response = _responses.get(etag)
+        if cached_response is not None:
+            status, headers, body = cached_response
+            await send(
+                {"type": "http.response.start", "status": status, "headers": headers}
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        # Forward the response as it is produced, and keep a copy of it
+        # if it can be cached and is small enough.
+        start_message = None
+        chunks = []
+        size = 0
+
+        async def send_with_validators(message):
+            nonlocal start_message, size
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                names = {name.lower() for name, _ in headers}
+                if message["status"] == 200 and not names & ENDPOINT_CACHE_HEADERS:
+                    headers += validator_headers
+                    message = {**message, "headers": headers}
+                    start_message = message
+            elif message["type"] == "http.response.body" and start_message is not None:
+                size += len(message.get("body", b""))
+                if size > config.RESPONSE_CACHE_MAX_BODY:
+                    start_message = None
+                    chunks.clear()
+                else:
+                    chunks.append(message.get("body", b""))
+                    if not message.get("more_body", False):
+                        _responses.set(
+                            etag,
+                            (
+                                start_message["status"],
+                                start_message["headers"],
+                                b"".join(chunks),
+                            ),
+                        )
+            await send(message)
+
+        await self.app(scope, receive, send_with_validators)
+
+    @staticmethod
+    def match_route(scope) -> bool:
+        """
+        Returns True if the request matches a route of the app.
+
+        The endpoint of the route is set in the scope, as the router does,
+        so that requests answered from the cache are attributed to it.
+        """
+        for route in scope["app"].routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                scope["endpoint"] = child_scope["endpoint"]
+                return True
+        return False
@@ -0,0 +1,139 @@
+"""Managed indexes backing the sortable and filterable DataTables columns.
+
+The database is shipped without secondary indexes. The indexes below let
+SQLite read the rows of a DataTables page in the order of the sort column,
+instead of sorting the whole table for every page, and look up the files
+of a dataset or the datasets of a data source without a full scan.
+
+Every sortable column of the DataTables services has an index on its own
+column, which SQLite extends with the rowid of the table: it then serves
+both the ORDER BY (sort column, key of the table) and the keyset clause
+of the next page. They are created, and those no longer managed dropped,
+by:
+
+    uv run python -m app.cli indexes
+
+or at app startup when missing. ANALYZE is deliberately not run: without
+statistics, SQLite prefers reading rows in the order of an index to
+sorting them, which suits pages of a few rows. With statistics, it sorts
+small analysis tables (e.g. the GRO files) instead, as it ignores LIMIT.
+
+benchmarks.query_plans checks the query plan of every sort and filter
+combination against these indexes.
+"""
+
+from loguru import logger
+from sqlalchemy import Connection, inspect, text
+from sqlalchemy.exc import OperationalError
+
+from . import config
+from .cache import cached_by_database_version
+from .database import engine, get_write_engine
+from .db_schema import (
+    Dataset,
+    DataSource,
+    File,
+    ParameterFile,
+    TopologyFile,
+    TrajectoryFile,
+)
+
+# Prefix of the managed index names: other indexes with this prefix
+# are dropped when the indexes are built.
+INDEX_PREFIX = "mdde_"
+
+# Indexed columns, one index each.
+INDEXED_COLUMNS = [
+    # Joins and filters.
+    File.dataset_id,
+    Dataset.data_source_id,
+    DataSource.name,
+    # Sortable columns of the datasets table.
+    Dataset.id_in_data_source,
+    Dataset.title,
+    Dataset.date_created,
+    Dataset.date_last_modified,
+    Dataset.file_number,
+    Dataset.download_number,
+    Dataset.view_number,
+    # Sortable columns of the GRO, MDP and XTC tables.
+    File.name,
+    TopologyFile.atom_number,
+    TopologyFile.has_protein,
+    TopologyFile.has_nucleic,
+    TopologyFile.has_lipid,
+    TopologyFile.has_glucid,
+    TopologyFile.has_water_ion,
+    ParameterFile.dt,
+    ParameterFile.nsteps,
+    ParameterFile.temperature,
+    ParameterFile.thermostat,
+    ParameterFile.barostat,
+    ParameterFile.integrator,
+    TrajectoryFile.atom_number,
+    TrajectoryFile.frame_number,
+]
+
+
+def get_index_name(column) -> str:
+    return f"{INDEX_PREFIX}{column.table.name}_{column.name}"
+
+
+# Managed index name -> indexed column.
+MANAGED_INDEXES = {get_index_name(column): column for column in INDEXED_COLUMNS}
+
+
+def get_index_names(connection: Connection) -> set[str]:
+    """
+    Returns the names of the managed indexes found in the database.
+    """
+    names = set()
+    inspector = inspect(connection)
+    for table_name in inspector.get_table_names():
+        for index in inspector.get_indexes(table_name):
+            if index["name"].startswith(INDEX_PREFIX):
+                names.add(index["name"])
+    return names
+
+
+def build_indexes(connection: Connection) -> None:
+    """
+    Creates the missing managed indexes, and drops the ones no longer managed.
+    """
+    existing_names = get_index_names(connection)
+    for name in sorted(existing_names - MANAGED_INDEXES.keys()):
+        connection.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+        logger.info(f"Dropped index {name}")
+    for name, column in MANAGED_INDEXES.items():
+        if name not in existing_names:
+            connection.execute(text(
+                f'CREATE INDEX IF NOT EXISTS "{name}" '
+                f'ON "{column.table.name}" ("{column.name}")'
+            ))
+            logger.info(f"Built index {name}")
+
+
+@cached_by_database_version
+def has_indexes() -> bool:
+    """
+    Returns True if all managed indexes exist in the database.
+    """
+    with engine.connect() as connection:
+        existing_names = get_index_names(connection)
+    return MANAGED_INDEXES.keys() <= existing_names
+
+
+def ensure_indexes() -> None:
+    """
+    Builds the managed indexes if they are enabled but missing.
+
+    Called at startup. If the database cannot be written, queries run
+    without them.
+    """
+    if not config.INDEXES or has_indexes():
+        return
+    try:
+        with get_write_engine().begin() as connection:
+            build_indexes(connection)
+    except OperationalError as error:
+        logger.warning(f"Could not build the indexes: {error}")
@@ -1,8 +1,12 @@
 import pathlib
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
+from loguru import logger
 
+from . import config, http_cache, indexes, metrics, summary_tables
+from .frontend import service as frontend_service
 from .frontend.controller import router as frontend_router
 from .frontend.datasets.controller import router as frontend_datasets_router
 from .frontend.file_types.controller import router as frontend_file_types_router
@@ -10,12 +14,35 @@ from .frontend.file_types.controller import router as frontend_file_types_router
 # ============================================================================
 # FastAPI app
 # ============================================================================
-print(f"Running FastAPI app from: {pathlib.Path().absolute()}")
+logger.info(f"Running FastAPI app from: {pathlib.Path().absolute()}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Materialize the summary tables if the database does not have them yet.
+    summary_tables.ensure_summary_tables()
+    # Create the indexes of the DataTables columns if missing.
+    indexes.ensure_indexes()
+    # Build the home page snapshot before serving the first request.
+    frontend_service.get_home_page_snapshot()
+    # Generate the wordcloud image in the background.
+    frontend_service.start_wordcloud_generation()
+    yield
+
 
 # Create FastAPI app
-app = FastAPI(title="MDverse")
+app = FastAPI(title="MDverse", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Validators and caching of GET responses
+if config.HTTP_CACHE:
+    app.add_middleware(http_cache.HTTPCacheMiddleware)
+
+# Request and SQL statement metrics, including requests answered from the cache
+if config.METRICS:
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.add_route("/metrics", metrics.get_metrics, include_in_schema=False)
+
 # Frontend endpoints
 app.include_router(frontend_router)
 app.include_router(frontend_datasets_router)
@@ -0,0 +1,402 @@
+"""Request and SQL statement metrics, exposed on /metrics.
+
+Two sources feed the metrics:
+
+- `MetricsMiddleware` times every HTTP request, per method, route template
+  and status code;
+- `instrument_engine()` hooks into an engine to time every SQL statement,
+  from its execution to its last fetched row, and count the rows it
+  returned or changed, per calling app function (e.g.
+  app.frontend.datasets.service.get_datasets_page_summary).
+
+Metrics are rendered in the Prometheus text format. They are kept in
+memory per process: with several workers (python -m app.server), each
+scrape of /metrics is answered by one of them.
+
+Statements slower than MDDE_SLOW_QUERY_MS are also logged.
+
+See:
+- https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+import bisect
+import sqlite3
+import sys
+import threading
+from collections.abc import Callable, Iterator
+from time import perf_counter
+
+from loguru import logger
+from sqlalchemy import Engine, event
+from starlette.requests import Request
+from starlette.responses import Response
+
+from . import config
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Modules skipped when looking for the app function executing a statement.
+INSTRUMENTATION_MODULES = {
+    "app.database",
+    "app.metrics",
+    "app.cache",
+    "app.concurrency",
+    "app.frontend.datatables",
+}
+
+# Length at which statements are cut in the slow statement log.
+SLOW_QUERY_LOG_LENGTH = 1_000
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ============================================================================
+# Registry
+# ============================================================================
+
+
+def format_labels(label_names: tuple[str, ...], label_values: tuple) -> str:
+    if not label_names:
+        return ""
+    labels = ",".join(
+        f'{name}="{escape_label_value(value)}"'
+        for name, value in zip(label_names, label_values, strict=True)
+    )
+    return "{" + labels + "}"
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+class Metric:
+    """
+    Base class of the metrics, with one value per combination of labels.
+    """
+
+    type = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, label_names: tuple[str, ...] = ()
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def get(self, *label_values) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{format_labels(self.label_names, label_values)} {value}"
+
+
+class Counter(Metric):
+    """
+    Counter, only increasing.
+    """
+
+    type = "counter"
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Gauge, set to the current value of something.
+    """
+
+    type = "gauge"
+
+    def set(self, value: float, *label_values) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(Metric):
+    """
+    Histogram of observed values, with fixed buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = buckets
+        # Per combination of labels: [count per bucket (the last one for
+        # values above all bounds), sum of the values].
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                counts = [0] * (len(self.buckets) + 1)
+                state = self._values[label_values] = [counts, 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def get(self, *label_values) -> float:
+        """
+        Returns the number of observed values.
+        """
+        with self._lock:
+            state = self._values.get(label_values)
+            return sum(state[0]) if state else 0
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        with self._lock:
+            values = [
+                (label_values, list(counts), total)
+                for label_values, (counts, total) in self._values.items()
+            ]
+        bucket_label_names = self.label_names + ("le",)
+        for label_values, counts, total in values:
+            cumulative_count = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts, strict=True):
+                cumulative_count += count
+                labels = format_labels(bucket_label_names, label_values + (bound,))
+                yield f"{self.name}_bucket{labels} {cumulative_count}"
+            labels = format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {cumulative_count}"
+
+
+_registry: list[Metric] = []
+_collect_callbacks: list[Callable[[], None]] = []
+
+
+def on_collect(callback: Callable[[], None]) -> Callable[[], None]:
+    """
+    Registers a function updating gauges before the metrics are rendered.
+    """
+    _collect_callbacks.append(callback)
+    return callback
+
+
+def render_metrics() -> str:
+    """
+    Returns all metrics in the Prometheus text format.
+    """
+    for callback in _collect_callbacks:
+        callback()
+    lines = [line for metric in _registry for line in metric.collect()]
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_DURATION = Histogram(
+    "mdde_http_request_duration_seconds",
+    "Time to serve HTTP requests, until the last byte of the response.",
+    ("method", "route", "status"),
+)
+SQL_STATEMENT_DURATION = Histogram(
+    "mdde_sql_statement_duration_seconds",
+    "Time to execute SQL statements and fetch their rows.",
+    ("caller",),
+)
+SQL_ROWS = Counter(
+    "mdde_sql_rows_total",
+    "Rows returned (or changed) by SQL statements.",
+    ("caller",),
+)
+
+
+# ============================================================================
+# SQL statements
+# ============================================================================
+
+
+def get_caller() -> str:
+    """
+    Returns the qualified name of the innermost app function on the stack,
+    outside of the database and instrumentation helpers.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.") and module not in INSTRUMENTATION_MODULES:
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "other"
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    SQLite cursor timing its fetches and counting the fetched rows.
+
+    The statement is recorded when the cursor is closed, which SQLAlchemy
+    does once all rows are fetched or the result is closed.
+    """
+
+    statement = None
+
+    def begin(self, statement: str) -> None:
+        self.finish()
+        self.statement = statement
+        self.caller = get_caller()
+        self.duration = 0.0
+        self.rows = 0
+        self.started_at = perf_counter()
+
+    def executed(self) -> None:
+        if self.statement is not None:
+            self.duration += perf_counter() - self.started_at
+
+    def finish(self) -> None:
+        if self.statement is None:
+            return
+        # rowcount is -1 for SELECT statements.
+        rows = self.rowcount if self.rowcount >= 0 else self.rows
+        record_statement(self.statement, self.caller, self.duration, rows)
+        self.statement = None
+
+    def fetchone(self):
+        started_at = perf_counter()
+        row = super().fetchone()
+        self._add_fetched(started_at, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        started_at = perf_counter()
+        rows = super().fetchmany(*args, **kwargs)
+        self._add_fetched(started_at, len(rows))
+        return rows
+
+    def fetchall(self):
+        started_at = perf_counter()
+        rows = super().fetchall()
+        self._add_fetched(started_at, len(rows))
+        return rows
+
+    def close(self):
+        self.finish()
+        super().close()
+
+    def _add_fetched(self, started_at: float, rows: int) -> None:
+        if self.statement is not None:
+            self.duration += perf_counter() - started_at
+            self.rows += rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    SQLite connection creating `InstrumentedCursor` cursors.
+
+    Passed as the `factory` argument of sqlite3.connect().
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+
+def record_statement(statement: str, caller: str, duration: float, rows: int) -> None:
+    SQL_STATEMENT_DURATION.observe(duration, caller)
+    SQL_ROWS.inc(caller, amount=rows)
+    if config.SLOW_QUERY_MS and duration * 1_000 >= config.SLOW_QUERY_MS:
+        statement = " ".join(statement.split())[:SLOW_QUERY_LOG_LENGTH]
+        logger.warning(
+            f"Slow SQL statement: {duration * 1_000:.0f} ms, {rows} rows, "
+            f"from {caller}: {statement}"
+        )
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Records the SQL statements executed by the engine.
+
+    The engine must open connections with `InstrumentedConnection`.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        connection, cursor, statement, parameters, context, executemany
+    ):
+        if isinstance(cursor, InstrumentedCursor):
+            cursor.begin(statement)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(
+        connection, cursor, statement, parameters, context, executemany
+    ):
+        if isinstance(cursor, InstrumentedCursor):
+            cursor.executed()
+
+
+# ============================================================================
+# HTTP requests
+# ============================================================================
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing requests, per method, route template and status.
+
+    Requests matching no route are labelled "unmatched", so that
+    arbitrary paths do not create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: dict | None = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started_at = perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_DURATION.observe(
+                perf_counter() - started_at,
+                scope["method"],
+                self.get_route_path(scope),
+                status,
+            )
+
+    def get_route_path(self, scope) -> str:
+        """
+        Returns the path template of the route that served the request.
+        """
+        if self._route_paths is None:
+            # The router sets the endpoint of the matched route in the scope.
+            self._route_paths = {
+                getattr(route, "endpoint", None) or route.app: route.path
+                for route in scope["app"].routes
+            }
+        return self._route_paths.get(scope.get("endpoint"), "unmatched")
+
+
+async def get_metrics(request: Request) -> Response:
+    """
+    Endpoint returning the metrics in the Prometheus text format.
+    """
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
@@ -0,0 +1,166 @@
+"""Full-text search index (SQLite FTS5) for datasets and files.
+
+The index is stored in the database file as two contentless FTS5
+tables, built from the existing tables by:
+
+    uv run python -m app.cli search-index
+
+When the index is missing, or disabled with MDDE_SEARCH_INDEX=0,
+services fall back to ILIKE scans.
+"""
+
+import re
+
+from loguru import logger
+from sqlalchemy import Connection, column, func, insert, literal_column, table, text
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.selectable import Subquery
+from sqlmodel import select
+
+from . import config
+from .cache import cached_by_database_version
+from .database import engine
+from .db_schema import (
+    Author,
+    Dataset,
+    DatasetAuthorLink,
+    DataSource,
+    File,
+    ParameterFile,
+)
+
+DATASET_SEARCH_TABLE = "dataset_search"
+FILE_SEARCH_TABLE = "file_search"
+
+DATASET_SEARCH_COLUMNS = [
+    "dataset_origin",
+    "id_in_data_source",
+    "title",
+    "description",
+    "author",
+]
+FILE_SEARCH_COLUMNS = [
+    "file_name",
+    "dataset_origin",
+    "dataset_id_in_origin",
+    "annotations",
+]
+
+# Words of at least 2 or 3 characters get a prefix index,
+# so that matching while the user types stays fast.
+FTS5_OPTIONS = "content='', prefix='2 3', tokenize='unicode61 remove_diacritics 2'"
+
+dataset_search = table(
+    DATASET_SEARCH_TABLE, column("rowid"), column("rank"),
+    *[column(name) for name in DATASET_SEARCH_COLUMNS],
+)
+file_search = table(
+    FILE_SEARCH_TABLE, column("rowid"), column("rank"),
+    *[column(name) for name in FILE_SEARCH_COLUMNS],
+)
+
+
+def build_search_index(connection: Connection) -> None:
+    """
+    Drops and rebuilds the dataset and file search tables.
+    """
+    authors = (
+        select(func.group_concat(Author.name, "; "))
+        .join(DatasetAuthorLink, DatasetAuthorLink.author_id == Author.author_id)
+        .where(DatasetAuthorLink.dataset_id == Dataset.dataset_id)
+        .scalar_subquery()
+    )
+    datasets = (
+        select(
+            Dataset.dataset_id,
+            DataSource.name,
+            Dataset.id_in_data_source,
+            Dataset.title,
+            Dataset.description,
+            authors,
+        )
+        .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
+    )
+    # Thermostat, barostat and integrator of MDP files are searchable too.
+    annotations = (
+        func.coalesce(ParameterFile.thermostat, "") + " "
+        + func.coalesce(ParameterFile.barostat, "") + " "
+        + func.coalesce(ParameterFile.integrator, "")
+    )
+    files = (
+        select(
+            File.file_id,
+            File.name,
+            DataSource.name,
+            Dataset.id_in_data_source,
+            annotations,
+        )
+        .join(Dataset, File.dataset_id == Dataset.dataset_id)
+        .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
+        .outerjoin(ParameterFile, ParameterFile.file_id == File.file_id)
+    )
+
+    for fts_table, columns, statement in (
+        (dataset_search, DATASET_SEARCH_COLUMNS, datasets),
+        (file_search, FILE_SEARCH_COLUMNS, files),
+    ):
+        name = fts_table.name
+        connection.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {name} "
+            f"USING fts5({', '.join(columns)}, {FTS5_OPTIONS})"
+        ))
+        connection.execute(
+            insert(fts_table).from_select(["rowid", *columns], statement)
+        )
+        connection.execute(text(f"INSERT INTO {name}({name}) VALUES ('optimize')"))
+        logger.info(f"Built search index {name}")
+
+
+@cached_by_database_version
+def has_search_index() -> bool:
+    """
+    Returns True if both search tables exist in the database.
+    """
+    statement = text(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN (:d, :f)"
+    )
+    with engine.connect() as connection:
+        number_of_tables = connection.execute(
+            statement, {"d": DATASET_SEARCH_TABLE, "f": FILE_SEARCH_TABLE}
+        ).scalar_one()
+    return number_of_tables == 2
+
+
+def use_search_index() -> bool:
+    """
+    Returns True if searches should go through the full-text index.
+    """
+    return config.SEARCH_INDEX and has_search_index()
+
+
+def to_fts_query(search: str) -> str | None:
+    """
+    Converts a free-text search into an FTS5 query.
+
+    Every word of the search must match the prefix of a word
+    in the indexed columns. Returns None when there is no word to match.
+    """
+    words = re.findall(r"\w+", search)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def select_matches(fts_table, query: str | ColumnElement) -> Subquery:
+    """
+    Returns a subquery of (rowid, rank) for the rows of a search table
+    matching an FTS5 query, e.g. from to_fts_query() or a bound parameter.
+
+    rowid is the dataset or file id; a lower rank is a better match.
+    """
+    return (
+        select(fts_table.c.rowid, fts_table.c.rank)
+        .where(literal_column(fts_table.name).op("MATCH")(query))
+        .subquery()
+    )
@@ -0,0 +1,170 @@
+"""Production server: several uvicorn worker processes sharing warmed caches.
+
+Usage, from the root of the repository:
+
+    uv run python -m app.server
+
+The main process binds the socket, builds the summary tables and indexes if
+needed and fills the caches derived from the database (home page, search
+index and summary table lookups, wordcloud), then forks the workers.
+Workers inherit the warmed caches copy-on-write and serve requests from the
+shared socket. Workers that exit (e.g. after MDDE_MAX_REQUESTS requests) are
+replaced. Workers that fail are replaced after a growing delay, and the
+server exits if they keep failing (e.g. on a startup error).
+"""
+
+import gc
+import os
+import signal
+import socket
+import time
+from collections import deque
+
+import uvicorn
+from loguru import logger
+
+from . import config, indexes, search_index, summary_tables
+from .database import engine, get_write_engine
+from .frontend import service as frontend_service
+from .frontend.datasets import service as datasets_service
+from .main import app
+
+# Workers failing more than MAX_WORKER_FAILURES times within
+# WORKER_FAILURE_WINDOW seconds stop the server, instead of being
+# forked again and again.
+MAX_WORKER_FAILURES = 10
+WORKER_FAILURE_WINDOW = 60
+# Delay before replacing a failed worker, doubled for each recent failure.
+WORKER_RESTART_DELAY = 0.5
+MAX_WORKER_RESTART_DELAY = 10
+
+
+def warm_up() -> None:
+    """
+    Fills the caches derived from the database, before workers are forked.
+    """
+    summary_tables.ensure_summary_tables()
+    indexes.ensure_indexes()
+    search_index.has_search_index()
+    frontend_service.get_home_page_snapshot()
+    # The wordcloud is optional: workers serve a placeholder until it exists,
+    # so an error generating it must not stop the server from starting.
+    try:
+        frontend_service.generate_title_wordcloud()
+    except Exception:
+        logger.exception("Could not generate the wordcloud")
+    datasets_service.get_datasets_page_summary()
+    # SQLite connections cannot be shared across processes:
+    # each worker opens its own.
+    engine.dispose()
+    get_write_engine().dispose()
+
+
+def get_uvicorn_config() -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        host=config.HOST,
+        port=config.PORT,
+        proxy_headers=True,
+        timeout_keep_alive=config.KEEP_ALIVE_TIMEOUT,
+        timeout_graceful_shutdown=config.GRACEFUL_SHUTDOWN_TIMEOUT,
+        limit_max_requests=config.MAX_REQUESTS or None,
+    )
+
+
+def start_worker(uvicorn_config: uvicorn.Config, sock: socket.socket) -> int:
+    """
+    Forks a worker serving requests from the socket, and returns its pid.
+    """
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        server = uvicorn.Server(uvicorn_config)
+        # Exit status 1 if the worker fails, including at startup.
+        status = 1
+        try:
+            server.run(sockets=[sock])
+            status = 0 if server.started else 1
+        except Exception:
+            logger.exception("Worker failed")
+        finally:
+            os._exit(status)
+    return pid
+
+
+def get_restart_delay(failures: deque) -> float | None:
+    """
+    Records a worker failure in the times of the recent failures, and
+    returns the delay before replacing the worker, or None if workers
+    failed too many times.
+    """
+    now = time.monotonic()
+    failures.append(now)
+    while failures[0] < now - WORKER_FAILURE_WINDOW:
+        failures.popleft()
+    if len(failures) > MAX_WORKER_FAILURES:
+        return None
+    delay = WORKER_RESTART_DELAY * 2 ** (len(failures) - 1)
+    return min(delay, MAX_WORKER_RESTART_DELAY)
+
+
+def main() -> None:
+    uvicorn_config = get_uvicorn_config()
+    sock = uvicorn_config.bind_socket()
+
+    warm_up()
+    # Keep the warmed objects out of garbage collection passes, which would
+    # otherwise touch (and copy) their memory pages in every worker.
+    gc.freeze()
+
+    workers = set()
+    stopping = False
+    exit_status = 0
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(config.WORKERS):
+        workers.add(start_worker(uvicorn_config, sock))
+    logger.info(
+        f"Serving on http://{config.HOST}:{config.PORT} with {config.WORKERS} workers"
+    )
+
+    # Times of the recent worker failures.
+    failures = deque()
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if stopping:
+            continue
+        exit_code = os.waitstatus_to_exitcode(status)
+        if exit_code == 0:
+            logger.info(f"Worker {pid} exited, starting a new one")
+            workers.add(start_worker(uvicorn_config, sock))
+            continue
+        delay = get_restart_delay(failures)
+        if delay is None:
+            logger.error(f"Workers keep failing, stopping (last: {pid}, {exit_code})")
+            stop(None, None)
+            exit_status = 1
+            continue
+        logger.warning(f"Worker {pid} failed ({exit_code}), replaced in {delay} s")
+        time.sleep(delay)
+        if not stopping:
+            workers.add(start_worker(uvicorn_config, sock))
+    sock.close()
+    raise SystemExit(exit_status)
+
+
+if __name__ == "__main__":
+    main()
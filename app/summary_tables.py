@@ -0,0 +1,352 @@
+"""Materialized summary tables for the home, datasets and file types pages.
+
+The per-origin, per-file-type and per-year aggregates only depend on the
+database, which changes only when a new database.db is shipped. So do the
+author list of each dataset, shown in the datasets table, and the lookup
+of the datasets of an author, filtering it. They are computed once and
+stored in the database file as plain tables by:
+
+    uv run python -m app.cli materialize
+
+or at app startup when missing. When the tables are missing, or disabled
+with MDDE_SUMMARY_TABLES=0, services aggregate the whole File table, and
+the authors of each dataset, instead.
+"""
+
+from loguru import logger
+from sqlalchemy import (
+    Column,
+    Connection,
+    Date,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    extract,
+    func,
+    insert,
+    inspect,
+    select,
+)
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql import ColumnElement, Select
+
+from . import config
+from .cache import cached_by_database_version
+from .database import engine, get_write_engine
+from .db_schema import (
+    Author,
+    Dataset,
+    DatasetAuthorLink,
+    DataSource,
+    File,
+    FileType,
+)
+
+metadata = MetaData()
+
+origin_summary = Table(
+    "summary_origin",
+    metadata,
+    Column("dataset_origin", String, primary_key=True),
+    Column("number_of_datasets", Integer),
+    Column("first_dataset", Date),
+    Column("last_dataset", Date),
+    Column("non_zip_files", Integer),
+    Column("total_size_in_GB_non_zip_and_zip_files", Float),
+    Column("zip_files", Integer),
+    Column("files_within_zip_files", Integer),
+    Column("total_files", Integer),
+)
+file_type_summary = Table(
+    "summary_file_type",
+    metadata,
+    Column("file_type", String, primary_key=True),
+    Column("number_of_files", Integer),
+    Column("number_of_datasets", Integer),
+    Column("total_size_in_GB", Float),
+)
+yearly_summary = Table(
+    "summary_yearly",
+    metadata,
+    Column("data_source", String),
+    Column("year", Integer),
+    Column("number_of_datasets", Integer),
+    Column("number_of_files", Integer),
+)
+# Authors of each dataset, joined by "; ". Every dataset has a row,
+# with a NULL author when it has none.
+dataset_authors = Table(
+    "summary_dataset_authors",
+    metadata,
+    Column("dataset_id", Integer, primary_key=True),
+    Column("author", String),
+)
+# Datasets of each author name. The primary key is the lookup index,
+# ordered case-insensitively so that name prefixes are index ranges.
+author_datasets = Table(
+    "summary_author_datasets",
+    metadata,
+    Column("author", String(collation="NOCASE"), primary_key=True),
+    Column("dataset_id", Integer, primary_key=True),
+    sqlite_with_rowid=False,
+)
+# Upper bound of the strings starting with a given prefix.
+_MAX_CHARACTER = "\U0010ffff"
+
+
+# ============================================================================
+# Aggregates
+# ============================================================================
+
+
+def aggregate_origin_summary() -> Select:
+    """
+    Returns the statement aggregating datasets and files per dataset origin.
+    """
+    return (
+        select(
+            # Dataset stats
+            DataSource.name.label("dataset_origin"),
+            func.count(func.distinct(Dataset.dataset_id)).label("number_of_datasets"),
+            func.min(Dataset.date_created).label("first_dataset"),
+            func.max(Dataset.date_created).label("last_dataset"),
+
+            # Count files that are not zip files, also is_from_zip_file == False
+            func.count(func.distinct(File.file_id))
+               .filter(
+                   (File.is_from_zip_file.is_(False)),
+                   (FileType.name != "zip")
+                   )
+               .label("non_zip_files"),
+
+            # Sum size of files that has is_from_zip_file == False
+            (func.sum(File.size_in_bytes).filter(File.is_from_zip_file.is_(False))/ 1e9
+            ).label("total_size_in_GB_non_zip_and_zip_files"),
+
+            # Count parent zip files (FileType.name == 'zip')
+            func.count(func.distinct(File.file_id))
+               .filter(
+                   (File.is_from_zip_file.is_(False)) &
+                   (FileType.name == "zip")
+               )
+               .label("zip_files"),
+
+            # Count files that are inside zip files
+            func.count(func.distinct(File.file_id))
+               .filter(File.is_from_zip_file)
+               .label("files_within_zip_files"),
+
+            # Total files (outside-non-zip_parent + parent zips + inside zips)
+            func.count(func.distinct(File.file_id)).label("total_files"),
+        )
+        .join(Dataset, Dataset.data_source_id == DataSource.data_source_id)
+        # We have to do an outerjoin here because
+        # there are some datasets with no files
+        # For example some osf datasets have no files
+        .outerjoin(File, File.dataset_id == Dataset.dataset_id)
+        .outerjoin(FileType, File.file_type_id == FileType.file_type_id)
+        .group_by(DataSource.name)
+    )
+
+
+def aggregate_file_type_summary() -> Select:
+    """
+    Returns the statement aggregating files per file type.
+    """
+    return (
+        select(
+            FileType.name.label("file_type"),
+            func.count(File.file_id).label("number_of_files"),
+            func.count(func.distinct(Dataset.dataset_id)).label("number_of_datasets"),
+            (func.sum(File.size_in_bytes) / 1e9).label("total_size_in_GB"),
+        )
+        .join(File, File.file_type_id == FileType.file_type_id)
+        .outerjoin(Dataset, Dataset.dataset_id == File.dataset_id)
+        .group_by(FileType.name)
+    )
+
+
+def aggregate_yearly_summary() -> Select:
+    """
+    Returns the statement counting datasets and files per data source
+    and per year of dataset creation.
+    """
+    return (
+        select(
+            DataSource.name.label("data_source"),
+            extract("year", Dataset.date_created).label("year"),
+            func.count(func.distinct(Dataset.dataset_id)).label("number_of_datasets"),
+            func.count(File.file_id).label("number_of_files"),
+        )
+        .join(DataSource, Dataset.data_source_id == DataSource.data_source_id)
+        .outerjoin(File, File.dataset_id == Dataset.dataset_id)
+        .group_by("data_source", "year")
+    )
+
+
+def aggregate_dataset_authors() -> Select:
+    """
+    Returns the statement joining the author names of each dataset.
+    """
+    return (
+        select(
+            Dataset.dataset_id,
+            func.group_concat(Author.name, "; ").label("author"),
+        )
+        .outerjoin(
+            DatasetAuthorLink, DatasetAuthorLink.dataset_id == Dataset.dataset_id
+        )
+        .outerjoin(Author, DatasetAuthorLink.author_id == Author.author_id)
+        .group_by(Dataset.dataset_id)
+    )
+
+
+def aggregate_author_datasets() -> Select:
+    """
+    Returns the statement selecting the (author name, dataset id) pairs.
+    """
+    return (
+        select(Author.name.label("author"), DatasetAuthorLink.dataset_id)
+        .join(DatasetAuthorLink, DatasetAuthorLink.author_id == Author.author_id)
+        .distinct()
+    )
+
+
+SUMMARY_TABLES = {
+    origin_summary: aggregate_origin_summary,
+    file_type_summary: aggregate_file_type_summary,
+    yearly_summary: aggregate_yearly_summary,
+    dataset_authors: aggregate_dataset_authors,
+    author_datasets: aggregate_author_datasets,
+}
+
+
+# ============================================================================
+# Materialization
+# ============================================================================
+
+
+def build_summary_tables(connection: Connection) -> None:
+    """
+    Drops and rebuilds the summary tables.
+    """
+    for summary_table, aggregate in SUMMARY_TABLES.items():
+        summary_table.drop(connection, checkfirst=True)
+        summary_table.create(connection)
+        statement = aggregate()
+        connection.execute(
+            insert(summary_table).from_select(
+                [column.name for column in statement.selected_columns], statement
+            )
+        )
+        logger.info(f"Built summary table {summary_table.name}")
+
+
+@cached_by_database_version
+def has_summary_tables() -> bool:
+    """
+    Returns True if all summary tables exist in the database.
+    """
+    with engine.connect() as connection:
+        table_names = set(inspect(connection).get_table_names())
+    return all(summary_table.name in table_names for summary_table in SUMMARY_TABLES)
+
+
+def ensure_summary_tables() -> None:
+    """
+    Builds the summary tables if they are enabled but missing.
+
+    Called at startup. If the database cannot be written, services keep
+    aggregating the File table.
+    """
+    if not config.SUMMARY_TABLES or has_summary_tables():
+        return
+    try:
+        with get_write_engine().begin() as connection:
+            build_summary_tables(connection)
+    except OperationalError as error:
+        logger.warning(f"Could not build the summary tables: {error}")
+
+
+def use_summary_tables() -> bool:
+    """
+    Returns True if services should read the summary tables.
+    """
+    return config.SUMMARY_TABLES and has_summary_tables()
+
+
+# ============================================================================
+# Queries
+# ============================================================================
+
+
+def select_origin_summary() -> Select:
+    """
+    Returns the statement selecting the summary rows per dataset origin.
+    """
+    if use_summary_tables():
+        return select(origin_summary)
+    return aggregate_origin_summary()
+
+
+def select_file_type_summary() -> Select:
+    """
+    Returns the statement selecting the summary rows per file type,
+    with the most frequent file types first.
+    """
+    if use_summary_tables():
+        return select(file_type_summary).order_by(
+            file_type_summary.c.number_of_files.desc()
+        )
+    return aggregate_file_type_summary().order_by(func.count(File.file_id).desc())
+
+
+def select_yearly_summary() -> Select:
+    """
+    Returns the statement selecting the (data_source, year,
+    number_of_datasets, number_of_files) rows.
+    """
+    if use_summary_tables():
+        return select(yearly_summary)
+    return aggregate_yearly_summary()
+
+
+def select_dataset_author():
+    """
+    Returns the scalar subquery of the authors of the dataset of the
+    enclosing query, joined by "; ", or NULL if it has none.
+    """
+    if use_summary_tables():
+        return (
+            select(dataset_authors.c.author)
+            .where(dataset_authors.c.dataset_id == Dataset.dataset_id)
+            .scalar_subquery()
+        )
+    return (
+        select(func.group_concat(Author.name, "; "))
+        .join(DatasetAuthorLink, DatasetAuthorLink.author_id == Author.author_id)
+        .where(DatasetAuthorLink.dataset_id == Dataset.dataset_id)
+        .scalar_subquery()
+    )
+
+
+def select_datasets_of_author(prefix: ColumnElement[str]) -> Select:
+    """
+    Returns the statement selecting the ids of the datasets with an author
+    whose name starts with prefix (e.g. a bound parameter), ignoring case.
+    """
+    if use_summary_tables():
+        return select(author_datasets.c.dataset_id).where(
+            author_datasets.c.author >= prefix,
+            author_datasets.c.author < prefix + _MAX_CHARACTER,
+        )
+    return (
+        select(DatasetAuthorLink.dataset_id)
+        .join(Author, DatasetAuthorLink.author_id == Author.author_id)
+        .where(
+            func.lower(func.substr(Author.name, 1, func.length(prefix)))
+            == func.lower(prefix)
+        )
+    )
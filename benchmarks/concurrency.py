@@ -0,0 +1,149 @@
+"""Latency of cheap endpoints while heavy exports run concurrently.
+
+Usage, from the root of the repository:
+
+    uv run python -m benchmarks.concurrency --heavy 4 --requests 200
+
+The app is served by a single uvicorn worker started for the benchmark
+(or by the server given with --url), so any blocking call made on the
+event loop shows up directly in the latency of the cheap endpoints.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Iterator
+
+import httpx
+
+CHEAP_ENDPOINTS = [
+    "/about",
+    "/datasets/datatables?draw=1&start=0&length=10",
+    "/file_types/gro/datatables?draw=1&start=0&length=10",
+]
+HEAVY_ENDPOINT = "/file_types/{file_type}/download_list/"
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """
+    Returns the nearest-rank percentile of a list of values.
+    """
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+async def time_cheap_requests(client: httpx.AsyncClient, number: int) -> list[float]:
+    """
+    Sends cheap requests one after the other and returns their latencies (s).
+    """
+    latencies = []
+    for index in range(number):
+        url = CHEAP_ENDPOINTS[index % len(CHEAP_ENDPOINTS)]
+        start = time.perf_counter()
+        response = await client.get(url)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return latencies
+
+
+async def run_heavy_requests(
+    client: httpx.AsyncClient, file_type: str, stop: asyncio.Event
+) -> int:
+    """
+    Downloads the file list of a file type in a loop until stopped.
+    """
+    number_of_downloads = 0
+    while not stop.is_set():
+        response = await client.get(HEAVY_ENDPOINT.format(file_type=file_type))
+        response.raise_for_status()
+        number_of_downloads += 1
+    return number_of_downloads
+
+
+@contextlib.contextmanager
+def serve_app() -> Iterator[str]:
+    """
+    Starts the app in a single uvicorn worker and yields its base URL.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--port", str(port), "--log-level", "warning"],
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(300):
+            with contextlib.suppress(httpx.TransportError):
+                httpx.get(f"{base_url}/about")
+                break
+            time.sleep(0.1)
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def run_scenario(
+    base_url: str, heavy: int, requests: int, file_type: str
+) -> dict:
+    """
+    Measures cheap request latencies with `heavy` concurrent exports.
+    """
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        # Warm up caches so that only steady-state latencies are measured.
+        await time_cheap_requests(client, len(CHEAP_ENDPOINTS))
+        stop = asyncio.Event()
+        heavy_tasks = [
+            asyncio.create_task(run_heavy_requests(client, file_type, stop))
+            for _ in range(heavy)
+        ]
+        latencies = await time_cheap_requests(client, requests)
+        stop.set()
+        downloads = sum(await asyncio.gather(*heavy_tasks))
+    return {
+        "heavy_exports": heavy,
+        "completed_exports": downloads,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--heavy", type=int, default=4,
+                        help="number of concurrent heavy exports")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="number of cheap requests to time")
+    parser.add_argument("--file-type", default="xtc",
+                        help="file type used for the heavy export")
+    parser.add_argument("--url", default=None,
+                        help="base URL of a running server (default: start one)")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        base_url = args.url or stack.enter_context(serve_app())
+        for heavy in (0, args.heavy):
+            result = asyncio.run(
+                run_scenario(base_url, heavy, args.requests, args.file_type)
+            )
+            print(
+                f"heavy={result['heavy_exports']:<3} "
+                f"exports={result['completed_exports']:<5} "
+                f"p50={result['p50_ms']:8.2f} ms  "
+                f"p99={result['p99_ms']:8.2f} ms  "
+                f"max={result['max_ms']:8.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Python overhead of DataTables draws, besides the time spent in SQLite.
+
+Usage, from the root of the repository:
+
+    uv run python -m benchmarks.datatables
+    uv run python -m benchmarks.datatables --database benchmarks/data/100k.db --rebuild
+
+Runs draws of each table --repeat times, with warm caches, and reports the
+mean time per draw, the time spent executing SQL statements and fetching
+their rows, and the difference: building statements and parameters,
+looking up caches, processing results.
+
+With --rebuild, the statements of the pages and counts are built again for
+every draw instead of being reused from the statement cache of
+app.frontend.datatables, e.g. to measure what the cache saves.
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+
+def get_draws(dataset_id: int) -> dict[str, tuple]:
+    """
+    Returns the draws to run: name -> (table, arguments of query_datatables).
+    """
+    from app.frontend.datasets import service as datasets_service
+    from app.frontend.file_types import service as file_types_service
+
+    gro, mdp, xtc = (
+        file_types_service.ANALYSIS_TABLES[name] for name in ("gro", "mdp", "xtc")
+    )
+    datasets = datasets_service.DATASETS_TABLE
+    page = {"start": 0, "length": 10}
+    return {
+        "datasets": (datasets, page),
+        "datasets.next_page": (datasets, {**page, "start": 10}),
+        "datasets.search": (datasets, {**page, "search": "membrane"}),
+        "dataset_files": (
+            datasets_service.DATASET_FILES_TABLE, {**page, "dataset_id": dataset_id}
+        ),
+        "gro": (gro, page),
+        "gro.next_page": (gro, {**page, "start": 10}),
+        "gro.filter": (
+            gro,
+            {
+                **page,
+                "column_searches": {"atom_number": ">=1000", "has_protein": "true"},
+            },
+        ),
+        "mdp.search": (mdp, {**page, "search": "rescale"}),
+        "xtc.dataset": (
+            xtc, {**page, "dataset_id": dataset_id, "sort_column_name": "frame_number"}
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", type=Path, default=Path("database.db"),
+                        help="SQLite database to query (default: database.db)")
+    parser.add_argument("--repeat", type=int, default=500,
+                        help="number of draws per case")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="build the statements again for every draw")
+    args = parser.parse_args()
+
+    if not args.database.exists():
+        parser.error(f"no database at {args.database}")
+    # The app reads the path of the database when it is imported.
+    os.environ["MDDE_DATABASE"] = str(args.database)
+
+    from sqlalchemy import event, func, select
+
+    from app.database import engine
+    from app.db_schema import File
+    from app.frontend import datatables
+
+    with engine.connect() as connection:
+        # The dataset with the most files.
+        dataset_id = connection.execute(
+            select(File.dataset_id)
+            .group_by(File.dataset_id)
+            .order_by(func.count().desc())
+            .limit(1)
+        ).scalar()
+
+    sql_time = 0.0
+    started_at = 0.0
+
+    def before_cursor_execute(*args):
+        nonlocal started_at
+        started_at = time.perf_counter()
+
+    def after_cursor_execute(*args):
+        nonlocal sql_time
+        sql_time += time.perf_counter() - started_at
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    draws = get_draws(dataset_id)
+    print(f"{'case':<24} {'draw ms':>9} {'SQL ms':>9} {'Python ms':>10}")
+    total_python = 0.0
+    for name, (table, arguments) in draws.items():
+        # Warm up the caches, then time the draws.
+        datatables.query_datatables(table, **arguments)
+        sql_time = 0.0
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            if args.rebuild:
+                datatables._statement_cache.clear()
+            datatables.query_datatables(table, **arguments)
+        draw_ms = (time.perf_counter() - start) / args.repeat * 1_000
+        sql_ms = sql_time / args.repeat * 1_000
+        total_python += draw_ms - sql_ms
+        print(f"{name:<24} {draw_ms:>9.3f} {sql_ms:>9.3f} {draw_ms - sql_ms:>10.3f}")
+    print(f"\nmean Python overhead per draw: {total_python / len(draws):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Timings of the service functions and HTTP endpoints.
+
+Usage, from the root of the repository:
+
+    uv run python -m benchmarks.synthetic --files 100k benchmarks/data/100k.db
+    uv run python -m benchmarks.queries --database benchmarks/data/100k.db \\
+        --output benchmarks/results/100k.json
+    uv run python -m benchmarks.queries --database benchmarks/data/100k.db \\
+        --compare benchmarks/results/100k.json
+
+For every case, the benchmark reports:
+
+- cold: one call after dropping all app caches and database connections
+  (the operating system page cache is kept);
+- warm: percentiles over --repeat calls once caches are filled;
+- SQL statements executed and SQLite virtual machine steps, a proxy for
+  the number of rows scanned, during one warm call;
+- peak Python memory allocated during one warm call (tracemalloc).
+
+Results are written as JSON, so that runs can be compared with --compare.
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", type=Path, default=Path("database.db"),
+                        help="SQLite database to benchmark (default: database.db)")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="number of warm calls per case")
+    parser.add_argument("--filter", default="",
+                        help="only run cases whose name contains this text")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="write the results to this JSON file")
+    parser.add_argument("--compare", type=Path, default=None,
+                        help="JSON results of a previous run to compare with")
+    args = parser.parse_args()
+
+    if not args.database.exists():
+        parser.error(f"no database at {args.database}")
+    # The app reads the path of the database when it is imported.
+    os.environ["MDDE_DATABASE"] = str(args.database)
+    from .query_suite import run
+
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Query plans of the DataTables pages, checked against the managed indexes.
+
+Usage, from the root of the repository:
+
+    uv run python -m app.cli indexes
+    uv run python -m benchmarks.query_plans
+    uv run python -m benchmarks.query_plans --database benchmarks/data/100k.db
+
+For every table, its default sort and every sortable column and sort
+direction, and every filter (none, each per-column filter, the global
+search), fetches the first two pages as the app does, the second one with
+keyset pagination, and runs EXPLAIN QUERY PLAN on the statements selecting
+them.
+
+Exits with status 1 if the managed indexes (app.indexes) are missing, or
+if a page statement:
+
+- scans a whole table, instead of reading it through an index;
+- sorts its rows in a temporary B-tree after scanning a table, instead of
+  reading them in order from an index.
+
+Sorting the rows found by an index lookup (e.g. the files of a dataset)
+or by the full-text search index is fine: only these rows are sorted.
+"""
+
+import argparse
+import os
+import re
+from collections.abc import Callable
+from pathlib import Path
+
+# Per-column search values, per kind of filter, and per name of the
+# columns filtered by a function (the author name prefix of the datasets).
+COLUMN_SEARCHES = {
+    "numeric": ">=1", "boolean": "true", "enum": "a|b", "author": "smi",
+}
+SEARCH = "water"
+
+FULL_SCAN = re.compile(r"^SCAN \w+$")
+TEMP_SORT = re.compile(r"^USE TEMP B-TREE FOR .*ORDER BY$")
+
+
+def get_violations(plan: list[str]) -> list[str]:
+    """
+    Returns the reasons why a query plan is rejected, from the details
+    of its EXPLAIN QUERY PLAN rows.
+    """
+    violations = [f"full scan: {detail}" for detail in plan if FULL_SCAN.match(detail)]
+    loops = [detail for detail in plan if detail.startswith(("SCAN ", "SEARCH "))]
+    driving_scan = (
+        loops
+        and loops[0].startswith("SCAN ")
+        and "VIRTUAL TABLE" not in loops[0]
+    )
+    if driving_scan:
+        violations += [
+            f"sort after a scan: {detail}" for detail in plan if TEMP_SORT.match(detail)
+        ]
+    return violations
+
+
+def capture_page_statements(engine, function: Callable[[], object]) -> list[tuple]:
+    """
+    Returns the (statement, parameters) of the pages selected by function.
+    """
+    from sqlalchemy import event
+
+    statements = []
+
+    def before_cursor_execute(
+        connection, cursor, statement, parameters, context, executemany
+    ):
+        if " LIMIT " in statement:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        function()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def explain(engine, statement: str, parameters) -> list[str]:
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[3] for row in rows]
+
+
+def get_tables(dataset_id: int) -> dict[str, tuple]:
+    """
+    Returns the DataTables tables to check: name -> (table, dataset id).
+    """
+    from app.frontend.datasets import service as datasets_service
+    from app.frontend.file_types import service as file_types_service
+
+    tables = {
+        "datasets": (datasets_service.DATASETS_TABLE, None),
+        "dataset_files": (datasets_service.DATASET_FILES_TABLE, dataset_id),
+    }
+    for file_type, table in file_types_service.ANALYSIS_TABLES.items():
+        tables[file_type] = (table, None)
+        tables[f"{file_type}?dataset_id"] = (table, dataset_id)
+    return tables
+
+
+def get_filters(table) -> dict[str, dict]:
+    """
+    Returns the filters to check: name -> search arguments of the draws.
+    """
+    filters = {"": {}, "search": {"search": SEARCH}}
+    for name, column in table.columns.items():
+        if column.filter is not None:
+            kind = column.filter if isinstance(column.filter, str) else name
+            filters[name] = {"column_searches": {name: COLUMN_SEARCHES[kind]}}
+    return filters
+
+
+def check_first_two_pages(engine, table, page: dict, case: str) -> tuple[int, int]:
+    """
+    Prints the rejected query plans of the first two pages of a table,
+    and returns the numbers of checked and rejected page statements.
+    """
+    from app.cache import clear_caches
+    from app.frontend.datatables import query_datatables
+
+    def first_two_pages():
+        clear_caches()
+        query_datatables(table, **page, start=0)
+        query_datatables(table, **page, start=10)
+
+    checked = 0
+    failures = 0
+    for statement, parameters in capture_page_statements(engine, first_two_pages):
+        checked += 1
+        violations = get_violations(explain(engine, statement, parameters))
+        if violations:
+            failures += 1
+            print(f"FAILED: {case}")
+            for violation in violations:
+                print(f"    {violation}")
+    return checked, failures
+
+
+def check() -> int:
+    """
+    Prints the rejected query plans, and returns their number.
+    """
+    from sqlalchemy import func, select
+
+    from app.database import engine
+    from app.db_schema import File
+    from app.indexes import has_indexes
+
+    if not has_indexes():
+        print("FAILED: the managed indexes are missing, run: python -m app.cli indexes")
+        return 1
+
+    with engine.connect() as connection:
+        # The dataset with the most files.
+        dataset_id = connection.execute(
+            select(File.dataset_id)
+            .group_by(File.dataset_id)
+            .order_by(func.count().desc())
+            .limit(1)
+        ).scalar()
+
+    failures = 0
+    checked = 0
+    for name, (table, table_dataset_id) in get_tables(dataset_id).items():
+        # The default sort, chosen by the app (e.g. by relevance for a
+        # search), then every sortable column and direction.
+        sorts = [(None, "asc")] + [
+            (sort_column_name, sort_direction)
+            for sort_column_name in table.sortable_columns
+            for sort_direction in ("asc", "desc")
+        ]
+        for sort_column_name, sort_direction in sorts:
+            for filter_name, filter_arguments in get_filters(table).items():
+                page = {
+                    **filter_arguments,
+                    "dataset_id": table_dataset_id,
+                    "sort_column_name": sort_column_name,
+                    "sort_direction": sort_direction,
+                    "length": 10,
+                }
+                case = f"{name} sort={sort_column_name or 'default'} {sort_direction}"
+                if filter_name:
+                    case += f" filter={filter_name}"
+                page_checked, page_failures = check_first_two_pages(
+                    engine, table, page, case
+                )
+                checked += page_checked
+                failures += page_failures
+    print(f"{checked} page statements checked, {failures} rejected")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", type=Path, default=Path("database.db"),
+                        help="SQLite database to check (default: database.db)")
+    args = parser.parse_args()
+
+    if not args.database.exists():
+        parser.error(f"no database at {args.database}")
+    # The app reads the path of the database when it is imported.
+    os.environ["MDDE_DATABASE"] = str(args.database)
+    raise SystemExit(1 if check() else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""Cases and measurements of the query benchmark, see benchmarks.queries.
+
+The app is imported by this module, so the database to benchmark must be
+selected (MDDE_DATABASE) before importing it.
+"""
+
+import argparse
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func
+from sqlmodel import Session, select
+
+from app import config, http_cache
+from app.cache import clear_caches
+from app.database import engine, get_export_engine
+from app.db_schema import Dataset, File
+from app.frontend import service as home_service
+from app.frontend.datasets import service as datasets_service
+from app.frontend.file_types import service as file_types_service
+from app.main import app
+
+# SQLite calls the progress handler every PROGRESS_STEPS virtual machine steps.
+PROGRESS_STEPS = 1_000
+
+
+@dataclass
+class Case:
+    name: str
+    kind: str  # "service" or "http"
+    function: Callable[[], object]
+
+
+@dataclass
+class Result:
+    name: str
+    kind: str
+    cold_ms: float
+    warm_ms: dict[str, float]
+    sql_statements: int
+    vm_steps: int
+    peak_memory_kib: float
+
+
+class SQLiteCounters:
+    """
+    Counts SQL statements and SQLite virtual machine steps while enabled.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.statements = 0
+        self.vm_steps = 0
+        # Exports read from their own engine.
+        for counted_engine in (engine, get_export_engine()):
+            event.listen(counted_engine, "checkout", self._on_checkout)
+            event.listen(counted_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_progress(self) -> int:
+        self.vm_steps += PROGRESS_STEPS
+        return 0
+
+    def _on_checkout(
+        self, dbapi_connection, connection_record, connection_proxy
+    ) -> None:
+        # The handler is only installed while counting, so that it does not
+        # slow down timed calls.
+        if self.enabled:
+            dbapi_connection.set_progress_handler(self._on_progress, PROGRESS_STEPS)
+        else:
+            dbapi_connection.set_progress_handler(None, 0)
+
+    def _on_execute(self, *args) -> None:
+        if self.enabled:
+            self.statements += 1
+
+    def count(self, function: Callable[[], object]) -> tuple[int, int]:
+        """
+        Returns the number of statements and VM steps of one call.
+        """
+        self.enabled, self.statements, self.vm_steps = True, 0, 0
+        try:
+            function()
+        finally:
+            self.enabled = False
+        return self.statements, self.vm_steps
+
+
+def consume(iterator) -> int:
+    """
+    Exhausts an iterator (e.g. a streamed export) and returns its size.
+    """
+    return sum(len(chunk) for chunk in iterator)
+
+
+def datatables_params(columns: list[str], **params) -> dict[str, str]:
+    """
+    Returns the query parameters of a DataTables server-side request.
+    """
+    query = {"draw": "1", "start": "0", "length": "10",
+             "order[0][column]": "0", "order[0][dir]": "asc", "search[value]": ""}
+    for index, name in enumerate(columns):
+        query[f"columns[{index}][data]"] = name
+    query.update({key: str(value) for key, value in params.items()})
+    return query
+
+
+def get_cases(client: TestClient, dataset_id: int, deep_start: int) -> list[Case]:
+    """
+    Returns the benchmark cases, for a dataset with files and a deep page offset.
+    """
+    dataset_columns = ["dataset_origin", "id_in_data_source", "title", "date_created"]
+    dataset_file_columns = [
+        "file_name", "file_type", "size_in_bytes", "url", "is_from_zip_file"
+    ]
+    gro_columns = ["dataset_origin", "file_name", "atom_number", "has_protein"]
+    mdp_columns = ["dataset_origin", "file_name", "dt", "thermostat"]
+    xtc_columns = ["dataset_origin", "file_name", "atom_number", "frame_number"]
+    page = {"sort_column_name": "dataset_origin", "start": 0, "length": 10}
+
+    services = {
+        # Home page.
+        "home.get_dataset_origin_summary": home_service.get_dataset_origin_summary,
+        "home.get_home_page_snapshot": home_service.get_home_page_snapshot,
+        "home.get_title_word_frequencies": home_service.get_title_word_frequencies,
+        "home.create_files_plot": home_service.create_files_plot,
+        "home.create_datasets_plot": home_service.create_datasets_plot,
+        # Datasets.
+        "datasets.get_datasets_page_summary": (
+            datasets_service.get_datasets_page_summary
+        ),
+        "datasets.datatables.first_page": lambda: (
+            datasets_service.get_all_datasets_for_datatables(**page)
+        ),
+        "datasets.datatables.deep_page": lambda: (
+            datasets_service.get_all_datasets_for_datatables(
+                **{**page, "start": deep_start}
+            )
+        ),
+        "datasets.datatables.search": lambda: (
+            datasets_service.get_all_datasets_for_datatables(**page, search="membrane")
+        ),
+        "datasets.get_dataset_info_by_id": lambda: (
+            datasets_service.get_dataset_info_by_id(dataset_id)
+        ),
+        "datasets.files.datatables.first_page": lambda: (
+            datasets_service.get_files_of_dataset_for_datatables(
+                dataset_id, sort_column_name="file_name", start=0, length=10
+            )
+        ),
+        # File types.
+        "file_types.get_file_types_stats": file_types_service.get_file_types_stats,
+        "file_types.export_tsv.xtc": lambda: consume(
+            file_types_service.iter_tsv_of_files_for_a_file_type("xtc")
+        ),
+        "file_types.export_tsv.xtc.gzip": lambda: consume(
+            file_types_service.iter_tsv_of_files_for_a_file_type(
+                "xtc", compression="gzip"
+            )
+        ),
+        "file_types.gro.datatables.first_page": lambda: (
+            file_types_service.get_analysed_files_for_datatables("gro", **page)
+        ),
+        "file_types.gro.datatables.deep_page": lambda: (
+            file_types_service.get_analysed_files_for_datatables(
+                "gro", **{**page, "start": deep_start}
+            )
+        ),
+        "file_types.gro.datatables.filter": lambda: (
+            file_types_service.get_analysed_files_for_datatables(
+                "gro", **page,
+                column_searches={"atom_number": ">100000", "has_protein": "true"},
+            )
+        ),
+        "file_types.mdp.datatables.search": lambda: (
+            file_types_service.get_analysed_files_for_datatables(
+                "mdp", **page, search="rescale"
+            )
+        ),
+        "file_types.xtc.datatables.dataset": lambda: (
+            file_types_service.get_analysed_files_for_datatables(
+                "xtc", dataset_id=dataset_id, **page
+            )
+        ),
+    }
+    endpoints = {
+        "/": "/",
+        "/about": "/about",
+        "/datasets": "/datasets",
+        "/datasets/datatables": (
+            "/datasets/datatables", datatables_params(dataset_columns)
+        ),
+        "/datasets/datatables?search": (
+            "/datasets/datatables",
+            datatables_params(dataset_columns, **{"search[value]": "membrane"}),
+        ),
+        "/datasets/{dataset_id}": f"/datasets/{dataset_id}",
+        "/datasets/{dataset_id}/files/datatables": (
+            f"/datasets/{dataset_id}/files/datatables",
+            datatables_params(dataset_file_columns),
+        ),
+        "/file_types": "/file_types",
+        "/file_types/gro/datatables": (
+            "/file_types/gro/datatables", datatables_params(gro_columns)
+        ),
+        "/file_types/gro/datatables?long": (
+            "/file_types/gro/datatables", datatables_params(gro_columns, length=100)
+        ),
+        "/file_types/gro/datatables?long&arrays": (
+            "/file_types/gro/datatables",
+            datatables_params(gro_columns, length=100, format="arrays"),
+        ),
+        "/file_types/mdp/datatables": (
+            "/file_types/mdp/datatables", datatables_params(mdp_columns)
+        ),
+        "/file_types/xtc/datatables?deep": (
+            "/file_types/xtc/datatables",
+            datatables_params(xtc_columns, start=deep_start),
+        ),
+        "/file_types/xtc/download_list/": "/file_types/xtc/download_list/",
+    }
+
+    # Endpoints also measured when answered from the response cache of
+    # app.http_cache, as separate "(cached)" cases.
+    cached_endpoints = ["/", "/datasets/datatables", "/file_types/gro/datatables"]
+
+    def get(url: str, params: dict | None = None, cached: bool = False):
+        def request():
+            if not cached:
+                # Run the endpoint, instead of replaying its cached response.
+                http_cache._responses.clear()
+            response = client.get(url, params=params)
+            response.raise_for_status()
+            return response
+        return request
+
+    cases = [Case(name, "service", function) for name, function in services.items()]
+    for name, target in endpoints.items():
+        url, params = target if isinstance(target, tuple) else (target, None)
+        cases.append(Case(name, "http", get(url, params)))
+        if name in cached_endpoints and config.HTTP_CACHE:
+            cases.append(
+                Case(f"{name} (cached)", "http", get(url, params, cached=True))
+            )
+    return cases
+
+
+def time_call(function: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1000
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """
+    Returns the nearest-rank percentile of a list of values.
+    """
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def run_case(case: Case, counters: SQLiteCounters, repeat: int) -> Result:
+    """
+    Measures one case: cold call, SQL counters, peak memory and warm timings.
+    """
+    clear_caches()
+    engine.dispose()
+    cold_ms = time_call(case.function)
+
+    sql_statements, vm_steps = counters.count(case.function)
+
+    tracemalloc.start()
+    try:
+        case.function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings = [time_call(case.function) for _ in range(repeat)]
+    return Result(
+        name=case.name,
+        kind=case.kind,
+        cold_ms=cold_ms,
+        warm_ms={
+            "min": min(timings),
+            "mean": statistics.fmean(timings),
+            "p50": percentile(timings, 50),
+            "p95": percentile(timings, 95),
+            "p99": percentile(timings, 99),
+            "max": max(timings),
+        },
+        sql_statements=sql_statements,
+        vm_steps=vm_steps,
+        peak_memory_kib=peak_memory / 1024,
+    )
+
+
+def get_git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_metadata(database: Path, repeat: int) -> dict:
+    """
+    Returns the description of the benchmark environment and database.
+    """
+    with Session(engine) as session:
+        number_of_datasets = session.exec(select(func.count(Dataset.dataset_id))).one()
+        number_of_files = session.exec(select(func.count(File.file_id))).one()
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "database": str(database),
+        "database_size_bytes": database.stat().st_size,
+        "datasets": number_of_datasets,
+        "files": number_of_files,
+        "repeat": repeat,
+        "config": {
+            name: getattr(config, name)
+            for name in dir(config) if name.isupper()
+        },
+    }
+
+
+def print_results(results: list[Result]) -> None:
+    print(f"{'case':<45}{'cold':>10}{'p50':>10}{'p99':>10}"
+          f"{'SQL':>6}{'VM steps':>12}{'mem KiB':>10}")
+    for result in results:
+        print(f"{result.name:<45}{result.cold_ms:>10.2f}"
+              f"{result.warm_ms['p50']:>10.2f}{result.warm_ms['p99']:>10.2f}"
+              f"{result.sql_statements:>6}{result.vm_steps:>12}"
+              f"{result.peak_memory_kib:>10.0f}")
+
+
+def print_comparison(results: list[Result], baseline: dict) -> None:
+    """
+    Prints the warm p50 and cold timings of a run next to a baseline run.
+    """
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    print(f"\nBaseline: {baseline['metadata']['date']} "
+          f"(commit {baseline['metadata']['git_commit']})")
+    print(f"{'case':<45}{'p50 before':>12}{'p50 now':>10}{'ratio':>8}"
+          f"{'cold before':>13}{'cold now':>10}")
+    for result in results:
+        before = baseline_results.get(result.name)
+        if before is None:
+            continue
+        p50_before, p50_now = before["warm_ms"]["p50"], result.warm_ms["p50"]
+        print(f"{result.name:<45}{p50_before:>12.2f}{p50_now:>10.2f}"
+              f"{p50_now / p50_before:>7.2f}x"
+              f"{before['cold_ms']:>13.2f}{result.cold_ms:>10.2f}")
+
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Runs the benchmark cases selected by the command line arguments.
+    """
+    # Keep the wordcloud images of benchmark databases out of static/.
+    home_service.WORDCLOUD_DIRECTORY = Path(tempfile.mkdtemp(prefix="mdde-wordcloud-"))
+    # Generated now, so that it does not run in the background of other cases.
+    home_service.generate_title_wordcloud()
+    counters = SQLiteCounters()
+
+    with Session(engine) as session:
+        dataset_id = session.exec(
+            select(Dataset.dataset_id).order_by(Dataset.file_number.desc()).limit(1)
+        ).one()
+        deep_start = session.exec(select(func.count(File.file_id))).one() // 20
+    # As a context manager, the client runs the startup of the app, which
+    # builds the summary tables and managed indexes if the database has none.
+    with TestClient(app) as client:
+        cases = [
+            case for case in get_cases(client, dataset_id, deep_start)
+            if args.filter in case.name
+        ]
+        results = [run_case(case, counters, args.repeat) for case in cases]
+    print_results(results)
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "metadata": get_metadata(args.database, args.repeat),
+            "results": [asdict(result) for result in results],
+        }
+        args.output.write_text(json.dumps(report, indent=2, default=str))
+        print(f"\nResults written to {args.output}")
+    if args.compare is not None:
+        print_comparison(results, json.loads(args.compare.read_text()))
+
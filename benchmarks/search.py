@@ -0,0 +1,69 @@
+"""Full-text search index versus ILIKE scans for DataTables searches.
+
+Usage, from the root of the repository, once the index is built
+(uv run python -m app.cli search-index):
+
+    uv run python -m benchmarks.search --repeat 20 lipid "membrane prot"
+"""
+
+import argparse
+import functools
+import statistics
+import time
+from collections.abc import Callable
+
+from app import config, search_index
+from app.frontend.datasets import service as datasets_service
+from app.frontend.file_types import service as file_types_service
+
+SEARCH_FUNCTIONS: dict[str, Callable] = {
+    "datasets": datasets_service.get_all_datasets_for_datatables,
+    **{
+        file_type: functools.partial(
+            file_types_service.get_analysed_files_for_datatables, file_type
+        )
+        for file_type in file_types_service.ANALYSIS_TABLES
+    },
+}
+
+
+def time_search(function: Callable, search: str, repeat: int) -> tuple[float, int]:
+    """
+    Returns the median time (ms) of a DataTables search and its filtered count.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        page = function(
+            sort_column_name="dataset_origin", start=0, length=10, search=search
+        )
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, page.records_filtered
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("terms", nargs="*", default=["lipid", "protein mem", "gromacs"],
+                        help="search values to benchmark")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="number of timed runs per search")
+    args = parser.parse_args()
+
+    if not search_index.has_search_index():
+        parser.error("no search index, run: uv run python -m app.cli search-index")
+
+    print(f"{'table':<10}{'search':<20}{'ILIKE (ms)':>12}{'FTS5 (ms)':>12}"
+          f"{'speedup':>10}{'ILIKE rows':>12}{'FTS5 rows':>12}")
+    for table_name, function in SEARCH_FUNCTIONS.items():
+        for search in args.terms:
+            results = {}
+            for use_index in (False, True):
+                config.SEARCH_INDEX = use_index
+                results[use_index] = time_search(function, search, args.repeat)
+            (ilike_ms, ilike_rows), (fts_ms, fts_rows) = results[False], results[True]
+            print(f"{table_name:<10}{search:<20}{ilike_ms:>12.2f}{fts_ms:>12.2f}"
+                  f"{ilike_ms / fts_ms:>9.1f}x{ilike_rows:>12}{fts_rows:>12}")
+
+
+if __name__ == "__main__":
+    main()
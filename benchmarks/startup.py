@@ -0,0 +1,97 @@
+"""Startup time of the web app, checked against a budget.
+
+Usage, from the root of the repository:
+
+    uv run python -m benchmarks.startup
+    uv run python -m benchmarks.startup --budget-ms 1000
+
+Imports app.main in --repeat fresh interpreters with -X importtime, then
+reports the median import time and the packages taking the most time.
+
+Exits with status 1 if the median import time exceeds the budget, or if
+one of LAZY_MODULES is imported at startup: these are only needed by some
+pages and exports, and are imported on first use.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+DEFAULT_BUDGET_MS = 1_500
+LAZY_MODULES = ("bokeh", "matplotlib", "pandas", "pyarrow", "wordcloud")
+
+
+def import_app(python: str = sys.executable) -> dict[str, tuple[int, int]]:
+    """
+    Imports app.main in a new interpreter, and returns the
+    (self, cumulative) import times in microseconds per module.
+    """
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative_time, module = (
+            line.removeprefix("import time:").split("|")
+        )
+        times[module.strip()] = (int(self_time), int(cumulative_time))
+    return times
+
+
+def get_package_times(times: dict[str, tuple[int, int]]) -> dict[str, int]:
+    """
+    Returns the import time in microseconds per top-level package.
+    """
+    package_times = defaultdict(int)
+    for module, (self_time, _) in times.items():
+        package_times[module.split(".")[0]] += self_time
+    return dict(package_times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="maximum median import time "
+                        f"(default: {DEFAULT_BUDGET_MS})")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of imports in new interpreters")
+    parser.add_argument("--top", type=int, default=10,
+                        help="number of packages to report")
+    args = parser.parse_args()
+
+    runs = [import_app() for _ in range(args.repeat)]
+    import_time_ms = statistics.median(run["app.main"][1] for run in runs) / 1_000
+
+    package_times = get_package_times(runs[-1])
+    print(f"{'package':<30} {'ms':>8}")
+    for package, package_time in sorted(
+        package_times.items(), key=lambda item: item[1], reverse=True
+    )[:args.top]:
+        print(f"{package:<30} {package_time / 1_000:>8.1f}")
+    print(
+        f"\nimport app.main: {import_time_ms:.0f} ms "
+        f"(budget: {args.budget_ms:.0f} ms)"
+    )
+
+    failures = []
+    if import_time_ms > args.budget_ms:
+        failures.append(f"import time {import_time_ms:.0f} ms exceeds the budget")
+    eager_modules = [module for module in LAZY_MODULES if module in package_times]
+    if eager_modules:
+        failures.append(f"imported at startup: {', '.join(eager_modules)}")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""Synthetic MDverse database generator for benchmarks.
+
+Usage, from the root of the repository:
+
+    uv run python -m benchmarks.synthetic --files 100k benchmarks/data/100k.db
+
+The database has the schema of app/db_schema.py and roughly the shape of
+the real data: about 10 files per dataset, a few authors per dataset,
+and analysis rows for most GRO, MDP and XTC files. Generation is seeded,
+so the same scale always gives the same database.
+
+The database is prepared like the real one (app.cli prepare): with the
+full-text search index, the summary tables and the managed indexes,
+unless disabled by --no-search-index, --no-summary-tables or --no-indexes.
+"""
+
+import argparse
+import random
+from collections.abc import Iterator
+from datetime import date, timedelta
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy import Connection, func, insert, select, update
+from sqlmodel import SQLModel, create_engine
+
+from app.db_schema import (
+    Author,
+    Dataset,
+    DatasetAuthorLink,
+    DataSource,
+    File,
+    FileType,
+    ParameterFile,
+    TopologyFile,
+    TrajectoryFile,
+)
+from app.indexes import build_indexes
+from app.search_index import build_search_index
+from app.summary_tables import build_summary_tables
+
+DATA_SOURCES = ["zenodo", "figshare", "osf"]
+# File types with their relative frequency.
+FILE_TYPES = {
+    "gro": 12,
+    "mdp": 8,
+    "xtc": 10,
+    "pdb": 15,
+    "tpr": 8,
+    "top": 6,
+    "itp": 10,
+    "zip": 5,
+    "txt": 16,
+    "log": 10,
+}
+FILES_PER_DATASET = 10
+DATASETS_PER_AUTHOR = 4
+INSERT_CHUNK_SIZE = 10_000
+
+WORDS = (
+    "molecular dynamics simulation simulations protein proteins membrane lipid "
+    "bilayer water ion ions channel receptor kinase enzyme peptide dna rna "
+    "ligand binding free energy coarse grained all atom martini charmm amber "
+    "gromacs namd openmm trajectory trajectories structure folding unfolding "
+    "conformational ensemble replica exchange umbrella sampling metadynamics "
+    "solvent solvation cholesterol micelle nanoparticle polymer crystal"
+).split()
+THERMOSTATS = ["V-rescale", "Nose-Hoover", "Berendsen", "Andersen", None]
+BAROSTATS = ["Parrinello-Rahman", "Berendsen", "C-rescale", "MTTK", None]
+INTEGRATORS = ["md", "sd", "bd", "md-vv", "steep"]
+FIRST_DATE = date(2012, 1, 1)
+NUMBER_OF_DAYS = (date(2024, 12, 31) - FIRST_DATE).days
+
+
+def parse_scale(value: str) -> int:
+    """
+    Converts a scale such as "10000", "10k" or "1M" into a number.
+    """
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    suffix = value[-1].lower()
+    if suffix in multipliers:
+        return int(float(value[:-1]) * multipliers[suffix])
+    return int(value)
+
+
+def random_date(rng: random.Random) -> date:
+    return FIRST_DATE + timedelta(days=rng.randrange(NUMBER_OF_DAYS))
+
+
+def random_text(rng: random.Random, number_of_words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=number_of_words))
+
+
+def iter_datasets(rng: random.Random, number_of_datasets: int) -> Iterator[dict]:
+    for dataset_id in range(1, number_of_datasets + 1):
+        date_created = random_date(rng)
+        yield {
+            "dataset_id": dataset_id,
+            "data_source_id": rng.choices([1, 2, 3], weights=[6, 3, 1])[0],
+            "id_in_data_source": str(1_000_000 + dataset_id),
+            "doi": f"10.5281/zenodo.{1_000_000 + dataset_id}",
+            "date_created": date_created,
+            "date_last_modified": date_created + timedelta(days=rng.randrange(365)),
+            "date_last_crawled": date(2025, 1, 1),
+            "file_number": 0,
+            "download_number": rng.randrange(10_000),
+            "view_number": rng.randrange(100_000),
+            "license": rng.choice(["CC-BY-4.0", "CC0-1.0", "MIT", None]),
+            "url_in_data_source": f"https://example.org/records/{dataset_id}",
+            "title": random_text(rng, rng.randint(4, 12)).capitalize(),
+            "keywords": random_text(rng, 3),
+            "description": random_text(rng, rng.randint(20, 80)),
+        }
+
+
+def iter_dataset_author_links(
+    rng: random.Random, number_of_datasets: int, number_of_authors: int
+) -> Iterator[dict]:
+    for dataset_id in range(1, number_of_datasets + 1):
+        number_of_dataset_authors = min(number_of_authors, rng.randint(1, 6))
+        author_ids = rng.sample(
+            range(1, number_of_authors + 1), number_of_dataset_authors
+        )
+        for author_id in author_ids:
+            yield {"dataset_id": dataset_id, "author_id": author_id}
+
+
+def iter_files(
+    rng: random.Random, number_of_files: int, number_of_datasets: int
+) -> Iterator[tuple[str, dict]]:
+    """
+    Yields (table name, row) for files and their analysis rows.
+    """
+    file_type_ids = list(range(1, len(FILE_TYPES) + 1))
+    file_type_names = list(FILE_TYPES)
+    weights = list(FILE_TYPES.values())
+    zip_file_ids = {}
+    for file_id in range(1, number_of_files + 1):
+        dataset_id = rng.randint(1, number_of_datasets)
+        file_type_id = rng.choices(file_type_ids, weights=weights)[0]
+        file_type = file_type_names[file_type_id - 1]
+        parent_zip_file_id = (
+            zip_file_ids.get(dataset_id) if rng.random() < 0.3 else None
+        )
+        yield File.__tablename__, {
+            "file_id": file_id,
+            "dataset_id": dataset_id,
+            "name": f"{rng.choice(WORDS)}_{file_id}.{file_type}",
+            "file_type_id": file_type_id,
+            "size_in_bytes": rng.randrange(1_000, 10_000_000_000),
+            "md5": f"{rng.getrandbits(128):032x}",
+            "url": f"https://example.org/files/{file_id}",
+            "is_from_zip_file": parent_zip_file_id is not None,
+            "parent_zip_file_id": parent_zip_file_id,
+            "date_last_fetched": date(2025, 1, 1),
+        }
+        if file_type == "zip":
+            zip_file_ids[dataset_id] = file_id
+        # Most, but not all, GRO, MDP and XTC files were analyzed.
+        if rng.random() > 0.8:
+            continue
+        if file_type == "gro":
+            yield TopologyFile.__tablename__, {
+                "file_id": file_id,
+                "atom_number": rng.randrange(100, 5_000_000),
+                "has_protein": rng.random() < 0.6,
+                "has_nucleic": rng.random() < 0.1,
+                "has_lipid": rng.random() < 0.4,
+                "has_glucid": rng.random() < 0.1,
+                "has_water_ion": rng.random() < 0.8,
+            }
+        elif file_type == "mdp":
+            yield ParameterFile.__tablename__, {
+                "file_id": file_id,
+                "dt": rng.choice([0.001, 0.002, 0.004, 0.02]),
+                "nsteps": rng.randrange(1_000, 500_000_000),
+                "temperature": rng.choice([298.0, 300.0, 310.0, 323.0]),
+                "thermostat": rng.choice(THERMOSTATS),
+                "barostat": rng.choice(BAROSTATS),
+                "integrator": rng.choice(INTEGRATORS),
+            }
+        elif file_type == "xtc":
+            yield TrajectoryFile.__tablename__, {
+                "file_id": file_id,
+                "atom_number": rng.randrange(100, 5_000_000),
+                "frame_number": rng.randrange(1, 100_000),
+            }
+
+
+def insert_in_chunks(connection: Connection, rows: Iterator[tuple[str, dict]]) -> None:
+    """
+    Inserts (table name, row) pairs, INSERT_CHUNK_SIZE rows per statement.
+    """
+    tables = SQLModel.metadata.tables
+    chunks: dict[str, list[dict]] = {}
+    for table_name, row in rows:
+        chunk = chunks.setdefault(table_name, [])
+        chunk.append(row)
+        if len(chunk) >= INSERT_CHUNK_SIZE:
+            connection.execute(insert(tables[table_name]), chunk)
+            chunk.clear()
+    for table_name, chunk in chunks.items():
+        if chunk:
+            connection.execute(insert(tables[table_name]), chunk)
+
+
+def generate_database(
+    path: Path,
+    number_of_files: int,
+    seed: int = 0,
+    search_index: bool = True,
+    summary_tables: bool = True,
+    indexes: bool = True,
+) -> None:
+    """
+    Writes a synthetic database with number_of_files files to path, with
+    the full-text search index, the summary tables and the managed indexes
+    unless disabled.
+    """
+    rng = random.Random(seed)
+    number_of_datasets = max(1, number_of_files // FILES_PER_DATASET)
+    number_of_authors = max(1, number_of_datasets // DATASETS_PER_AUTHOR)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(insert(DataSource), [
+            {"data_source_id": index, "name": name}
+            for index, name in enumerate(DATA_SOURCES, start=1)
+        ])
+        connection.execute(insert(FileType), [
+            {"file_type_id": index, "name": name}
+            for index, name in enumerate(FILE_TYPES, start=1)
+        ])
+        insert_in_chunks(connection, (
+            (
+                Author.__tablename__,
+                {"author_id": author_id, "name": f"Author {author_id}"},
+            )
+            for author_id in range(1, number_of_authors + 1)
+        ))
+        insert_in_chunks(connection, (
+            (Dataset.__tablename__, row)
+            for row in iter_datasets(rng, number_of_datasets)
+        ))
+        insert_in_chunks(connection, (
+            (DatasetAuthorLink.__tablename__, row)
+            for row in iter_dataset_author_links(
+                rng, number_of_datasets, number_of_authors
+            )
+        ))
+        insert_in_chunks(
+            connection, iter_files(rng, number_of_files, number_of_datasets)
+        )
+        file_numbers = (
+            select(File.dataset_id, func.count().label("file_number"))
+            .group_by(File.dataset_id)
+            .subquery()
+        )
+        connection.execute(
+            update(Dataset)
+            .values(file_number=file_numbers.c.file_number)
+            .where(Dataset.dataset_id == file_numbers.c.dataset_id)
+        )
+        if search_index:
+            build_search_index(connection)
+        if summary_tables:
+            build_summary_tables(connection)
+        if indexes:
+            build_indexes(connection)
+    engine.dispose()
+    logger.info(
+        f"Generated {path}: {number_of_files} files, "
+        f"{number_of_datasets} datasets, {number_of_authors} authors"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", type=Path, help="path of the database to write")
+    parser.add_argument("--files", type=parse_scale, default=parse_scale("10k"),
+                        help="number of files, e.g. 10k, 100k or 1M (default: 10k)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--no-search-index", dest="search_index", action="store_false",
+                        help="do not build the full-text search index")
+    parser.add_argument("--no-summary-tables", dest="summary_tables",
+                        action="store_false", help="do not build the summary tables")
+    parser.add_argument("--no-indexes", dest="indexes", action="store_false",
+                        help="do not build the managed indexes")
+    args = parser.parse_args()
+    generate_database(
+        args.output,
+        args.files,
+        args.seed,
+        search_index=args.search_index,
+        summary_tables=args.summary_tables,
+        indexes=args.indexes,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Tests of the caches invalidated when the database changes."""
+
+import threading
+import time
+
+import pytest
+
+from app import cache
+from app.cache import DatabaseVersionCache
+
+
+@pytest.fixture(autouse=True)
+def database_version(monkeypatch):
+    monkeypatch.setattr(cache, "get_database_version", lambda: "1")
+
+
+def test_compute_outside_of_the_cache_lock():
+    values = DatabaseVersionCache()
+    values.set("cached", 1)
+    computations = []
+    started = threading.Event()
+
+    def compute():
+        computations.append(1)
+        started.set()
+        time.sleep(0.2)
+        return 2
+
+    threads = [
+        threading.Thread(target=values.get_or_compute, args=("slow", compute))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    # Other keys are read while the value of "slow" is computed.
+    start = time.perf_counter()
+    assert values.get_or_compute("cached", lambda: 0) == 1
+    assert time.perf_counter() - start < 0.1
+    for thread in threads:
+        thread.join()
+    assert values.get("slow") == 2
+    assert len(computations) == 1
+
+
+def test_failed_computation_is_not_cached():
+    values = DatabaseVersionCache()
+
+    def fail():
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        values.get_or_compute("key", fail)
+    assert values.get_or_compute("key", lambda: 3) == 3
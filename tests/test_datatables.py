@@ -0,0 +1,148 @@
+"""Tests of the DataTables engine, on a table declared without a database."""
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Column, Integer, MetaData, String, Table
+
+from app.frontend.datatables import (
+    BOOLEAN,
+    ENUM,
+    NUMBER,
+    NUMERIC,
+    TEXT,
+    DataTablesColumn,
+    DataTablesTable,
+    get_filters,
+    parse_column_filter,
+    parse_datatables_request,
+)
+
+files = Table(
+    "files",
+    MetaData(),
+    Column("file_id", Integer, primary_key=True),
+    Column("name", String),
+    Column("atom_number", Integer),
+)
+
+FILES_TABLE = DataTablesTable(
+    name="files",
+    columns=[
+        DataTablesColumn(
+            "file_name", files.c.name, sort_key=files.c.file_id, search=TEXT
+        ),
+        DataTablesColumn(
+            "atom_number", files.c.atom_number, filter=NUMERIC, search=NUMBER
+        ),
+    ],
+    from_clause=files,
+    default_sort="file_name",
+)
+
+
+def test_search_integer():
+    filters, params = get_filters(FILES_TABLE, search=" 42 ")
+    assert ("number",) in filters
+    assert params["search_number"] == 42
+
+
+def test_search_unicode_digits():
+    # str.isdigit() accepts superscripts, which int() rejects.
+    filters, params = get_filters(FILES_TABLE, search="²")
+    assert ("number",) not in filters
+    assert "search_number" not in params
+
+
+@pytest.mark.parametrize(
+    ("kind", "value", "conditions"),
+    [
+        (NUMERIC, "1000", (("=", 1000),)),
+        (NUMERIC, " 1000 ", (("=", 1000),)),
+        (NUMERIC, "=1000", (("=", 1000),)),
+        (NUMERIC, ">=1000", ((">=", 1000),)),
+        (NUMERIC, "> 1000", ((">", 1000),)),
+        (NUMERIC, "<=2.5", (("<=", 2.5),)),
+        (NUMERIC, "<1000", (("<", 1000),)),
+        (NUMERIC, "1000-5000", ((">=", 1000), ("<=", 5000))),
+        (NUMERIC, "1000..5000", ((">=", 1000), ("<=", 5000))),
+        (NUMERIC, "1.5 .. 2.5", ((">=", 1.5), ("<=", 2.5))),
+        (NUMERIC, "..5000", (("<=", 5000),)),
+        (NUMERIC, "1000-", ((">=", 1000),)),
+        (BOOLEAN, "true", (("=", True),)),
+        (BOOLEAN, "Yes", (("=", True),)),
+        (BOOLEAN, "1", (("=", True),)),
+        (BOOLEAN, "FALSE", (("=", False),)),
+        (BOOLEAN, "no", (("=", False),)),
+        (BOOLEAN, "0", (("=", False),)),
+        (ENUM, "V-rescale", (("in", ("V-rescale",)),)),
+        (ENUM, "V-rescale|Nose-Hoover", (("in", ("V-rescale", "Nose-Hoover")),)),
+        (ENUM, " V-rescale , Nose-Hoover ", (("in", ("V-rescale", "Nose-Hoover")),)),
+    ],
+)
+def test_parse_column_filter(kind, value, conditions):
+    assert parse_column_filter(kind, value) == conditions
+
+
+@pytest.mark.parametrize(
+    ("kind", "value"),
+    [
+        (NUMERIC, ""),
+        (NUMERIC, "abc"),
+        (NUMERIC, ">=abc"),
+        (NUMERIC, "-"),
+        (NUMERIC, ".."),
+        (NUMERIC, "1000-5000-9000"),
+        (NUMERIC, "=>1000"),
+        (NUMERIC, "²"),
+        (BOOLEAN, "maybe"),
+        (BOOLEAN, ""),
+    ],
+)
+def test_parse_column_filter_unparsable(kind, value):
+    assert parse_column_filter(kind, value) is None
+
+
+def test_parse_column_filter_unknown_kind():
+    with pytest.raises(ValueError):
+        parse_column_filter("date", "2024")
+
+
+def test_unparsable_column_filter_matches_no_row():
+    filters, params = get_filters(FILES_TABLE, column_searches={"atom_number": "abc"})
+    assert filters == (("column", "atom_number", None),)
+    assert params == {}
+
+
+def test_column_filter_params():
+    filters, params = get_filters(
+        FILES_TABLE, column_searches={"atom_number": "1000..5000", "file_name": "x"}
+    )
+    # Columns without a filter are ignored.
+    assert filters == (("column", "atom_number", (">=", "<=")),)
+    assert params == {"filter_atom_number_0": 1000, "filter_atom_number_1": 5000}
+
+
+@pytest.mark.parametrize(
+    ("params", "start", "length"),
+    [
+        ({}, None, None),
+        ({"start": "20", "length": "10"}, 20, 10),
+        ({"start": " 20 ", "length": ""}, 20, None),
+        # DataTables asks for all rows with a length of -1.
+        ({"start": "0", "length": "-1"}, 0, None),
+        ({"start": "-10"}, None, None),
+    ],
+)
+def test_parse_datatables_request_row_numbers(params, start, length):
+    draw = parse_datatables_request(params)
+    assert (draw.start, draw.length) == (start, length)
+
+
+@pytest.mark.parametrize(
+    "params",
+    [{"start": "abc"}, {"length": "10.5"}, {"start": "1e3"}, {"length": "²"}],
+)
+def test_parse_datatables_request_invalid_row_numbers(params):
+    with pytest.raises(HTTPException) as exception_info:
+        parse_datatables_request(params)
+    assert exception_info.value.status_code == 400
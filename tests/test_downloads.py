@@ -0,0 +1,93 @@
+"""Tests of the downloads of the lists of files, served from stored exports."""
+
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import config
+from app.frontend.file_types import artifacts, controller
+from app.frontend.file_types.controller import parse_accept_encoding
+
+TSV = "file_name\tdataset_id\nconf.gro\t1\n"
+URL = "/file_types/gro/download_list/"
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "encodings"),
+    [
+        (None, []),
+        ("", []),
+        ("gzip", ["gzip"]),
+        ("GZIP, br", ["gzip", "br"]),
+        ("gzip;q=0.5, zstd;q=1.0", ["gzip", "zstd"]),
+        ("gzip;q=0, identity", ["identity"]),
+        ("gzip; q=0.000, zstd;q=0.0, br ; q=0.00", []),
+        ("gzip;q=0.01", ["gzip"]),
+    ],
+)
+def test_parse_accept_encoding(accept_encoding, encodings):
+    assert parse_accept_encoding(accept_encoding) == encodings
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """
+    Returns a client of the endpoints of the file types, with a stored
+    gzip export of the GRO files.
+    """
+    monkeypatch.setattr(config, "EXPORT_ARTIFACTS", True)
+    monkeypatch.setattr(artifacts, "EXPORT_DIRECTORY", tmp_path)
+    monkeypatch.setattr(artifacts, "get_database_version", lambda: "1")
+    path = artifacts.get_artifact_path("gro", "gzip")
+    path.parent.mkdir()
+    path.write_bytes(gzip.compress(TSV.encode("utf-8")))
+    app = FastAPI()
+    app.include_router(controller.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_artifact_sent_compressed(client):
+    response = client.get(URL, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == TSV
+
+
+@pytest.mark.parametrize("accept_encoding", ["identity", "gzip;q=0", ""])
+def test_artifact_decompressed_for_identity_clients(client, accept_encoding):
+    response = client.get(URL, headers={"Accept-Encoding": accept_encoding})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == TSV
+
+
+def test_compressed_file_downloaded(client):
+    response = client.get(
+        URL, params={"compression": "gzip"}, headers={"Accept-Encoding": "identity"}
+    )
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(response.content).decode("utf-8") == TSV
+
+
+@pytest.mark.parametrize("params", [{}, {"compression": "gzip"}])
+def test_artifact_not_modified(client, params):
+    headers = {"Accept-Encoding": "gzip"}
+    etag = client.get(URL, params=params, headers=headers).headers["etag"]
+    response = client.get(
+        URL, params=params, headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert not response.content
+    # A different export, e.g. after rebuilding it, is sent again.
+    response = client.get(
+        URL, params=params, headers={**headers, "If-None-Match": '"other"'}
+    )
+    assert response.status_code == 200
@@ -0,0 +1,30 @@
+"""Tests of the validators of the HTTP cache."""
+
+from starlette.datastructures import Headers
+
+from app.http_cache import is_not_modified
+
+ETAG = 'W/"0123456789abcdef"'
+LAST_MODIFIED = 1_700_000_000.0
+
+
+def test_matching_etag():
+    headers = Headers({"if-none-match": f'"other", {ETAG}'})
+    assert is_not_modified(headers, ETAG, LAST_MODIFIED)
+
+
+def test_etags_compared_weakly():
+    headers = Headers({"if-none-match": ETAG.removeprefix("W/")})
+    assert is_not_modified(headers, ETAG, LAST_MODIFIED)
+
+
+def test_any_etag_runs_the_endpoint():
+    # The resource may not exist: only the endpoint knows.
+    headers = Headers({"if-none-match": "*"})
+    assert not is_not_modified(headers, ETAG, LAST_MODIFIED)
+
+
+def test_if_modified_since():
+    headers = Headers({"if-modified-since": "Tue, 14 Nov 2023 22:13:20 GMT"})
+    assert is_not_modified(headers, ETAG, LAST_MODIFIED)
+    assert not is_not_modified(headers, ETAG, LAST_MODIFIED + 1)
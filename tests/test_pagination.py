@@ -0,0 +1,183 @@
+"""Keyset and OFFSET pagination of DataTables tables, on an in-memory database."""
+
+import random
+import re
+
+import pytest
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    event,
+    insert,
+)
+from sqlalchemy.pool import StaticPool
+
+from app import cache, config
+from app.cache import clear_caches
+from app.frontend import datatables
+from app.frontend.datatables import (
+    BOOLEAN,
+    NUMERIC,
+    TEXT,
+    DataTablesColumn,
+    DataTablesTable,
+    query_datatables,
+)
+
+PAGE_LENGTH = 7
+
+items = Table(
+    "items",
+    MetaData(),
+    Column("item_id", Integer, primary_key=True),
+    Column("value", Integer),
+    Column("name", String),
+    Column("flag", Boolean),
+)
+
+ITEMS_TABLE = DataTablesTable(
+    name="test_items",
+    columns=[
+        DataTablesColumn("item_id", items.c.item_id),
+        DataTablesColumn(
+            "value", items.c.value, filter=NUMERIC, sort_key=items.c.item_id
+        ),
+        DataTablesColumn("name", items.c.name, sort_key=items.c.item_id, search=TEXT),
+        DataTablesColumn(
+            "flag", items.c.flag, filter=BOOLEAN, sort_key=items.c.item_id
+        ),
+    ],
+    from_clause=items,
+    default_sort="value",
+)
+
+
+def get_rows() -> list[dict]:
+    """
+    Returns rows with NULL and repeated values in every sortable column.
+    """
+    rng = random.Random(0)
+    return [
+        {
+            "item_id": item_id,
+            "value": rng.choice([None, 0, 1, 2, 3]),
+            "name": rng.choice([None, "alpha", "beta", "Bravo", "gamma"]),
+            "flag": rng.choice([None, True, False]),
+        }
+        for item_id in range(1, 41)
+    ]
+
+
+ROWS = get_rows()
+
+
+@pytest.fixture(autouse=True)
+def database(monkeypatch):
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    items.create(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(items), ROWS)
+    monkeypatch.setattr(datatables, "engine", engine)
+    monkeypatch.setattr(cache, "get_database_version", lambda: "1")
+    monkeypatch.setattr(config, "KEYSET_PAGINATION", True)
+    clear_caches()
+    yield engine
+    clear_caches()
+
+
+def get_expected_ids(sort_column_name: str, descending: bool, matches) -> list[int]:
+    """
+    Returns the ids of the matching rows in the order of SQLite: NULL
+    values first in ascending order, ties broken by the sort key.
+    """
+    rows = sorted(
+        (row for row in ROWS if matches(row)),
+        key=lambda row: (
+            row[sort_column_name] is not None,
+            row[sort_column_name] or 0,
+            row["item_id"],
+        ),
+        reverse=descending,
+    )
+    return [row["item_id"] for row in rows]
+
+
+def get_page_ids(start: int, **draw) -> list[int]:
+    page = query_datatables(ITEMS_TABLE, start=start, length=PAGE_LENGTH, **draw)
+    return [row[page.columns.index("item_id")] for row in page.rows]
+
+
+FILTERS = {
+    "none": ({}, lambda row: True),
+    "value": (
+        {"column_searches": {"value": ">=1"}},
+        lambda row: row["value"] is not None and row["value"] >= 1,
+    ),
+    "flag": (
+        {"column_searches": {"flag": "false"}},
+        lambda row: row["flag"] is False,
+    ),
+    "search": (
+        {"search": "b"},
+        lambda row: row["name"] is not None and "b" in row["name"].lower(),
+    ),
+}
+
+
+@pytest.mark.parametrize("filter_name", FILTERS)
+@pytest.mark.parametrize("sort_direction", ["asc", "desc"])
+@pytest.mark.parametrize("sort_column_name", ITEMS_TABLE.sortable_columns)
+def test_keyset_pages_equal_offset_pages(
+    database, sort_column_name, sort_direction, filter_name
+):
+    arguments, matches = FILTERS[filter_name]
+    draw = {
+        **arguments,
+        "sort_column_name": sort_column_name,
+        "sort_direction": sort_direction,
+    }
+    expected_ids = get_expected_ids(sort_column_name, sort_direction == "desc", matches)
+    starts = range(0, len(expected_ids), PAGE_LENGTH)
+
+    statements = []
+
+    def before_cursor_execute(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    # Following pages: each one seeks from the cursor of the previous one.
+    event.listen(database, "before_cursor_execute", before_cursor_execute)
+    try:
+        keyset_pages = [get_page_ids(start, **draw) for start in starts]
+    finally:
+        event.remove(database, "before_cursor_execute", before_cursor_execute)
+    page_statements = [statement for statement in statements if "LIMIT" in statement]
+    # Pages after the first one select the rows after the key of the cursor.
+    assert all(
+        re.search(r"items\.item_id [<>] \?", statement)
+        for statement in page_statements[1:]
+    )
+
+    # Same pages, each one reached directly with OFFSET.
+    offset_pages = []
+    for start in starts:
+        clear_caches()
+        offset_pages.append(get_page_ids(start, **draw))
+
+    assert keyset_pages == offset_pages
+    assert sum(keyset_pages, []) == expected_ids
+
+
+def test_cursors_reused_when_paging_back(database):
+    draw = {"sort_column_name": "value", "sort_direction": "desc"}
+    first_pass = [get_page_ids(start, **draw) for start in (0, 7, 14)]
+    # Pages already reached are sought from their cursors.
+    assert [get_page_ids(start, **draw) for start in (7, 14)] == first_pass[1:]